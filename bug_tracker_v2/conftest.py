@@ -1,5 +1,7 @@
 import pytest
+from django.core.cache import cache
 
+from bug_tracker_v2.tracker.tests.transaction_checks import TransactionChecker
 from bug_tracker_v2.users.models import User
 from bug_tracker_v2.users.tests.factories import UserFactory
 
@@ -9,6 +11,22 @@ def media_storage(settings, tmpdir):
     settings.MEDIA_ROOT = tmpdir.strpath
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # test transactions are rolled back without firing the invalidation receivers, so cached roles can outlive them
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def transaction_boundaries():
+    # runs the on_commit callbacks of test client requests and fails the test if one did I/O inside a transaction
+    with TransactionChecker().installed() as checker:
+        yield checker
+    assert not checker.violations, '\n'.join(checker.violations)
+
+
 @pytest.fixture
 def user() -> User:
     return UserFactory()
@@ -10,6 +10,12 @@ admin.site.register(models.Comment)
 admin.site.register(models.TeamMembership)
 admin.site.register(models.TicketFile)
 
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'created_on', 'sent_on', 'next_attempt_on')
+    list_filter = ('status',)
+
+admin.site.register(models.OutboundEmail, OutboundEmailAdmin)
+
 class TeamMembershipInline(admin.TabularInline):
     model = models.TeamMembership
     extra = 1
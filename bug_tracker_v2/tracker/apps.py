@@ -2,4 +2,10 @@ from django.apps import AppConfig
 
 
 class TrackerConfig(AppConfig):
-    name = 'tracker'
+    name = 'bug_tracker_v2.tracker'
+
+    def ready(self):
+        import bug_tracker_v2.tracker.receivers  # noqa F401
+        from . import memory, tracing
+        tracing.install()
+        memory.install_signal_handler()
@@ -0,0 +1,186 @@
+"""A latency and query-count benchmark of every page, for comparing runs before a deploy.
+
+`manage.py explain_hot_paths` checks the plans of a few hot queries; it can't tell that a view got slower because it
+runs more of them, renders a heavier template or started evaluating a queryset from the template. `manage.py
+benchmark_views` measures that from the outside. It requests every named URL of config/urls.py and tracker/urls.py
+with the test client, once for each persona (a team owner, a team manager, a project developer and a plain member),
+and records per view and persona:
+
+- p50 and p95 wall-clock latency over the measured iterations, after a warm-up request,
+- the number of SQL queries and the time spent in them, and
+- the time spent rendering templates, which includes queries the templates trigger.
+
+Every request runs in a savepoint that is rolled back, so views that change data on GET (adding a manager, archiving
+a project) measure the same thing on every iteration and leave the database as it was. The results are written as
+JSON and can be compared against an earlier run: a view regresses when its status changes, when it runs more queries,
+or when its median latency grows by more than the tolerance and by at least MIN_LATENCY_REGRESSION_MS. The p95 is
+recorded but not compared; over a few iterations it is the slowest request, which a garbage collection or a
+checkpoint can inflate.
+
+Run it against a database seeded with `manage.py seed_scale`; on a handful of rows every view is fast.
+"""
+import math
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.template.base import Template
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from . import models
+from .metrics import QueryTimer
+
+PERSONAS = ('owner', 'manager', 'developer', 'member')
+LATENCY_TOLERANCE = 0.5
+# latency differences below this are noise between two runs on the same machine
+MIN_LATENCY_REGRESSION_MS = 5
+
+# the url namespaces benchmarked besides the root urlconf; users/, accounts/ and the admin are left out
+INCLUDED_NAMESPACES = ('tracker',)
+# urls only ever POSTed to by a form on another page; a GET of delete_comment looks for a confirmation template
+SKIPPED = {'tracker:delete_comment'}
+
+
+def percentile(samples, fraction):
+    """The nearest-rank percentile of a non-empty list of numbers."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def url_names(patterns=None, namespace=None):
+    """Yields (url name, the names of its arguments) for the named urls of the root urlconf and included namespaces."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace in INCLUDED_NAMESPACES:
+                arguments = set(pattern.pattern.regex.groupindex)
+                for name, inner in url_names(pattern.url_patterns, pattern.namespace):
+                    yield name, arguments | inner
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            name = f'{namespace}:{pattern.name}' if namespace else pattern.name
+            if name not in SKIPPED:
+                yield name, set(pattern.pattern.regex.groupindex)
+
+
+def pick_objects(team_slug=None):
+    """The team with the most tickets (or the given one), its busiest project and ticket, and one user per persona.
+    A persona without a matching member of the team is left out."""
+    teams = models.Team.objects.all()
+    if team_slug:
+        teams = teams.filter(slug=team_slug)
+    team = teams.annotate(ticket_total=Count('tickets')).order_by('-ticket_total', 'pk').first()
+    if team is None:
+        return None
+    project = team.projects.filter(is_archived=False).order_by(
+        (F('open_ticket_count') + F('closed_ticket_count')).desc(), 'pk'
+    ).first()
+    ticket = project.project_tickets.order_by('-comment_count', 'pk').first() if project else None
+
+    memberships = team.memberships.select_related('user').order_by('pk')
+    developer_ids = set(project.developers.values_list('pk', flat=True)) if project else set()
+    members = memberships.filter(role=models.TeamMembership.MEMBER)
+    candidates = {
+        'owner': memberships.filter(role=models.TeamMembership.OWNER),
+        'manager': memberships.filter(role=models.TeamMembership.MANAGER),
+        'developer': members.filter(user__in=developer_ids),
+        'member': members.exclude(user__in=developer_ids),
+    }
+    personas = {}
+    for persona, queryset in candidates.items():
+        membership = queryset.first()
+        if membership is not None:
+            personas[persona] = membership.user
+    return {'team': team, 'project': project, 'ticket': ticket, 'personas': personas}
+
+
+def url_for(name, arguments, objects):
+    """The path of a named url for the picked objects, or None when it needs an object there is none of."""
+    values = {
+        'team_slug': objects['team'].slug,
+        'project_pk': objects['project'].pk if objects['project'] else None,
+        'pk': objects['ticket'].pk if objects['ticket'] else None,
+    }
+    kwargs = {argument: values.get(argument) for argument in arguments}
+    if None in kwargs.values():
+        return None
+    return reverse(name, kwargs=kwargs)
+
+
+class RenderTimer:
+    """Adds up the time spent in top-level Template.render calls while installed; included templates aren't counted
+    twice."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._depth = 0
+
+    @contextmanager
+    def installed(self):
+        original = Template.render
+        timer = self
+
+        def render(template, context):
+            timer._depth += 1
+            started = time.perf_counter()
+            try:
+                return original(template, context)
+            finally:
+                timer._depth -= 1
+                if not timer._depth:
+                    timer.seconds += time.perf_counter() - started
+
+        Template.render = render
+        try:
+            yield self
+        finally:
+            Template.render = original
+
+
+def measure(client, path, iterations):
+    """Requests the path once to warm the caches, then `iterations` times, each in a rolled back savepoint."""
+    latencies, queries, sql_seconds, render_seconds = [], [], [], []
+    status = None
+    for iteration in range(iterations + 1):
+        # the execute wrapper the request metrics use: it counts and times the queries without forcing a debug cursor,
+        # so the benchmark doesn't also pay for building the query log
+        query_timer, render_timer = QueryTimer(), RenderTimer()
+        with transaction.atomic(), connection.execute_wrapper(query_timer), render_timer.installed():
+            started = time.perf_counter()
+            response = client.get(path)
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        status = response.status_code
+        if iteration:
+            latencies.append(elapsed)
+            queries.append(query_timer.count)
+            sql_seconds.append(query_timer.seconds)
+            render_seconds.append(render_timer.seconds)
+    return {
+        'path': path,
+        'status': status,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'queries': max(queries),
+        'sql_ms': round(statistics.median(sql_seconds) * 1000, 2),
+        'render_ms': round(statistics.median(render_seconds) * 1000, 2),
+    }
+
+
+def compare(results, previous, latency_tolerance=LATENCY_TOLERANCE):
+    """Returns a list of (view:persona key, problem) for the results that regressed against an earlier run's."""
+    problems = []
+    for key, result in sorted(results.items()):
+        before = previous.get(key)
+        if before is None:
+            continue
+        if result['status'] != before['status']:
+            problems.append((key, f"responded with {result['status']}, {before['status']} before"))
+        if result['queries'] > before['queries']:
+            problems.append((key, f"runs {result['queries']} queries, {before['queries']} before"))
+        if (result['p50_ms'] > before['p50_ms'] * (1 + latency_tolerance)
+                and result['p50_ms'] - before['p50_ms'] >= MIN_LATENCY_REGRESSION_MS):
+            problems.append((key, f"p50 {result['p50_ms']} ms, {before['p50_ms']} ms before"))
+    return problems
@@ -0,0 +1,74 @@
+"""Query budgets: the most queries a request to a view should run.
+
+The pages used to check team membership with `user in team.members.all()` and look up each table row's project, and
+every such regression looked fine on a test team of three tickets. A view class declares a ceiling instead, with
+`query_budget` and utils.QueryBudgetMixin, which notes the budget on the request when the view dispatches; a view that
+delegates to another, like SuperTicketDetails, is held to the budget of the one that handles the request.
+
+Budgets don't grow with the data, so they also hold a view to a constant number of queries per page. The tests in
+test_views.py request every budgeted page on a fixture with more rows than a page shows and fail over budget. In
+production, config.middleware.QueryBudgetMiddleware logs a structured warning for a request over budget, listing
+the statements that ran more than once by fingerprint (see queryplans.py), which is where an N+1 shows up.
+"""
+import json
+import logging
+from collections import Counter
+
+from . import metrics, queryplans
+from .metrics import QueryTimer
+
+logger = logging.getLogger(__name__)
+
+# how many repeated statements a warning lists
+REPEATED_LIMIT = 5
+
+
+class QueryLog(QueryTimer):
+    """An execute wrapper that also keeps the SQL of every query run."""
+
+    def __init__(self):
+        super().__init__()
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements.append(sql)
+        return super().__call__(execute, sql, params, many, context)
+
+
+def repeated_queries(statements, limit=REPEATED_LIMIT):
+    """The statements that ran more than once, most frequent first, as {'fingerprint', 'count', 'sql'} dicts."""
+    counts = Counter()
+    examples = {}
+    for sql in statements:
+        key = queryplans.fingerprint(sql)
+        counts[key] += 1
+        examples.setdefault(key, sql)
+    return [
+        {'fingerprint': key, 'count': count, 'sql': queryplans.normalize_sql(examples[key])}
+        for key, count in counts.most_common(limit) if count > 1
+    ]
+
+
+def over_budget(request, query_count):
+    """(view class name, budget) when the request ran more queries than its view's budget, otherwise None."""
+    view, budget = getattr(request, 'query_budget', (None, None))
+    if budget is None or query_count <= budget:
+        return None
+    return view, budget
+
+
+def check(request, statements):
+    """Logs a warning when the request's statements exceed its view's query budget."""
+    exceeded = over_budget(request, len(statements))
+    if exceeded is None:
+        return
+    view, budget = exceeded
+    logger.warning('Query budget exceeded: %s', json.dumps({
+        'view': view,
+        'url_name': metrics.view_name(request),
+        'path': request.path,
+        'method': request.method,
+        'queries': len(statements),
+        'budget': budget,
+        'repeated': repeated_queries(statements),
+    }))
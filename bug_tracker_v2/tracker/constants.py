@@ -3,6 +3,7 @@ NOTIFICATION_SETTING_DEFAULTS = {
     'project_role_assignment': True,
     'auto_subscribe_to_submitted_tickets': True,
     'team_invites': True,
+    'subscribed_ticket_activity': True,
 }
 
 NOTIFICATION_SETTING_DESCRIPTIONS = {
@@ -26,4 +27,9 @@ NOTIFICATION_SETTING_DESCRIPTIONS = {
         'description': 'This setting controls whether you will receive notifications when you receive new team invitations.',
         'slug': 'team_invites',
             },
+    'subscribed_ticket_activity': {
+        'title': 'Subscribed Ticket Activity',
+        'description': 'This setting controls whether you will receive notifications about new tickets, comments and closures on the tickets and projects you are subscribed to.',
+        'slug': 'subscribed_ticket_activity',
+            },
 }
@@ -0,0 +1,11 @@
+from django.utils.functional import lazy
+
+from . import invitations
+
+
+def pending_invitations(request):
+    """The user's pending team invitation count, only looked up if a template renders it."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {'pending_invitations_count': 0}
+    return {'pending_invitations_count': lazy(invitations.get_pending_invitation_count, int)(user)}
@@ -0,0 +1,129 @@
+"""Denormalized row counters: open and closed tickets on Project, comments and files on Ticket.
+
+The project tables used to annotate a COUNT over every project's tickets on each page load, the project details page
+counted its tickets again and the ticket details page counted the ticket's files. The counts are now stored on the
+parent row. The receivers in receivers.py apply each change as a relative `UPDATE ... SET n = n + 1`: when a ticket is
+created, deleted, closed, reopened or moved to another project, and when a comment or file is added or deleted. The
+update runs in the same transaction as the write that caused it, so views save counted models inside an atomic block,
+and concurrent writers cannot lose each other's increments. A view changing the status of a ticket it loaded before
+the block calls `lock_counted_state()` first, so that two requests closing or reopening the same ticket move it once.
+
+Models with counters use CounterFieldsMixin, which leaves the counter columns out of a plain `save()` of an existing
+row. Otherwise saving an instance loaded before a comment was posted would write its stale count back.
+
+Queryset `.update()` and `.delete()` calls, raw SQL and restored backups bypass the receivers. `manage.py
+reconcile_counters` finds the rows whose stored counts differ from the real ones and rewrites them.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from . import models
+
+
+class CounterFieldsMixin:
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+def _add(model, pk, **deltas):
+    deltas = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if pk is not None and deltas:
+        model.objects.filter(pk=pk).update(**deltas)
+
+
+def _project_deltas(status, sign):
+    if status == models.Ticket.CLOSED:
+        return {'closed_ticket_count': sign}
+    return {'open_ticket_count': sign}
+
+
+def ticket_counted_state(ticket):
+    """The (project_id, status) a ticket is currently counted under."""
+    return ticket.project_id, ticket.status
+
+
+def lock_counted_state(ticket):
+    """Locks the ticket's row until the end of the transaction and counts the ticket under its committed state."""
+    ticket._counted_state = models.Ticket.objects.select_for_update().filter(pk=ticket.pk).values_list(
+        'project_id', 'status'
+    ).get()
+
+
+def ticket_saved(ticket, created):
+    """Moves the ticket's project counts from the state it was loaded in to its current state."""
+    current = ticket_counted_state(ticket)
+    previous = None if created else getattr(ticket, '_counted_state', current)
+    ticket._counted_state = current
+    if previous == current:
+        return
+    if previous is None:
+        _add(models.Project, current[0], **_project_deltas(current[1], 1))
+    elif previous[0] == current[0]:
+        deltas = _project_deltas(previous[1], -1)
+        deltas.update(_project_deltas(current[1], 1))
+        _add(models.Project, current[0], **deltas)
+    else:
+        _add(models.Project, previous[0], **_project_deltas(previous[1], -1))
+        _add(models.Project, current[0], **_project_deltas(current[1], 1))
+
+
+def ticket_deleted(ticket):
+    project_id, status = getattr(ticket, '_counted_state', ticket_counted_state(ticket))
+    _add(models.Project, project_id, **_project_deltas(status, -1))
+
+
+def comment_added(ticket_id, sign=1):
+    _add(models.Ticket, ticket_id, comment_count=sign)
+
+
+def file_added(ticket_id, sign=1):
+    _add(models.Ticket, ticket_id, file_count=sign)
+
+
+def _count(model, parent_field, q=Q()):
+    """A subquery counting the rows of `model` matching `q` that belong to the outer row, 0 when there are none."""
+    counted = model.objects.filter(q, **{parent_field: OuterRef('pk')}).order_by().values(parent_field)
+    return Coalesce(
+        Subquery(counted.annotate(n=Count('pk')).values('n'), output_field=IntegerField()), Value(0)
+    )
+
+
+def actual_counts(model):
+    """Maps each counter field of the model to an expression computing its true value for the outer row."""
+    if model is models.Project:
+        return {
+            'open_ticket_count': _count(models.Ticket, 'project', ~Q(status=models.Ticket.CLOSED)),
+            'closed_ticket_count': _count(models.Ticket, 'project', Q(status=models.Ticket.CLOSED)),
+        }
+    if model is models.Ticket:
+        return {
+            'comment_count': _count(models.Comment, 'ticket'),
+            'file_count': _count(models.TicketFile, 'ticket'),
+        }
+    raise ValueError(f'{model.__name__} has no counters.')
+
+
+def drifted(model):
+    """The rows of the model whose stored counters differ from the actual counts, annotated with `actual_<field>`."""
+    actual = actual_counts(model)
+    queryset = model.objects.annotate(**{f'actual_{field}': expression for field, expression in actual.items()})
+    mismatch = Q()
+    for field in actual:
+        mismatch |= ~Q(**{field: F(f'actual_{field}')})
+    return queryset.filter(mismatch)
+
+
+def reconcile(model, pks=None):
+    """Rewrites the counters of the given rows (all rows by default) from the actual counts. Returns the rows updated."""
+    queryset = model.objects.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=list(pks))
+    return queryset.update(**actual_counts(model))
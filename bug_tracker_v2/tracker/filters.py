@@ -1,10 +1,46 @@
+import datetime
+
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 import django_filters
-from .models import Ticket, Project, Team
+from . import loaders
+from .models import Ticket, Project
+from .search import search_tickets
 from django.forms import DateInput
 
 User = get_user_model()
 
+
+def request_team(request):
+    return loaders.for_request(request).team(request.resolver_match.kwargs['team_slug'])
+
+
+def start_of_day(date):
+    """The first moment of a date in the current timezone."""
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min), is_dst=False)
+
+
+class DayFilter(django_filters.DateFilter):
+    """Filters a timestamp by a date in the current timezone, on or after it or (with `until=True`) on or before it.
+
+    The date is turned into a bound of a half-open timestamp range (`>= start of the day`, `< start of the next day`),
+    so the lookup compares the column directly instead of casting every row's timestamp to a date the way `__date`
+    does, and an index on the column can be used.
+    """
+    def __init__(self, *args, until=False, **kwargs):
+        self.until = until
+        kwargs['lookup_expr'] = 'lt' if until else 'gte'
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if value and self.until and value == datetime.date.max:
+            # there is no next day to stop before, and every timestamp is on or before the last date anyway
+            return qs
+        if value:
+            value = start_of_day(value + datetime.timedelta(days=1) if self.until else value)
+        return super().filter(qs, value)
+
+
 class TicketFilter(django_filters.FilterSet):
     # STATUS_CHOICES = (
     #     ('open', 'Open'),
@@ -12,31 +48,34 @@ class TicketFilter(django_filters.FilterSet):
     #     ('in_progress', 'In progress'),
     # )
 
-    developer = django_filters.ModelChoiceFilter(queryset=lambda request: Team.objects.get(slug=request.resolver_match.kwargs['team_slug']).members.all(), null_label = 'Unassigned')
-    title = django_filters.CharFilter(lookup_expr='icontains')
+    developer = django_filters.ModelChoiceFilter(queryset=lambda request: request_team(request).members.all(), null_label = 'Unassigned')
+    title = django_filters.CharFilter(method='search', label='Search')
     user = django_filters.ModelChoiceFilter(queryset=User.objects.all())
-    created_start_date = django_filters.DateFilter(field_name='created_on', lookup_expr='date__gte', widget=DateInput(attrs={'type': 'date'}))
-    created_end_date = django_filters.DateFilter(field_name='created_on', lookup_expr='date__lte', widget=DateInput(attrs={'type': 'date'}))
-    updated_start_date = django_filters.DateFilter(field_name='last_updated_on', lookup_expr='date__gte', widget=DateInput(attrs={'type': 'date'}))
-    updated_end_date = django_filters.DateFilter(field_name='last_updated_on', lookup_expr='date__lte', widget=DateInput(attrs={'type': 'date'}))
+    created_start_date = DayFilter(field_name='created_on', widget=DateInput(attrs={'type': 'date'}))
+    created_end_date = DayFilter(field_name='created_on', until=True, widget=DateInput(attrs={'type': 'date'}))
+    updated_start_date = DayFilter(field_name='last_updated_on', widget=DateInput(attrs={'type': 'date'}))
+    updated_end_date = DayFilter(field_name='last_updated_on', until=True, widget=DateInput(attrs={'type': 'date'}))
     # status = django_filters.ChoiceFilter(choices=STATUS_CHOICES)
-    project = django_filters.ModelChoiceFilter(queryset=lambda request: Project.objects.filter_for_team_and_user(team_slug=request.resolver_match.kwargs['team_slug'], user=request.user).filter(is_archived=False))
+    project = django_filters.ModelChoiceFilter(queryset=lambda request: Project.objects.filter_for_team_and_user(team_slug=None, user=request.user, team=request_team(request)).filter(is_archived=False))
+
+    def search(self, queryset, name, value):
+        return search_tickets(queryset, value)
 
     class Meta:
         model = Ticket
-        exclude = ('description', 'team', 'status' )
+        exclude = ('description', 'team', 'status', 'description_html', 'description_hash', 'resolution_html', 'resolution_hash', 'search_vector', 'comment_count', 'file_count', 'priority_rank', )
 
 
 class TicketFilterArchivedProjects(TicketFilter):
-    project = django_filters.ModelChoiceFilter(queryset=lambda request: Project.objects.filter_for_team_and_user(team_slug=request.resolver_match.kwargs['team_slug'], user=request.user).filter(is_archived=True))
+    project = django_filters.ModelChoiceFilter(queryset=lambda request: Project.objects.filter_for_team_and_user(team_slug=None, user=request.user, team=request_team(request)).filter(is_archived=True))
 
 
 class ProjectFilter(django_filters.FilterSet):
-    manager = django_filters.ModelChoiceFilter(queryset=lambda request: Team.objects.get(slug=request.resolver_match.kwargs['team_slug']).get_managers())
+    manager = django_filters.ModelChoiceFilter(queryset=lambda request: request_team(request).get_managers())
     title = django_filters.CharFilter(lookup_expr='icontains')
-    start_date = django_filters.DateFilter(field_name='created_on', lookup_expr='date__gte', widget=DateInput(attrs={'type': 'date'}))
-    end_date = django_filters.DateFilter(field_name='created_on', lookup_expr='date__lte', widget=DateInput(attrs={'type': 'date'}))
+    start_date = DayFilter(field_name='created_on', widget=DateInput(attrs={'type': 'date'}))
+    end_date = DayFilter(field_name='created_on', until=True, widget=DateInput(attrs={'type': 'date'}))
 
     class Meta:
         model = Project
-        exclude = ('description', 'team', )
+        exclude = ('description', 'team', 'description_html', 'description_hash', 'open_ticket_count', 'closed_ticket_count', )
@@ -35,8 +35,8 @@ class CreateTicketForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         project_pk = kwargs.pop('project_pk')
         super().__init__(*args, **kwargs)
-        project = models.Project.objects.get(pk=project_pk)
-        project_developers = project.developers.all()
+        # the project's developers, without fetching the project the view has already loaded
+        project_developers = models.User.objects.filter(developer_assigned_projects=project_pk)
         self.fields['developer'].queryset = project_developers
 
 
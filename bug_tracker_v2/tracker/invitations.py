@@ -0,0 +1,30 @@
+"""Cached per-user count of pending team invitations, shown in the navigation bar on every page.
+
+Every page used to count the user's pending invitations twice: once in CommonTemplateContextMixin and again through
+`request.user.get_pending_invitations_count` in base.html. The count is now kept in the shared Django cache and read
+through the `pending_invitations` context processor, whose value is lazy, so a page that doesn't render the badge
+doesn't touch the cache either. The receivers in receivers.py drop a user's key whenever one of their invitations is
+created, accepted, declined or deleted, once the change commits.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from . import models
+
+PENDING_INVITATIONS_CACHE_TIMEOUT = 60 * 60
+
+PENDING_INVITATIONS_KEY = 'tracker:pending-invitations:{user_id}'
+
+
+def invalidate_pending_invitations(user_ids):
+    keys = [PENDING_INVITATIONS_KEY.format(user_id=user_id) for user_id in user_ids if user_id is not None]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_pending_invitation_count(user):
+    key = PENDING_INVITATIONS_KEY.format(user_id=user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = models.TeamInvitation.objects.filter(invitee=user, status=models.TeamInvitation.PENDING).count()
+        cache.set(key, count, PENDING_INVITATIONS_CACHE_TIMEOUT)
+    return count
@@ -0,0 +1,131 @@
+"""A per-request identity map for teams, projects and tickets.
+
+A single ticket details request used to look its team up by slug in the permission mixin, again in
+CommonTemplateContextMixin and once more through `ticket.team` in the template, and fetched the ticket itself each
+time `get_object()` was called. The RequestLoader attached to each request hands out one instance per row instead:
+the first lookup of a team (by slug or pk), project or ticket queries the database and every later one, from any
+mixin, view or template, gets the same object back.
+
+Registered instances are also linked to each other. A ticket's `team` and `project` and a project's `team` are set
+to the instances already in the map, and related objects loaded with select_related are added to it. Changes made to
+an instance while handling the request are therefore visible everywhere else it is used.
+
+The map only lives as long as the request, so nothing needs to be invalidated. Instances saved during the request
+are the same objects, so they are never stale. Rows changed with queryset `.update()` calls are not refreshed.
+"""
+from django.shortcuts import get_object_or_404
+
+from . import models
+
+LINKED_MODELS = (models.Team, models.Project, models.Ticket,)
+LINKED_FIELDS = {
+    models.Project: ('team',),
+    models.Ticket: ('team', 'project',),
+}
+
+
+class RequestLoader:
+    def __init__(self):
+        self._instances = {}
+
+    @staticmethod
+    def _key(model, field, value):
+        return model._meta.concrete_model, field, str(value)
+
+    def _registered(self, model, field, value):
+        return self._instances.get(self._key(model, field, value))
+
+    def _linked(self):
+        """Yields (instance, field) for every linked foreign key of the registered instances."""
+        for key, instance in list(self._instances.items()):
+            if key[1] != 'pk':
+                continue
+            for name in LINKED_FIELDS.get(key[0], ()):
+                yield instance, instance._meta.get_field(name)
+
+    def cached(self, model, pk=None, slug=None):
+        """Returns the instance already loaded for a pk or slug, or None.
+
+        That includes a related instance fetched lazily through a registered ticket or project, which is registered
+        from then on.
+        """
+        field, value = ('pk', pk) if pk is not None else ('slug', slug)
+        if value is None:
+            return None
+        instance = self._registered(model, field, value)
+        if instance is not None:
+            return instance
+        for owner, linked_field in self._linked():
+            if linked_field.related_model is model._meta.concrete_model and linked_field.is_cached(owner):
+                related = linked_field.get_cached_value(owner)
+                if related is not None and str(getattr(related, field)) == str(value):
+                    return self.add(related)
+        return None
+
+    def add(self, instance):
+        """Registers an instance, links it to the related instances in the map and returns the registered instance.
+
+        If an instance of the same row is already registered, that one is returned and the new one is discarded.
+        """
+        model = type(instance)
+        existing = self._registered(model, 'pk', instance.pk)
+        if existing is not None:
+            return existing
+        self._instances[self._key(model, 'pk', instance.pk)] = instance
+        if getattr(instance, 'slug', None):
+            self._instances[self._key(model, 'slug', instance.slug)] = instance
+        for name in LINKED_FIELDS.get(model._meta.concrete_model, ()):
+            field = model._meta.get_field(name)
+            related_pk = getattr(instance, field.attname)
+            if related_pk is None:
+                continue
+            related = self._registered(field.related_model, 'pk', related_pk)
+            if related is None and field.is_cached(instance):
+                related = self.add(field.get_cached_value(instance))
+            if related is not None:
+                field.set_cached_value(instance, related)
+        for owner, linked_field in self._linked():
+            if (linked_field.related_model is model._meta.concrete_model and not linked_field.is_cached(owner)
+                    and getattr(owner, linked_field.attname) == instance.pk):
+                linked_field.set_cached_value(owner, instance)
+        return instance
+
+    def get(self, model, queryset=None, **lookup):
+        """Returns the instance for a `pk=` or `slug=` lookup, fetched with get_object_or_404 from `queryset` (the
+        model's default manager if not given) the first time it is asked for."""
+        instance = self.cached(model, **lookup)
+        if instance is None:
+            instance = self.add(get_object_or_404(queryset if queryset is not None else model, **lookup))
+        return instance
+
+    def share(self, queryset):
+        """Returns a copy of a project or ticket queryset whose rows get the registered instances as their `team`
+        (and `project`) instead of fetching their own copies, one query per row, when a template follows them."""
+        queryset = queryset.all()
+        for name in LINKED_FIELDS.get(queryset.model._meta.concrete_model, ()):
+            field = queryset.model._meta.get_field(name)
+            known = {
+                instance.pk: instance for (model, key_field, _value), instance in self._instances.items()
+                if model is field.related_model and key_field == 'pk'
+            }
+            if known:
+                # the hook related managers use to hand their instance to every row they load
+                queryset._known_related_objects.setdefault(field, {}).update(known)
+        return queryset
+
+    def team(self, slug):
+        return self.get(models.Team, slug=slug)
+
+    def project(self, pk):
+        return self.get(models.Project, pk=pk)
+
+    def ticket(self, pk):
+        return self.get(models.Ticket, pk=pk)
+
+
+def for_request(request):
+    """The RequestLoader of the request, created on first use."""
+    loader = getattr(request, '_tracker_loader', None)
+    if loader is None:
+        loader = request._tracker_loader = RequestLoader()
+    return loader
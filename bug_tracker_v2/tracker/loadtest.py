@@ -0,0 +1,257 @@
+"""A load test of a running server by simulated users, for sizing its gunicorn workers and threads.
+
+`manage.py benchmark_views` and `manage.py replay_traffic` call the views in-process with the test client, which
+measures the views but not the server around them. `manage.py load_test` sends real HTTP requests to a running server
+(gunicorn with the Dockerfile's settings, say) from a number of threads, each a simulated user of the team with the
+most tickets. Each user repeatedly lists the team's tickets and opens one of the tickets assigned to them, and then
+sometimes comments on it, closes and reopens it, or subscribes to and unsubscribes from it, as weighted in FLOWS. It
+reports the requests per second, the error rate and the latency percentiles, overall and per url name.
+
+The users are signed in by sessions created directly in the database the server uses, so the command must run with
+the server's settings; the sessions are deleted afterwards. Comments posted stay in the database. Closing a ticket
+sends its subscribers an email, so the command can run an SMTP sink, which counts the messages it receives and can
+write them to a directory; start the server with DJANGO_EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend and
+DJANGO_EMAIL_PORT pointing at it, or with the file-based email backend.
+"""
+import os
+import random
+import socketserver
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from . import models
+from .benchmarks import percentile
+
+# what a user does after opening a ticket, and how often
+FLOWS = {
+    'read': 10,
+    'comment': 4,
+    'close_reopen': 2,
+    'subscribe': 2,
+}
+# tickets of each user to choose from
+TICKETS_PER_USER = 50
+TIMEOUT = 30
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """A local SMTP server accepting every message and counting it, and writing it to `directory` if given."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port, directory=None):
+        super().__init__(('127.0.0.1', port), _SmtpHandler)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    def store(self, message):
+        with self._lock:
+            self.messages += 1
+            number = self.messages
+        if self.directory:
+            with open(os.path.join(self.directory, f'{number:06d}.eml'), 'wb') as f:
+                f.write(message)
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, text):
+        self.wfile.write(text.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 localhost load test sink')
+        for line in iter(self.rfile.readline, b''):
+            command = line[:4].upper()
+            if command in (b'HELO', b'EHLO'):
+                self.reply('250 localhost')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                for data in iter(self.rfile.readline, b''):
+                    if data.rstrip(b'\r\n') == b'.':
+                        break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                self.server.store(b''.join(lines))
+                self.reply('250 OK')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                # MAIL, RCPT, RSET and NOOP
+                self.reply('250 OK')
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    # a redirect is the response measured, not followed
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class SimulatedUser:
+    """A signed in user of the team, with an HTTP client of its own."""
+
+    def __init__(self, base_url, team, user, tickets, seed):
+        self.base_url = base_url.rstrip('/')
+        self.team = team
+        self.tickets = tickets
+        self.rng = random.Random(seed)
+        self.opener = urllib.request.build_opener(_NoRedirects)
+        # signed in with a session created the way the test client's force_login does
+        client = Client()
+        client.force_login(user)
+        self.session_key = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.cookies = {settings.SESSION_COOKIE_NAME: self.session_key}
+
+    def _remember_cookies(self, headers):
+        for header in headers.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+
+    def request(self, name, path, data=None):
+        """Requests the path, POSTing `data` if given, and returns (url name, status, seconds); status 0 when the
+        server didn't answer."""
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body)
+        request.add_header('Cookie', '; '.join(f'{key}={value}' for key, value in self.cookies.items()))
+        if body is not None:
+            request.add_header('X-CSRFToken', self.cookies.get(settings.CSRF_COOKIE_NAME, ''))
+            request.add_header('Referer', self.base_url + path)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=TIMEOUT) as response:
+                response.read()
+                status = response.status
+                self._remember_cookies(response.headers)
+        except urllib.error.HTTPError as e:
+            e.read()
+            status = e.code
+            self._remember_cookies(e.headers)
+        except OSError:
+            status = 0
+        return name, status, time.perf_counter() - started
+
+    def visit(self):
+        """One visit: the ticket list, a ticket, and then one of FLOWS. Returns the requests' results."""
+        kwargs = {'team_slug': self.team.slug}
+        ticket = {**kwargs, 'pk': self.rng.choice(self.tickets)}
+        details = reverse('tracker:ticket_details', kwargs=ticket)
+        results = [
+            self.request('tracker:ticket_list', reverse('tracker:ticket_list', kwargs=kwargs)),
+            self.request('tracker:ticket_details', details),
+        ]
+        flow = self.rng.choices(list(FLOWS), weights=list(FLOWS.values()))[0]
+        if flow == 'comment':
+            results.append(self.request('comment', details, {
+                'comment': f'Load test comment {self.rng.randrange(10 ** 6)}', 'post_comment': 'Submit',
+            }))
+        elif flow == 'close_reopen':
+            resolution = {'resolution': 'Closed by the load test', 'close_ticket': ''}
+            results.append(self.request('close', details, resolution))
+            results.append(self.request('reopen', details, {'reopen_ticket': ''}))
+        elif flow == 'subscribe':
+            results.append(self.request('tracker:subscribe_ticket', reverse('tracker:subscribe_ticket', kwargs=ticket)))
+            results.append(
+                self.request('tracker:unsubscribe_ticket', reverse('tracker:unsubscribe_ticket', kwargs=ticket))
+            )
+        return results
+
+
+def simulated_users(base_url, count, team_slug=None, seed=0):
+    """`count` SimulatedUsers: the members of the team (the one with the most tickets if not given) with the most open
+    tickets assigned to them, each used more than once when there are fewer of them."""
+    teams = models.Team.objects.annotate(ticket_total=Count('tickets')).order_by('-ticket_total', 'pk')
+    team = teams.filter(slug=team_slug).first() if team_slug else teams.first()
+    if team is None:
+        return []
+    assigned = models.Ticket.developer.through.objects.filter(
+        ticket__team=team, ticket__project__is_archived=False
+    ).exclude(ticket__status=models.Ticket.CLOSED)
+    user_ids = list(assigned.values('user_id').annotate(tickets=Count('ticket_id')).order_by(
+        '-tickets', 'user_id'
+    ).values_list('user_id', flat=True)[:count])
+    if not user_ids:
+        return []
+    users = get_user_model().objects.in_bulk(user_ids)
+    tickets = {}
+    for user_id in user_ids:
+        ticket_ids = assigned.filter(user_id=user_id).order_by('ticket_id').values_list('ticket_id', flat=True)
+        tickets[user_id] = list(ticket_ids[:TICKETS_PER_USER])
+    simulated = []
+    for i in range(count):
+        user_id = user_ids[i % len(user_ids)]
+        simulated.append(SimulatedUser(base_url, team, users[user_id], tickets[user_id], seed + i))
+    return simulated
+
+
+def run(users, seconds, think=0.0):
+    """Lets every user visit the site over and over from a thread of its own for `seconds`, waiting `think` seconds
+    between visits. Returns the (url name, status, seconds) of every request and the seconds the run took."""
+    results = []
+    deadline = time.monotonic() + seconds
+
+    def visit(user):
+        while time.monotonic() < deadline:
+            results.extend(user.visit())
+            if think:
+                time.sleep(user.rng.uniform(0, 2 * think))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=visit, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def sign_out(users):
+    Session.objects.filter(session_key__in=[user.session_key for user in users]).delete()
+
+
+def report(results, wall):
+    """Requests per second, error rate and latency percentiles, overall and per url name. A status of 400 or more, or
+    no answer, is an error."""
+    def summary(requests):
+        latencies = [seconds for _name, _status, seconds in requests]
+        errors = sum(1 for _name, status, _seconds in requests if not status or status >= 400)
+        return {
+            'requests': len(requests),
+            'error_rate': round(errors / len(requests), 4),
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'max_ms': round(max(latencies) * 1000, 2),
+        }
+
+    by_name = {}
+    for result in results:
+        by_name.setdefault(result[0], []).append(result)
+    return {
+        'seconds': round(wall, 3),
+        'requests_per_second': round(len(results) / wall, 2) if wall else None,
+        **(summary(results) if results else {'requests': 0}),
+        'statuses': {str(status): count for status, count in sorted(Counter(r[1] for r in results).items())},
+        'urls': {name: summary(requests) for name, requests in sorted(by_name.items())},
+    }
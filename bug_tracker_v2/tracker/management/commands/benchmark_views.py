@@ -0,0 +1,88 @@
+import datetime
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+
+from bug_tracker_v2.tracker import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests every page as a team owner, manager, developer and member and records p50/p95 latency, query "
+        "count, SQL time and template render time per view, optionally comparing them against an earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--team', help='Slug of the team whose pages are requested. Defaults to the team with the most tickets.')
+        parser.add_argument('--iterations', type=int, default=10, help='Measured requests per view and persona.')
+        parser.add_argument('--output', help='Write the results as JSON to this path.')
+        parser.add_argument('--compare', help='Path of an earlier run\'s results to compare against.')
+        parser.add_argument(
+            '--latency-tolerance', type=float, default=benchmarks.LATENCY_TOLERANCE,
+            help='Fraction a view\'s median latency may grow over the earlier run before it is flagged.',
+        )
+        parser.add_argument('--only', action='append', help='Only benchmark url names containing this; repeatable.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    previous = json.load(f)['results']
+            except FileNotFoundError:
+                raise CommandError(f"No results at {options['compare']}.")
+
+        # the test client's host, and everything the requests write, including the sessions, is rolled back
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), transaction.atomic():
+            objects = benchmarks.pick_objects(options['team'])
+            if objects is None:
+                raise CommandError(f"No team with slug '{options['team']}'." if options['team'] else 'There are no teams.')
+            results = self.run(objects, options['iterations'], options['only'])
+            transaction.set_rollback(True)
+
+        for key, result in results.items():
+            self.stdout.write(
+                f"{key}: {result['status']} p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+                f"{result['queries']} queries, sql {result['sql_ms']} ms, render {result['render_ms']} ms"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'team': objects['team'].slug,
+                    'tickets': objects['team'].ticket_total,
+                    'iterations': options['iterations'],
+                    'recorded_on': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                    'results': results,
+                }, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(f"Wrote the results to {options['output']}.")
+
+        if previous is not None:
+            problems = benchmarks.compare(results, previous, options['latency_tolerance'])
+            for key, problem in problems:
+                self.stdout.write(f'  [{key}] {problem}')
+            if problems:
+                raise CommandError(f'{len(problems)} regressions against {options["compare"]}.')
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}."))
+
+    def run(self, objects, iterations, only):
+        results = {}
+        for persona in benchmarks.PERSONAS:
+            user = objects['personas'].get(persona)
+            if user is None:
+                self.stderr.write(f"Team {objects['team'].slug} has no {persona}; skipping the persona.")
+                continue
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            for name, arguments in benchmarks.url_names():
+                if only and not any(part in name for part in only):
+                    continue
+                path = benchmarks.url_for(name, arguments, objects)
+                if path is not None:
+                    results[f'{name}:{persona}'] = benchmarks.measure(client, path, iterations)
+        return results
@@ -0,0 +1,147 @@
+import json
+import os
+
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from bug_tracker_v2.tracker import queryplans
+from bug_tracker_v2.tracker.models import Team, TeamMembership
+from bug_tracker_v2.users.models import User
+
+BASELINE_PATH = os.path.join(os.path.dirname(queryplans.__file__), 'explain_baseline.json')
+
+# page name: (url name, the object the url is for, query string)
+HOT_PATHS = {
+    'ticket_list': ('tracker:ticket_list', 'team', ''),
+    'ticket_list_by_priority': ('tracker:ticket_list', 'team', '?sort=priority'),
+    'assigned_ticket_list': ('tracker:assigned_ticket_list', 'team', ''),
+    'project_list': ('tracker:project_list', 'team', ''),
+    'project_details': ('tracker:project_details', 'project', ''),
+    'ticket_details': ('tracker:ticket_details', 'ticket', ''),
+    'manage_subscriptions': ('manage_subscriptions', None, ''),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAINs the queries the hot ticket and project pages run for a team owner and compares their plans against "
+        "the checked-in baseline, flagging sequential scans, sorts spilled to disk and cost regressions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--team', help='Slug of the team whose pages are checked. Defaults to the team with the most tickets.')
+        parser.add_argument('--user', help='Username the pages are rendered for. Defaults to an owner of the team.')
+        parser.add_argument('--baseline', default=BASELINE_PATH, help='Path of the baseline plans file.')
+        parser.add_argument('--update', action='store_true', help='Record the current plans as the new baseline.')
+        parser.add_argument(
+            '--cost-tolerance', type=float, default=queryplans.COST_TOLERANCE,
+            help='Fraction a query\'s planner cost may grow over its baseline before it is flagged.',
+        )
+        parser.add_argument(
+            '--seq-scan-rows', type=int, default=queryplans.SEQ_SCAN_MIN_ROWS,
+            help='Flag sequential scans that read at least this many rows.',
+        )
+
+    def handle(self, *args, **options):
+        baseline = {}
+        if not options['update']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except FileNotFoundError:
+                raise CommandError(f"No baseline at {options['baseline']}; record one with --update.")
+
+        # roll back anything the pages write, like the user's last viewed project
+        with transaction.atomic():
+            objects = self.pick_objects(options['team'], options['user'])
+            summaries = {}
+            for name, path in self.paths(objects).items():
+                summaries[name] = queryplans.summarize(self.capture(path, objects['user']), options['seq_scan_rows'])
+            transaction.set_rollback(True)
+
+        if options['update']:
+            recorded = {
+                name: {key: {field: query[field] for field in ('sql', 'count', 'cost', 'shape')} for key, query in summary.items()}
+                for name, summary in summaries.items()
+            }
+            with open(options['baseline'], 'w') as f:
+                json.dump(recorded, f, indent=2, sort_keys=True)
+                f.write('\n')
+
+        total = 0
+        for name, summary in summaries.items():
+            problems = queryplans.plan_problems_of(summary) if options['update'] else queryplans.compare(
+                summary, baseline.get(name, {}), options['cost_tolerance']
+            )
+            queries = sum(query['count'] for query in summary.values())
+            self.stdout.write(f'{name}: {queries} queries, {len(summary)} distinct, {len(problems)} problems')
+            for key, problem in problems:
+                self.stdout.write(f"  [{key}] {problem}\n    {summary[key]['sql'][:300]}")
+            total += len(problems)
+
+        if options['update']:
+            self.stdout.write(self.style.SUCCESS(f"Recorded the baseline in {options['baseline']}."))
+        elif total:
+            raise CommandError(f'{total} query plan problems.')
+        else:
+            self.stdout.write(self.style.SUCCESS('No query plan regressions.'))
+
+    def pick_objects(self, team_slug, username):
+        teams = Team.objects.all()
+        if team_slug:
+            teams = teams.filter(slug=team_slug)
+        team = teams.annotate(ticket_total=Count('tickets')).order_by('-ticket_total', 'pk').first()
+        if team is None:
+            raise CommandError(f"No team with slug '{team_slug}'." if team_slug else 'There are no teams to check.')
+
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            membership = team.memberships.filter(role=TeamMembership.OWNER).select_related('user').order_by('pk').first()
+            user = membership.user if membership else None
+        if user is None:
+            raise CommandError(f"No user '{username}'." if username else f'Team {team.slug} has no owner.')
+
+        project = team.projects.filter(is_archived=False).order_by(
+            (F('open_ticket_count') + F('closed_ticket_count')).desc(), 'pk'
+        ).first()
+        ticket = project.project_tickets.order_by('-comment_count', 'pk').first() if project else None
+        if ticket is None:
+            raise CommandError(f'Team {team.slug} has no active project with tickets.')
+        return {'team': team, 'project': project, 'ticket': ticket, 'user': user}
+
+    def paths(self, objects):
+        kwargs = {
+            None: {},
+            'team': {'team_slug': objects['team'].slug},
+            'project': {'team_slug': objects['team'].slug, 'project_pk': objects['project'].pk},
+            'ticket': {'team_slug': objects['team'].slug, 'pk': objects['ticket'].pk},
+        }
+        return {
+            name: reverse(url_name, kwargs=kwargs[target]) + query for name, (url_name, target, query) in HOT_PATHS.items()
+        }
+
+    def render(self, path, user):
+        request = RequestFactory().get(path)
+        request.user = user
+        request.session = SessionBase()
+        request._messages = FallbackStorage(request)
+        match = request.resolver_match = resolve(request.path_info)
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.status_code != 200:
+            raise CommandError(f'{path} responded with {response.status_code} for {user.username}.')
+
+    def capture(self, path, user):
+        """The SELECTs rendering the page runs, once the caches it fills are warm."""
+        self.render(path, user)
+        with CaptureQueriesContext(connection) as queries:
+            self.render(path, user)
+        return [query['sql'] for query in queries.captured_queries if query['sql'].lstrip().upper().startswith('SELECT')]
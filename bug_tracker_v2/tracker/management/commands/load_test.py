@@ -0,0 +1,66 @@
+import json
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bug_tracker_v2.tracker import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs simulated users against a running server, listing and opening tickets, commenting, closing and "
+        "reopening and subscribing, and reports requests/s, the error rate and the latency percentiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help='The server to load.')
+        parser.add_argument('--users', type=int, default=10, help='How many users visit the site at the same time.')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds to keep the users going.')
+        parser.add_argument('--think', type=float, default=0.0, help='Mean seconds a user waits between visits.')
+        parser.add_argument('--team', help='Slug of the team whose members are simulated. Defaults to the team with the most tickets.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the users\' choices.')
+        parser.add_argument(
+            '--smtp-port', type=int, help='Run an SMTP sink on this port for the server\'s emails, and count them.'
+        )
+        parser.add_argument('--mail-dir', help='Write the messages the SMTP sink receives to this directory.')
+        parser.add_argument('--output', help='Write the report as JSON to this path.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1.')
+        if options['mail_dir'] and not options['smtp_port']:
+            raise CommandError('--mail-dir needs --smtp-port.')
+        users = loadtest.simulated_users(options['url'], options['users'], options['team'], options['seed'])
+        if not users:
+            raise CommandError('There is no team member with open tickets assigned to them; run seed_scale first.')
+
+        sink = loadtest.SmtpSink(options['smtp_port'], options['mail_dir']) if options['smtp_port'] else None
+        try:
+            with sink or nullcontext():
+                results, wall = loadtest.run(users, options['duration'], options['think'])
+        finally:
+            loadtest.sign_out(users)
+        report = loadtest.report(results, wall)
+        if sink is not None:
+            report['emails'] = sink.messages
+
+        for name, summary in report['urls'].items():
+            self.stdout.write(
+                f"{name}: {summary['requests']} requests, {summary['error_rate']:.1%} errors, "
+                f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, p99 {summary['p99_ms']} ms"
+            )
+        if not results:
+            raise CommandError('No request finished; raise --duration.')
+        self.stdout.write(
+            f"{report['requests']} requests by {options['users']} users in {report['seconds']} s: "
+            f"{report['requests_per_second']} requests/s, {report['error_rate']:.1%} errors, p50 {report['p50_ms']} ms, "
+            f"p95 {report['p95_ms']} ms, p99 {report['p99_ms']} ms, max {report['max_ms']} ms"
+        )
+        self.stdout.write(f"Statuses: {', '.join(f'{status}: {count}' for status, count in report['statuses'].items())}")
+        if sink is not None:
+            self.stdout.write(f"{sink.messages} emails received on port {options['smtp_port']}.")
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({**report, 'users': options['users'], 'url': options['url']}, f, indent=2)
+                f.write('\n')
+            self.stdout.write(f"Wrote the report to {options['output']}.")
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bug_tracker_v2.tracker import profiling
+from bug_tracker_v2.tracker.models import RequestProfile
+
+
+class Command(BaseCommand):
+    help = (
+        'Lists the stored request profiles, exports one as collapsed stacks for flamegraph.pl or speedscope, or prints '
+        'a token that has requests profiled.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', help='Only list the profiles of this url name, e.g. tracker:ticket_details.')
+        parser.add_argument('--limit', type=int, default=20, help='How many of the newest profiles to list.')
+        parser.add_argument('--export', type=int, metavar='ID', help='Write the collapsed stacks of this profile.')
+        parser.add_argument('--output', help='The file --export writes to, instead of standard output.')
+        parser.add_argument(
+            '--token', metavar='USERNAME',
+            help='Print a profiling token for the X-Profile header, issued to an active staff user.',
+        )
+
+    def handle(self, *args, **options):
+        if options['token']:
+            if not profiling.is_staff(options['token']):
+                raise CommandError(f"{options['token']} is not an active staff user.")
+            self.stdout.write(profiling.make_token(options['token']))
+            return
+        if options['export'] is not None:
+            return self.export(options['export'], options['output'])
+
+        profiles = RequestProfile.objects.order_by('-created_on', '-pk')
+        if options['view']:
+            profiles = profiles.filter(view=options['view'])
+        categories = [category for category, _fragments in profiling.CATEGORIES] + [profiling.OTHER]
+        rows = [('id', 'time', 'view', 'request', 'status', 'ms', 'samples', *categories)]
+        for profile in profiles[:options['limit']]:
+            shares = profiling.breakdown(profile.stacks)
+            rows.append((
+                str(profile.pk), f'{profile.created_on:%Y-%m-%d %H:%M:%S}', profile.view,
+                f'{profile.method} {profile.path}', str(profile.status), f'{profile.duration * 1000:.0f}',
+                str(profile.samples), *(f'{shares[category]:.0%}' for category in categories),
+            ))
+        if len(rows) == 1:
+            self.stdout.write('No profiles stored.')
+            return
+        widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+        for row in rows:
+            self.stdout.write('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+    def export(self, pk, output):
+        try:
+            profile = RequestProfile.objects.get(pk=pk)
+        except RequestProfile.DoesNotExist:
+            raise CommandError(f'There is no profile {pk}.')
+        if output:
+            with open(output, 'w') as f:
+                f.write(profile.stacks + '\n')
+            self.stdout.write(f'Wrote {profile.samples} samples of {profile} to {output}.')
+        else:
+            self.stdout.write(profile.stacks)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bug_tracker_v2.tracker import visibility
+from bug_tracker_v2.tracker.models import Project, Team
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the ProjectVisibility table from team owners, project managers and project developers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--team', help='Only rebuild the projects of the team with this slug.')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Number of projects rebuilt per transaction.')
+
+    def handle(self, *args, **options):
+        projects = Project.objects.all()
+        if options['team']:
+            try:
+                team = Team.objects.get(slug=options['team'])
+            except Team.DoesNotExist:
+                raise CommandError(f"No team with slug '{options['team']}'.")
+            projects = projects.filter(team=team)
+        written = visibility.rebuild(projects, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} project visibility rows.'))
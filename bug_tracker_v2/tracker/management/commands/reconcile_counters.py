@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bug_tracker_v2.tracker import counters
+from bug_tracker_v2.tracker.models import Project, Ticket
+
+
+class Command(BaseCommand):
+    help = 'Finds the projects and tickets whose stored ticket, comment and file counters have drifted and repairs them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drifted rows, without repairing them.')
+        parser.add_argument(
+            '--check', action='store_true', help='Like --dry-run, but exit with an error if any counter has drifted.'
+        )
+
+    def handle(self, *args, **options):
+        repair = not (options['dry_run'] or options['check'])
+        total = 0
+        for model in (Project, Ticket):
+            fields = list(counters.actual_counts(model))
+            drifted = list(counters.drifted(model).order_by('pk').values(
+                'pk', *fields, *[f'actual_{field}' for field in fields]
+            ))
+            for row in drifted:
+                changes = ', '.join(
+                    f'{field} {row[field]} -> {row[f"actual_{field}"]}'
+                    for field in fields if row[field] != row[f'actual_{field}']
+                )
+                self.stdout.write(f'{model.__name__} {row["pk"]}: {changes}')
+            if repair and drifted:
+                counters.reconcile(model, [row['pk'] for row in drifted])
+            total += len(drifted)
+            action = 'Repaired' if repair else 'Found'
+            self.stdout.write(f'{action} {len(drifted)} {model._meta.verbose_name_plural} with drifted counters.')
+        if options['check'] and total:
+            raise CommandError(f'{total} rows have drifted counters.')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from bug_tracker_v2.tracker import rendering
+from bug_tracker_v2.tracker.models import Comment, Project, Team, Ticket
+
+
+class Command(BaseCommand):
+    help = 'Stores the rendered HTML of every team, project, ticket and comment whose rendering is missing or stale.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200, help='Rows rendered and written per query.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        for model in (Team, Project, Ticket, Comment):
+            stale = rendering.annotate_hashes(model.objects.all()).filter(rendering.stale_q(model))
+            pks = list(stale.order_by('pk').values_list('pk', flat=True))
+            columns = [f'{field}_{suffix}' for field in model.markdown_fields for suffix in ('html', 'hash')]
+            for start in range(0, len(pks), chunk_size):
+                rows = list(model.objects.filter(pk__in=pks[start:start + chunk_size]).only(
+                    'pk', *model.markdown_fields, *columns
+                ))
+                for row in rows:
+                    row.render_markdown_fields()
+                # bulk_update skips save(), so the rows' auto_now timestamps are left alone
+                model.objects.bulk_update(rows, columns)
+            self.stdout.write(f'Rendered {len(pks)} {model._meta.verbose_name_plural}.')
@@ -0,0 +1,63 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from bug_tracker_v2.tracker import traffic
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays requests captured with DJANGO_TRAFFIC_CAPTURE_RATE against this database at a given concurrency and "
+        "reports the throughput and the latency percentiles, overall and per view."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None, help='The capture file to replay; TRAFFIC_CAPTURE_FILE by default.')
+        parser.add_argument('--concurrency', type=int, default=4, help='How many requests run at the same time.')
+        parser.add_argument('--limit', type=int, help='Only replay the first this many captured requests.')
+        parser.add_argument('--only', action='append', help='Only replay url names containing this; repeatable.')
+        parser.add_argument('--output', help='Write the report as JSON to this path.')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1.')
+        path = options['file'] or settings.TRAFFIC_CAPTURE_FILE
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist; set DJANGO_TRAFFIC_CAPTURE_RATE to capture requests.')
+        captured = [
+            request for request in traffic.read(path)
+            if not options['only'] or any(part in request['view'] for part in options['only'])
+        ][:options['limit']]
+
+        replayed, skipped = traffic.prepare(captured, traffic.LocalObjects())
+        for reason, count in skipped.most_common():
+            self.stderr.write(f'Skipped {count} requests: {reason}.')
+        if not replayed:
+            raise CommandError('No captured requests to replay.')
+
+        # emails are queued as in production, and rolled back with the rest of each request
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], EMAIL_OUTBOX_EAGER=False,
+            TRAFFIC_CAPTURE_RATE=0.0, TRACING_THRESHOLD=None,
+        ):
+            results, wall = traffic.run(replayed, options['concurrency'])
+        report = traffic.report(results, wall)
+
+        for view, summary in report['views'].items():
+            self.stdout.write(
+                f"{view}: {summary['requests']} requests, p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, "
+                f"p99 {summary['p99_ms']} ms"
+            )
+        self.stdout.write(
+            f"{report['requests']} requests in {report['seconds']} s at concurrency {options['concurrency']}: "
+            f"{report['throughput_rps']} requests/s, p50 {report['p50_ms']} ms, p95 {report['p95_ms']} ms, "
+            f"p99 {report['p99_ms']} ms, {report['errors']} errors, {report['status_mismatches']} status mismatches"
+        )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({**report, 'concurrency': options['concurrency'], 'skipped': dict(skipped)}, f, indent=2)
+                f.write('\n')
+            self.stdout.write(f"Wrote the report to {options['output']}.")
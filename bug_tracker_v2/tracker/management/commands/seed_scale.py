@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bug_tracker_v2.tracker.models import Team
+from bug_tracker_v2.tracker.seeding import ScaleSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates large, deterministic teams with bulk inserts: members in mixed roles, projects, and tickets with "
+        "developers, subscribers, comments and file records. For benchmarking; don't run it against production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=2, help='Number of teams to create.')
+        parser.add_argument('--members', type=int, default=1000, help='Members per team.')
+        parser.add_argument('--projects', type=int, default=50, help='Projects per team.')
+        parser.add_argument('--tickets', type=int, default=100000, help='Tickets per team.')
+        parser.add_argument('--comments', type=float, default=3.0, help='Average number of comments per ticket.')
+        parser.add_argument('--files', type=float, default=0.05, help='Fraction of tickets with a file.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed generates the same data.')
+        parser.add_argument(
+            '--prefix', default='scale', help='Prefix of the generated team slugs and usernames, so several runs can coexist.'
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk insert.')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if Team.objects.filter(slug__startswith=f'{prefix}-team-').exists():
+            raise CommandError(f"Teams with the prefix '{prefix}' already exist; pick another --prefix.")
+        started = time.monotonic()
+        ScaleSeeder(
+            teams=options['teams'], members=options['members'], projects=options['projects'],
+            tickets=options['tickets'], comments=options['comments'], files=options['files'], seed=options['seed'],
+            prefix=prefix, chunk_size=options['chunk_size'], log=self.stdout.write,
+        ).run()
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['teams']} teams in {time.monotonic() - started:.0f}s. "
+            f"Every generated user's password is '{ScaleSeeder.password_text}'."
+        ))
@@ -0,0 +1,66 @@
+import smtplib
+import time
+from datetime import timedelta
+
+from django.core import mail
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from bug_tracker_v2.tracker import outbox
+
+# seconds to wait before retrying a connection to the mail provider that could not be opened, doubled up to the maximum
+OPEN_RETRY_DELAY = 1
+MAX_OPEN_RETRY_DELAY = 5 * 60
+
+
+class Command(BaseCommand):
+    help = 'Sends the emails queued in the outbox. Runs until interrupted unless --once is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=outbox.BATCH_SIZE, help='Emails claimed per batch.')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Seconds to sleep when the outbox is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once no more emails are due.')
+        parser.add_argument('--keep-days', type=int, default=14, help='Days to keep sent emails before purging them.')
+
+    def open(self, connection):
+        """Opens the backend connection, retrying with backoff until the mail provider accepts it."""
+        delay = OPEN_RETRY_DELAY
+        while True:
+            try:
+                connection.open()
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                self.stderr.write(f'Could not connect to the mail provider ({e!r}); retrying in {delay}s.')
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_OPEN_RETRY_DELAY)
+
+    def handle(self, *args, **options):
+        keep = timedelta(days=options['keep_days'])
+        connection = mail.get_connection()
+        last_purge = 0
+        try:
+            self.open(connection)
+            while True:
+                batch = outbox.claim_batch(options['batch_size'])
+                if batch:
+                    sent, failed = outbox.deliver(batch, connection)
+                    self.stdout.write(f'Sent {sent}, failed {failed}.')
+                    if failed:
+                        # the failure may have been the connection itself, so start the next batch on a fresh one
+                        connection.close()
+                        self.open(connection)
+                    continue
+                if time.monotonic() - last_purge > 60 * 60:
+                    purged = outbox.purge_sent(keep)
+                    if purged:
+                        self.stdout.write(f'Purged {purged} sent emails.')
+                    last_purge = time.monotonic()
+                if options['once']:
+                    break
+                # long-running process: drop database connections that are broken or past CONN_MAX_AGE while idle
+                close_old_connections()
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
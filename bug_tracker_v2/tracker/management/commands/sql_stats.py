@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from bug_tracker_v2.tracker import sqlstats
+from bug_tracker_v2.tracker.models import SqlStatement
+
+
+class Command(BaseCommand):
+    help = 'Lists the SQL statements that cost the most, per view or summed over the views, or resets the statistics.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--order', choices=sorted(sqlstats.ORDERS), default='total', help='What to rank by.')
+        parser.add_argument('--limit', type=int, default=20, help='How many statements to list.')
+        parser.add_argument('--view', help='Only list the statements of this url name, e.g. tracker:ticket_details.')
+        parser.add_argument(
+            '--by-statement', action='store_true', help='Sum each statement over the views running it.'
+        )
+        parser.add_argument('--reset', action='store_true', help='Delete the statistics collected so far.')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            deleted, _ = SqlStatement.objects.all().delete()
+            self.stdout.write(f'Deleted {deleted} statements.')
+            return
+        statements = sqlstats.top(
+            options['order'], options['limit'], view=options['view'], by_view=not options['by_statement']
+        )
+        if not statements:
+            self.stdout.write('No statements recorded.')
+            return
+        for statement in statements:
+            where = statement['view'] or f"{statement['views']} views"
+            self.stdout.write(
+                f"{statement['fingerprint']}  {where}  calls {statement['calls']}  "
+                f"total {statement['total_seconds'] * 1000:.1f} ms  mean {statement['mean_seconds'] * 1000:.2f} ms  "
+                f"max {statement['max_seconds'] * 1000:.2f} ms  rows {statement['rows']}"
+            )
+            self.stdout.write(f"    {statement['sql']}")
@@ -0,0 +1,43 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from bug_tracker_v2.tracker import tracing
+
+
+class Command(BaseCommand):
+    help = 'Prints the slowest traces written to TRACING_FILE as trees of spans with their durations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None, help='The OTLP/JSON lines file to read; TRACING_FILE by default.')
+        parser.add_argument('--view', help='Only show the traces of this url name, e.g. tracker:ticket_details.')
+        parser.add_argument('--limit', type=int, default=3, help='How many of the slowest traces to show.')
+        parser.add_argument(
+            '--min-ms', type=float, default=1.0, help='Leave out spans shorter than this, with their children.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['file'] or settings.TRACING_FILE
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist; set DJANGO_TRACING_THRESHOLD to write traces.')
+        traces = []
+        for spans in tracing.read(path):
+            nodes = list(tracing.tree(spans, options['min_ms']))
+            if not nodes:
+                continue
+            _depth, root, ms = nodes[0]
+            route = next((a['value'].get('stringValue') for a in root['attributes'] if a['key'] == 'http.route'), None)
+            if options['view'] and route != options['view']:
+                continue
+            traces.append((ms, nodes))
+        traces.sort(key=lambda trace: trace[0], reverse=True)
+        if not traces:
+            self.stdout.write('No traces found.')
+        for _ms, nodes in traces[:options['limit']]:
+            for depth, span, ms in nodes:
+                attributes = {a['key']: next(iter(a['value'].values())) for a in span['attributes']}
+                detail = attributes.get('db.statement') or attributes.get('template.name') or attributes.get(
+                    'code.function') or attributes.get('table.class') or attributes.get('http.target') or ''
+                self.stdout.write(f"{'  ' * depth}{span['name']} {ms:.1f} ms  {detail[:120]}".rstrip())
+            self.stdout.write('')
@@ -0,0 +1,182 @@
+"""Where a worker's memory goes: RSS growth per view and tracemalloc snapshots of the allocation sites.
+
+We run a single gunicorn worker with threads under a fixed memory limit, and it grows whenever a large queryset is
+evaluated whole. config.middleware.MemoryMiddleware reads the worker's resident set size before and after every
+request and adds the growth to the view's totals here. RSS is read from /proc, which costs a system call. As a worker's
+threads share one process, the growth of concurrent requests is attributed to each of them; the numbers point at
+views, they don't account for bytes.
+
+RSS says how much, tracemalloc says where. Tracing allocations slows every allocation down, so it is off until started:
+with PYTHONTRACEMALLOC=<frames> in the environment, or by the first snapshot taken at /memory/?snapshot or with
+`kill -USR2 <worker pid>`. Each snapshot is compared with the one before and the allocation sites that grew most are
+reported; the signal logs the report. A request growing RSS by MEMORY_RSS_THRESHOLD bytes or more is sampled: logged
+with its view and, while tracing, a snapshot. The last MEMORY_KEEP_SAMPLES samples are kept for the endpoint.
+
+All of it is per process, in memory, and starts over when the worker restarts.
+"""
+import json
+import logging
+import os
+import resource
+import signal
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# frames of each allocation's traceback recorded when tracing is started here
+TRACEBACK_FRAMES = 10
+# allocation sites listed in a report
+TOP_SITES = 20
+
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss():
+    """The resident set size of this process in bytes; its peak where /proc isn't available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return peak_rss()
+
+
+def peak_rss():
+    """The largest resident set size of this process so far, in bytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ViewMemory:
+    __slots__ = ('requests', 'growth', 'peak_growth', 'peak_rss')
+
+    def __init__(self):
+        self.requests = 0
+        self.growth = 0
+        self.peak_growth = 0
+        self.peak_rss = 0
+
+    def as_dict(self, view):
+        return {
+            'view': view,
+            'requests': self.requests,
+            'rss_growth_bytes': self.growth,
+            'peak_rss_growth_bytes': self.peak_growth,
+            'peak_rss_bytes': self.peak_rss,
+        }
+
+
+# reentrant: the signal handler may interrupt the main thread holding it
+_lock = threading.RLock()
+_views = {}
+_samples = deque(maxlen=settings.MEMORY_KEEP_SAMPLES)
+_last_snapshot = None
+
+
+def record(view, before, after):
+    """Adds a request to its view's totals, RSS in bytes before and after it, and samples it when it grew RSS past
+    MEMORY_RSS_THRESHOLD."""
+    growth = after - before
+    with _lock:
+        totals = _views.get(view)
+        if totals is None:
+            totals = _views[view] = ViewMemory()
+        totals.requests += 1
+        totals.growth += max(growth, 0)
+        totals.peak_growth = max(totals.peak_growth, growth)
+        totals.peak_rss = max(totals.peak_rss, after)
+    threshold = settings.MEMORY_RSS_THRESHOLD
+    if threshold is not None and growth >= threshold:
+        sample(view, growth, after)
+
+
+def sample(view, growth, after):
+    """Keeps and logs a request that grew RSS by `growth` bytes, with a snapshot report while tracing."""
+    entry = {'time': time.time(), 'view': view, 'rss_growth_bytes': growth, 'rss_bytes': after}
+    if tracemalloc.is_tracing():
+        entry['snapshot'] = snapshot()
+    _samples.append(entry)
+    logger.warning('Request grew memory: %s', json.dumps(entry))
+
+
+def views():
+    """The views' RSS totals as dicts, the largest single growth first."""
+    with _lock:
+        items = [totals.as_dict(view) for view, totals in _views.items()]
+    return sorted(items, key=lambda item: (-item['peak_rss_growth_bytes'], item['view']))
+
+
+def samples():
+    """The kept samples, newest first."""
+    return list(reversed(_samples))
+
+
+def _site(stat):
+    """A tracemalloc Statistic or StatisticDiff as a dict; a Statistic grew by all of its size."""
+    frame = stat.traceback[0]
+    return {
+        'site': f'{frame.filename}:{frame.lineno}',
+        'size_bytes': stat.size,
+        'size_diff_bytes': getattr(stat, 'size_diff', stat.size),
+        'count': stat.count,
+        'count_diff': getattr(stat, 'count_diff', stat.count),
+    }
+
+
+def snapshot(limit=TOP_SITES):
+    """Takes a tracemalloc snapshot, starting tracing if needed, and reports the allocation sites that grew most since
+    the previous one; the first snapshot reports the largest sites instead."""
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEBACK_FRAMES)
+    current = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+    with _lock:
+        previous, _last_snapshot = _last_snapshot, current
+    traced, peak = tracemalloc.get_traced_memory()
+    report = {'traced_bytes': traced, 'traced_peak_bytes': peak, 'compared': previous is not None}
+    stats = current.statistics('lineno') if previous is None else current.compare_to(previous, 'lineno')
+    report['sites'] = [_site(stat) for stat in stats[:limit]]
+    return report
+
+
+def stop():
+    """Stops tracing allocations and forgets the last snapshot."""
+    global _last_snapshot
+    tracemalloc.stop()
+    with _lock:
+        _last_snapshot = None
+
+
+def status():
+    """This process's memory: RSS now and at its peak, whether allocations are traced, the views and the samples."""
+    return {
+        'pid': os.getpid(),
+        'rss_bytes': rss(),
+        'peak_rss_bytes': peak_rss(),
+        'tracing': tracemalloc.is_tracing(),
+        'views': views(),
+        'samples': samples(),
+    }
+
+
+def _on_signal(signum, frame):
+    logger.warning('Memory snapshot of worker %s: %s', os.getpid(), json.dumps(snapshot()))
+
+
+def install_signal_handler():
+    """Logs a snapshot report on MEMORY_SIGNAL. Only the main thread may install handlers, so elsewhere it does
+    nothing."""
+    name = settings.MEMORY_SIGNAL
+    if not name or threading.current_thread() is not threading.main_thread():
+        return
+    signal.signal(getattr(signal, name), _on_signal)
@@ -0,0 +1,187 @@
+"""Per-view request metrics for production, served in the Prometheus text format.
+
+config.middleware.ViewMetricsMiddleware times every request and counts its queries with a database execute wrapper,
+which costs a perf_counter call per query and works with DEBUG off, unlike `connection.queries`. Each observation is
+added to this process's totals for the request's url name, method and status: a latency histogram, the number of
+requests, queries, time spent in queries and response bytes.
+
+Gunicorn runs several worker processes, so per-process totals can't be served as they are: a scrape reaches one
+worker and would see only its share. Instead every worker adds its totals to the ViewMetric table and starts over,
+at most every METRICS_FLUSH_INTERVAL seconds, with one upsert that sums the columns. The table therefore holds
+monotonic counters for all workers together, and the `metrics` endpoint renders it after flushing its own worker.
+Observations not yet flushed when a worker exits are lost, which a counter-based dashboard tolerates.
+
+The totals are guarded by a lock, so threaded workers are counted correctly as well.
+"""
+import bisect
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the latency histogram buckets in seconds; the ViewMetric rows have to be deleted after a change
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# other methods are counted as OTHER, so a client can't create labels at will
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+UNRESOLVED = '<unresolved>'
+PREFIX = 'bug_tracker_'
+
+
+class QueryTimer:
+    """An execute wrapper counting the queries run and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class Totals:
+    __slots__ = ('requests', 'duration_seconds', 'duration_buckets', 'queries', 'query_seconds', 'response_bytes')
+
+    def __init__(self):
+        self.requests = 0
+        self.duration_seconds = 0.0
+        self.duration_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.response_bytes = 0
+
+    def add(self, other):
+        self.requests += other.requests
+        self.duration_seconds += other.duration_seconds
+        self.duration_buckets = [mine + theirs for mine, theirs in zip(self.duration_buckets, other.duration_buckets)]
+        self.queries += other.queries
+        self.query_seconds += other.query_seconds
+        self.response_bytes += other.response_bytes
+
+
+_lock = threading.Lock()
+_pending = {}
+_last_flush = time.monotonic()
+
+
+def view_name(request):
+    """The namespaced url name of the view that handled a request, or UNRESOLVED."""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else UNRESOLVED
+
+
+def record(view, method, status, duration, queries, query_seconds, response_bytes):
+    """Adds one request to this process's totals."""
+    key = (view, method if method in METHODS else 'OTHER', status)
+    bucket = bisect.bisect_left(LATENCY_BUCKETS, duration)
+    with _lock:
+        totals = _pending.get(key)
+        if totals is None:
+            totals = _pending[key] = Totals()
+        totals.requests += 1
+        totals.duration_seconds += duration
+        totals.duration_buckets[bucket] += 1
+        totals.queries += queries
+        totals.query_seconds += query_seconds
+        totals.response_bytes += response_bytes
+
+
+def _upsert_sql():
+    table = connection.ops.quote_name(models.ViewMetric._meta.db_table)
+    return f"""
+        INSERT INTO {table}
+            (view, method, status, requests, duration_seconds, duration_buckets, queries, query_seconds, response_bytes)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (view, method, status) DO UPDATE SET
+            requests = {table}.requests + EXCLUDED.requests,
+            duration_seconds = {table}.duration_seconds + EXCLUDED.duration_seconds,
+            duration_buckets = ARRAY(
+                SELECT coalesce(mine, 0) + coalesce(theirs, 0)
+                FROM unnest({table}.duration_buckets, EXCLUDED.duration_buckets) WITH ORDINALITY AS b(mine, theirs, i)
+                ORDER BY i
+            ),
+            queries = {table}.queries + EXCLUDED.queries,
+            query_seconds = {table}.query_seconds + EXCLUDED.query_seconds,
+            response_bytes = {table}.response_bytes + EXCLUDED.response_bytes
+    """
+
+
+def flush():
+    """Adds this process's totals to the ViewMetric table and starts over. Returns the number of rows written.
+
+    When the write fails, the totals are kept for the next flush.
+    """
+    global _pending, _last_flush
+    with _lock:
+        pending, _pending = _pending, {}
+        _last_flush = time.monotonic()
+    if not pending:
+        return 0
+    rows = [
+        (view, method, status, totals.requests, totals.duration_seconds, totals.duration_buckets, totals.queries,
+         totals.query_seconds, totals.response_bytes)
+        for (view, method, status), totals in sorted(pending.items())
+    ]
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(_upsert_sql(), rows)
+    except DatabaseError:
+        logger.exception('Could not write the view metrics; keeping them for the next flush.')
+        with _lock:
+            for key, totals in pending.items():
+                _pending.setdefault(key, Totals()).add(totals)
+        return 0
+    return len(rows)
+
+
+def maybe_flush():
+    """Flushes when METRICS_FLUSH_INTERVAL seconds have passed since the last flush. None only flushes on scrapes."""
+    interval = settings.METRICS_FLUSH_INTERVAL
+    if interval is not None and time.monotonic() - _last_flush >= interval:
+        flush()
+
+
+def _labels(**labels):
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def render():
+    """The ViewMetric table in the Prometheus text exposition format."""
+    rows = list(models.ViewMetric.objects.order_by('view', 'method', 'status'))
+    lines = [
+        f'# HELP {PREFIX}request_duration_seconds Time from the first to the last middleware, by view.',
+        f'# TYPE {PREFIX}request_duration_seconds histogram',
+    ]
+    for row in rows:
+        labels = {'view': row.view, 'method': row.method, 'status': row.status}
+        cumulative = 0
+        for bound, count in zip((*LATENCY_BUCKETS, '+Inf'), row.duration_buckets):
+            cumulative += count
+            lines.append(f'{PREFIX}request_duration_seconds_bucket{_labels(**labels, le=bound)} {cumulative}')
+        lines.append(f'{PREFIX}request_duration_seconds_sum{_labels(**labels)} {row.duration_seconds!r}')
+        lines.append(f'{PREFIX}request_duration_seconds_count{_labels(**labels)} {row.requests}')
+    for name, field, kind, description in (
+        ('db_queries_total', 'queries', 'counter', 'Database queries run, by view.'),
+        ('db_query_duration_seconds_total', 'query_seconds', 'counter', 'Time spent in database queries, by view.'),
+        ('response_size_bytes_total', 'response_bytes', 'counter', 'Bytes of non-streaming response bodies, by view.'),
+    ):
+        lines.append(f'# HELP {PREFIX}{name} {description}')
+        lines.append(f'# TYPE {PREFIX}{name} {kind}')
+        for row in rows:
+            labels = _labels(view=row.view, method=row.method, status=row.status)
+            lines.append(f'{PREFIX}{name}{labels} {getattr(row, field)!r}')
+    return '\n'.join(lines) + '\n'
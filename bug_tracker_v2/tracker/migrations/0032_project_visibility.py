@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tracker', '0031_auto_20200928_1230'),
+    ]
+
+    def backfill_project_visibility(apps, schema_editor):
+        # a frozen copy of visibility.rebuild(), since migrations must not import the live models
+        Project = apps.get_model('tracker', 'Project')
+        TeamMembership = apps.get_model('tracker', 'TeamMembership')
+        ProjectVisibility = apps.get_model('tracker', 'ProjectVisibility')
+        DEVELOPER, MANAGER, OWNER = 1, 2, 3
+
+        levels = {}
+
+        def grant(user_id, project_id, team_id, access_level):
+            current = levels.get((user_id, project_id))
+            if current is None or current[1] < access_level:
+                levels[(user_id, project_id)] = (team_id, access_level)
+
+        project_teams = {}
+        for project_id, team_id, manager_id in Project.objects.values_list('pk', 'team_id', 'manager_id'):
+            project_teams[project_id] = team_id
+            if manager_id is not None:
+                grant(manager_id, project_id, team_id, MANAGER)
+        for project_id, user_id in Project.developers.through.objects.values_list('project_id', 'user_id'):
+            grant(user_id, project_id, project_teams[project_id], DEVELOPER)
+        for team_id, user_id in TeamMembership.objects.filter(role=OWNER).values_list('team_id', 'user_id'):
+            for project_id, project_team_id in project_teams.items():
+                if project_team_id == team_id:
+                    grant(user_id, project_id, team_id, OWNER)
+
+        ProjectVisibility.objects.bulk_create([
+            ProjectVisibility(user_id=user_id, project_id=project_id, team_id=team_id, access_level=access_level)
+            for (user_id, project_id), (team_id, access_level) in levels.items()
+        ], batch_size=1000)
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectVisibility',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('access_level', models.IntegerField(choices=[(1, 'Developer'), (2, 'Manager'), (3, 'Owner')])),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibility', to='tracker.Project')),
+                ('team', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tracker.Team')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='project_visibility', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='projectvisibility',
+            index=models.Index(fields=['user', 'team', 'project'], name='tracker_visibility_lookup'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='projectvisibility',
+            unique_together={('user', 'project')},
+        ),
+        migrations.RunPython(backfill_project_visibility, migrations.RunPython.noop),
+    ]
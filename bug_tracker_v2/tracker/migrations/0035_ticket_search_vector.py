@@ -0,0 +1,43 @@
+# Generated by Django 3.0.8 on 2026-10-17 02:32
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0034_rendered_markdown'),
+    ]
+
+    def populate_search_vectors(apps, schema_editor):
+        # a frozen copy of search.ticket_search_vector(), since migrations must not import the live models
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        Ticket = apps.get_model('tracker', 'Ticket')
+        Comment = apps.get_model('tracker', 'Comment')
+        comments = Comment.objects.filter(ticket=OuterRef('pk')).order_by().values('ticket').annotate(
+            text=StringAgg('text', delimiter=' ')
+        ).values('text')
+        Ticket.objects.update(search_vector=(
+            SearchVector('title', weight='A', config='english')
+            + SearchVector('description', 'resolution', weight='B', config='english')
+            + SearchVector(Subquery(comments), weight='C', config='english')
+        ))
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='tracker_ticket_search'),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
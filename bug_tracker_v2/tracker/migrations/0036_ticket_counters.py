@@ -0,0 +1,55 @@
+# Generated by Django 3.0.8 on 2026-10-17 02:38
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0035_ticket_search_vector'),
+    ]
+
+    def populate_counters(apps, schema_editor):
+        # a frozen copy of counters.actual_counts(), since migrations must not import the live models
+        Project = apps.get_model('tracker', 'Project')
+        Ticket = apps.get_model('tracker', 'Ticket')
+        Comment = apps.get_model('tracker', 'Comment')
+        TicketFile = apps.get_model('tracker', 'TicketFile')
+
+        def count(model, parent_field, q=Q()):
+            counted = model.objects.filter(q, **{parent_field: OuterRef('pk')}).order_by().values(parent_field)
+            return Coalesce(
+                Subquery(counted.annotate(n=Count('pk')).values('n'), output_field=IntegerField()), Value(0)
+            )
+
+        Project.objects.update(
+            open_ticket_count=count(Ticket, 'project', ~Q(status='closed')),
+            closed_ticket_count=count(Ticket, 'project', Q(status='closed')),
+        )
+        Ticket.objects.update(comment_count=count(Comment, 'ticket'), file_count=count(TicketFile, 'ticket'))
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='closed_ticket_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='open_ticket_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='file_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.0.8 on 2026-10-17 02:52
+
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0036_ticket_counters'),
+    ]
+
+    def populate_priority_ranks(apps, schema_editor):
+        # a frozen copy of Ticket.PRIORITY_RANKS, since migrations must not import the live models
+        ranks = {'urgent': 1, 'high': 2, 'medium': 3, 'low': 4}
+        Ticket = apps.get_model('tracker', 'Ticket')
+        Ticket.objects.update(priority_rank=Case(
+            *[When(priority=priority, then=Value(rank)) for priority, rank in ranks.items()],
+            default=Value(ranks['low']),
+        ))
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='priority_rank',
+            field=models.PositiveSmallIntegerField(default=4, editable=False),
+        ),
+        migrations.RunPython(populate_priority_ranks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['team', 'status', 'priority_rank', 'created_on'], name='tracker_ticket_team_priority'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['project', 'status', 'priority_rank', 'created_on'], name='tracker_ticket_proj_priority'),
+        ),
+    ]
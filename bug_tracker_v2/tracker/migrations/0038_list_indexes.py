@@ -0,0 +1,25 @@
+# Generated by Django 3.0.8 on 2026-10-17 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0037_ticket_priority_rank'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(condition=models.Q(is_archived=False), fields=['team', 'created_on'], name='tracker_project_team_active'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(status='open'), fields=['team', 'created_on'], name='tracker_ticket_team_open'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(status='closed'), fields=['team', 'created_on'], name='tracker_ticket_team_closed'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.0.8 on 2026-10-17 04:21
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0038_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewMetric',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view', models.CharField(max_length=255)),
+                ('method', models.CharField(max_length=10)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('requests', models.BigIntegerField(default=0)),
+                ('duration_seconds', models.FloatField(default=0)),
+                ('duration_buckets', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None)),
+                ('queries', models.BigIntegerField(default=0)),
+                ('query_seconds', models.FloatField(default=0)),
+                ('response_bytes', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('view', 'method', 'status')},
+            },
+        ),
+    ]
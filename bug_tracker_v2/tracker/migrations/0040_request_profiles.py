@@ -0,0 +1,32 @@
+# Generated by Django 3.0.8 on 2026-10-17 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0039_view_metrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view', models.CharField(max_length=255)),
+                ('path', models.CharField(max_length=2000)),
+                ('method', models.CharField(max_length=10)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('duration', models.FloatField()),
+                ('interval', models.FloatField()),
+                ('samples', models.PositiveIntegerField()),
+                ('stacks', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='requestprofile',
+            index=models.Index(fields=['view', '-created_on'], name='tracker_profile_view'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.0.8 on 2026-10-17 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0040_request_profiles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SqlStatement',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view', models.CharField(max_length=255)),
+                ('fingerprint', models.CharField(max_length=12)),
+                ('sql', models.TextField()),
+                ('calls', models.BigIntegerField(default=0)),
+                ('total_seconds', models.FloatField(default=0)),
+                ('max_seconds', models.FloatField(default=0)),
+                ('rows', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('view', 'fingerprint')},
+            },
+        ),
+    ]
@@ -5,34 +5,38 @@ from django.db.models import Q
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.contrib.sites.shortcuts import get_current_site
-from django.utils.html import mark_safe
-from django.core import paginator, mail
+from django.core import paginator
+from django.contrib.postgres.fields import ArrayField, JSONField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
 from django.core.exceptions import ValidationError
-from markdown import markdown
 
+from . import counters, notifications, outbox, roles, visibility
+from .counters import CounterFieldsMixin
 from .model_validators import ContentTypeRestrictedFileField
+from .rendering import RenderedMarkdownMixin
 from .signals import unique_slug_generator
 from .constants import NOTIFICATION_SETTING_DEFAULTS
 
 User = get_user_model()
 
 
+def visible_project_pks(team, user):
+    """A subquery of the pks of the team's projects the user can see, read from the ProjectVisibility table."""
+    return ProjectVisibility.objects.filter(user_id=user.pk, team=team).values('project_id')
+
+
 class ProjectQueryset(models.QuerySet):
-    def filter_for_team_and_user(self, team_slug, user):
-        team = Team.objects.get(slug=team_slug)
-        if user in team.get_owners():
-            return self.filter(team__slug=team_slug)
-        else:
-            return self.filter(Q(team__slug=team_slug), Q(manager=user)|Q(developers=user))
+    def filter_for_team_and_user(self, team_slug, user, team=None):
+        team = team or Team.objects.get(slug=team_slug)
+        return self.filter(team=team, pk__in=visible_project_pks(team, user))
 
 
 class TicketQueryset(models.QuerySet):
-    def filter_for_team_and_user(self, team_slug, user):
-        team = Team.objects.get(slug=team_slug)
-        if user in team.get_owners():
-            return self.filter(team__slug=team_slug)
-        else:
-            return self.filter(Q(team__slug=team_slug), Q(project__manager=user)|Q(project__developers=user))
+    def filter_for_team_and_user(self, team_slug, user, team=None):
+        team = team or Team.objects.get(slug=team_slug)
+        return self.filter(team=team, project_id__in=visible_project_pks(team, user))
 
 
 # owned_teams = models.Team.objects.filter(memberships__role=3, memberships__user=self.request.user).order_by('title')
@@ -48,12 +52,16 @@ class TeamQueryset(models.QuerySet):
         return self.filter(memberships__role=1, memberships__user=user)
 
 
-class Team(models.Model):
+class Team(RenderedMarkdownMixin, models.Model):
     title = models.CharField(unique=True, max_length=255)
     description = models.TextField()
+    description_html = models.TextField(blank=True, default='', editable=False)
+    description_hash = models.CharField(max_length=32, blank=True, default='', editable=False)
     members = models.ManyToManyField(User, related_name='teams', blank=True, through='TeamMembership')
     slug = models.SlugField(unique=True)
 
+    markdown_fields = ('description',)
+
     objects = models.Manager.from_queryset(TeamQueryset)()
 
     def __str__(self):
@@ -67,7 +75,7 @@ class Team(models.Model):
         super().save(*args, **kwargs)
 
     def get_description_as_markdown(self):
-        return mark_safe(markdown(self.description, extensions=['codehilite', 'fenced_code']))
+        return self.get_rendered_markdown('description')
 
     def get_managers(self):
         return self.members.filter(memberships__role=2)
@@ -78,48 +86,63 @@ class Team(models.Model):
     def get_only_members(self):
         return self.members.filter(memberships__role=1)
 
+    # the role changes below run inside the views' transactions, so they read the membership row itself rather than
+    # the role cache, which must not be filled from uncommitted rows
+
+    def _membership(self, user):
+        return self.memberships.filter(user=user).first()
+
     def add_owner(self, user):
-        if user in self.get_managers() or user in self.get_only_members():
-            membership = user.memberships.get(user=user, team=self)
-            membership.role = 3
+        membership = self._membership(user)
+        if membership and membership.role in (TeamMembership.MEMBER, TeamMembership.MANAGER):
+            membership.role = TeamMembership.OWNER
             membership.save()
 
     def remove_owner(self, user):
         if self.get_owners().count() > 1:
-            if user in self.get_owners():
-                membership = user.memberships.get(user=user, team=self)
-                membership.role = 1
+            membership = self._membership(user)
+            if membership and membership.role == TeamMembership.OWNER:
+                membership.role = TeamMembership.MEMBER
                 membership.save()
                 return True
         return False
 
     def add_manager(self, user):
-        if user in self.get_only_members():
-            membership = user.memberships.get(user=user, team=self)
-            if membership.role != 3:
-                membership.role = 2
-                membership.save()
+        membership = self._membership(user)
+        if membership and membership.role == TeamMembership.MEMBER:
+            membership.role = TeamMembership.MANAGER
+            membership.save()
 
     def remove_manager(self, user):
-        if user in self.get_managers():
-            membership = user.memberships.get(user=user, team=self)
-            if membership.role != 3:
-                membership.role = 1
-                membership.save()
-                self.projects.filter(manager=user).update(manager=None)
+        membership = self._membership(user)
+        if membership and membership.role == TeamMembership.MANAGER:
+            membership.role = TeamMembership.MEMBER
+            membership.save()
+            self.unassign_managed_projects(user)
 
     def remove_member(self, user):
-        if user in self.members.all() and user not in self.get_owners():
-            membership = user.memberships.get(user=user, team=self)
-            if membership.role == 2:
-                self.projects.filter(manager=user).update(manager=None)
-            Project.developers.through.objects.filter(project__in=self.projects.all(), user=user).delete()
-            Ticket.developer.through.objects.filter(ticket__team=self, user=user).delete()
+        membership = self._membership(user)
+        if membership and membership.role != TeamMembership.OWNER:
+            if membership.role == TeamMembership.MANAGER:
+                self.unassign_managed_projects(user)
+            user.developer_assigned_projects.remove(*user.developer_assigned_projects.filter(team=self))
+            user.assigned_tickets.remove(*user.assigned_tickets.filter(team=self))
             membership.delete()
 
+    def unassign_managed_projects(self, user):
+        """Clears the manager of every team project managed by the user. Queryset updates bypass post_save, so the
+        cached project staff and the visibility rows are refreshed here."""
+        project_pks = list(self.projects.filter(manager=user).values_list('pk', flat=True))
+        Project.objects.filter(pk__in=project_pks).update(manager=None)
+        for project_pk in project_pks:
+            roles.invalidate_project(project_pk)
+        visibility.refresh_projects(project_pks)
+
     def get_users_role(self, user):
-        membership = user.memberships.get(user=user, team=self)
-        return membership.role
+        role = roles.get_team_role(self, user)
+        if role is None:
+            raise TeamMembership.DoesNotExist
+        return role
 
 
 class TeamMembership(models.Model):
@@ -170,7 +193,7 @@ class TeamInvitation(models.Model):
         message_text = f"""You have been invited to join {team} by {inviter}.
 If you are already registered, click this link to accept this invitation: https://{domain}{(reverse('accept_team_invitation'))}?invitation={invitation_uuid}.
 If you are not registered, click this link to register first: https://{domain}/accounts/signup."""
-        mail.send_mail(
+        outbox.send_mail(
             subject='Team Invitation',
             message=message_text,
             from_email='noreply@monksbugtracker.com',
@@ -178,15 +201,23 @@ If you are not registered, click this link to register first: https://{domain}/a
         )
 
 
-class Project(models.Model):
+class Project(RenderedMarkdownMixin, CounterFieldsMixin, models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
+    description_html = models.TextField(blank=True, default='', editable=False)
+    description_hash = models.CharField(max_length=32, blank=True, default='', editable=False)
     created_on = models.DateTimeField(auto_now_add=True)
     manager = models.ForeignKey(User, related_name='assigned_projects', on_delete=models.CASCADE, null=True, blank=True)
     is_archived = models.BooleanField(default=False)
     developers = models.ManyToManyField(User, related_name='developer_assigned_projects', blank=True)
     team = models.ForeignKey(Team, related_name='projects', on_delete=models.SET_NULL, null=True)
     subscribers = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='project_subscriptions', blank=True)
+    # maintained by tracker/counters.py
+    open_ticket_count = models.PositiveIntegerField(default=0, editable=False)
+    closed_ticket_count = models.PositiveIntegerField(default=0, editable=False)
+
+    markdown_fields = ('description',)
+    counter_fields = ('open_ticket_count', 'closed_ticket_count',)
 
     objects = models.Manager.from_queryset(ProjectQueryset)()
 
@@ -196,17 +227,54 @@ class Project(models.Model):
     def get_absolute_url(self):
         return reverse('tracker:project_details', kwargs={'project_pk': self.pk, 'team_slug': self.team.slug})
 
+    class Meta:
+        indexes = [
+            # the project list: a team's active projects, newest last
+            models.Index(fields=['team', 'created_on'], name='tracker_project_team_active', condition=Q(is_archived=False)),
+        ]
+
     def get_description_as_markdown(self):
-        return mark_safe(markdown(self.description, extensions=['codehilite', 'fenced_code']))
+        return self.get_rendered_markdown('description')
+
 
+class ProjectVisibility(models.Model):
+    """One row per user who can see a project, with the strongest reason they can see it.
 
-class Ticket(models.Model):
+    Rows are maintained by tracker/visibility.py from team ownership, project managers and project developers, so the
+    list views can scope projects and tickets with a single indexed semi-join instead of OR-ing joins together.
+    """
+    DEVELOPER = 1
+    MANAGER = 2
+    OWNER = 3
+
+    ACCESS_LEVELS = (
+        (DEVELOPER, 'Developer',),
+        (MANAGER, 'Manager',),
+        (OWNER, 'Owner',),
+    )
+
+    user = models.ForeignKey(User, related_name='project_visibility', on_delete=models.CASCADE)
+    project = models.ForeignKey(Project, related_name='visibility', on_delete=models.CASCADE)
+    team = models.ForeignKey(Team, related_name='+', on_delete=models.CASCADE, null=True)
+    access_level = models.IntegerField(choices=ACCESS_LEVELS)
+
+    class Meta:
+        unique_together = ('user', 'project',)
+        indexes = [models.Index(fields=['user', 'team', 'project'], name='tracker_visibility_lookup')]
+
+    def __str__(self):
+        return f'{self.user}-{self.project}'
+
+
+class Ticket(RenderedMarkdownMixin, CounterFieldsMixin, models.Model):
     # ticket priority constants
     LOW = 'low'
     MEDIUM = 'medium'
     HIGH = 'high'
     URGENT = 'urgent'
     PRIORITY_CHOICES = [(LOW, 'Low'), (MEDIUM, 'Medium'), (HIGH, 'High'), (URGENT, 'Urgent')]
+    # the order tickets sort in by priority, most urgent first
+    PRIORITY_RANKS = {URGENT: 1, HIGH: 2, MEDIUM: 3, LOW: 4}
 
     # ticket status constants
     OPEN = 'open'
@@ -218,70 +286,105 @@ class Ticket(models.Model):
     user = models.ForeignKey(User, related_name='tickets', on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
     description = models.TextField(null=True, blank=True)
+    description_html = models.TextField(blank=True, default='', editable=False)
+    description_hash = models.CharField(max_length=32, blank=True, default='', editable=False)
     resolution = models.TextField(null=True, default=None, blank=True)
+    resolution_html = models.TextField(blank=True, default='', editable=False)
+    resolution_hash = models.CharField(max_length=32, blank=True, default='', editable=False)
     developer = models.ManyToManyField(User, related_name='assigned_tickets', blank=True)
     project = models.ForeignKey(Project, related_name='project_tickets', on_delete=models.CASCADE)
     priority = models.CharField(choices=PRIORITY_CHOICES, default=LOW, max_length=50)
+    # kept in step with priority by save(), so that sorting by priority can use an index
+    priority_rank = models.PositiveSmallIntegerField(default=PRIORITY_RANKS[LOW], editable=False)
     status = models.CharField(choices=STATUS_CHOICES, default=OPEN, max_length=50)
     created_on = models.DateTimeField(auto_now_add=True)
     last_updated_on = models.DateTimeField(auto_now=True)
     team = models.ForeignKey(Team, related_name='tickets', on_delete=models.SET_NULL, null=True)
     subscribers = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='ticket_subscriptions', blank=True)
+    # maintained by tracker/search.py from the title, description, resolution and comments
+    search_vector = SearchVectorField(null=True, editable=False)
+    # maintained by tracker/counters.py
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    file_count = models.PositiveIntegerField(default=0, editable=False)
+
+    markdown_fields = ('description', 'resolution',)
+    counter_fields = ('comment_count', 'file_count',)
 
     objects = models.Manager.from_queryset(TicketQueryset)()
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the project and status the ticket is counted under, so that a save can tell which counters to move
+        if 'project_id' in instance.__dict__ and 'status' in instance.__dict__:
+            instance._counted_state = counters.ticket_counted_state(instance)
+        return instance
+
     def get_absolute_url(self):
         return reverse('tracker:ticket_details', kwargs={'pk': self.pk, 'team_slug': self.team.slug})
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='tracker_ticket_search'),
+            # the open and closed ticket lists in their default created_on order, and their created date filters
+            models.Index(fields=['team', 'created_on'], name='tracker_ticket_team_open', condition=Q(status='open')),
+            models.Index(fields=['team', 'created_on'], name='tracker_ticket_team_closed', condition=Q(status='closed')),
+            # the ticket lists and project details tables sorted by priority
+            models.Index(fields=['team', 'status', 'priority_rank', 'created_on'], name='tracker_ticket_team_priority'),
+            models.Index(fields=['project', 'status', 'priority_rank', 'created_on'], name='tracker_ticket_proj_priority'),
+        ]
+
     def get_description_as_markdown(self):
-        return mark_safe(markdown(self.description, extensions=['codehilite', 'fenced_code']))
+        return self.get_rendered_markdown('description')
 
     def get_resolution_as_markdown(self):
-        return mark_safe(markdown(self.resolution, extensions=['codehilite', 'fenced_code']))
+        return self.get_rendered_markdown('resolution')
 
     def save(self, *args, **kwargs):
         created = False
         if self.pk == None:
             created = True
+        self.priority_rank = self.PRIORITY_RANKS.get(self.priority, self.PRIORITY_RANKS[self.LOW])
+        if kwargs.get('update_fields') is not None and 'priority' in kwargs['update_fields']:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'priority_rank'}
         super().save(*args, **kwargs)
         if created:
-            email_tuples = []
-            team = self.team
             project = self.project
-            if self.user in team.members.all():
+            # checked against the membership rows: a new ticket is saved inside the view's transaction
+            if self.team.memberships.filter(user=self.user).exists():
                 notification_preference = self.user.notification_settings.get(
                     'auto_subscribe_to_submitted_tickets', NOTIFICATION_SETTING_DEFAULTS.get('auto_subscribe_to_submitted_tickets', True)
                 )
                 if notification_preference:
                     self.subscribers.add(self.user)
-            for user in project.subscribers.all():
-                self.subscribers.add(user)
-                if user in team.members.all() and (user in project.developers.all() or user == project.manager):
-                    email_tuples.append((
-                        f'New ticket submitted to subscribed project {project.title}: {self.title}',
-                        f'A new ticket has been posted to the project {project.title}: {self.title}',
-                        'noreply@monksbugtracker.com',
-                        [user.email]
-                    ))
-            if email_tuples:
-                email_tuples = tuple(email_tuples)
-                mail.send_mass_mail(email_tuples)
+            self.subscribers.add(*project.subscribers.values_list('pk', flat=True))
+            outbox.send_mass_mail(notifications.ticket_event_emails(
+                notifications.ticket_event_recipients(self, subscribed_to=project),
+                f'New ticket submitted to subscribed project {project.title}: {self.title}',
+                f'A new ticket has been posted to the project {project.title}: {self.title}',
+            ))
 
     def get_comments(self, request):
-        queryset = self.comments.all()
+        queryset = self.comments.select_related('user')
         paginator_instance = paginator.Paginator(queryset, 8)
+        # the stored counter saves the COUNT(*) the paginator would otherwise run
+        paginator_instance.count = self.comment_count
         page = request.GET.get('page')
         page_obj = paginator_instance.get_page(page)
         return page_obj
 
 
-class Comment(models.Model):
+class Comment(RenderedMarkdownMixin, models.Model):
     user = models.ForeignKey(User, related_name='comments', on_delete=models.CASCADE)
     created_on = models.DateTimeField(auto_now_add=True)
     text = models.TextField()
+    text_html = models.TextField(blank=True, default='', editable=False)
+    text_hash = models.CharField(max_length=32, blank=True, default='', editable=False)
+
+    markdown_fields = ('text',)
     ticket = models.ForeignKey(Ticket, related_name='comments', on_delete=models.CASCADE)
 
     def __str__(self):
@@ -292,23 +395,15 @@ class Comment(models.Model):
         return reverse('tracker:ticket_details', kwargs={'pk': self.ticket.pk, 'team_slug': self.ticket.team.slug})
 
     def get_text_as_markdown(self):
-        return mark_safe(markdown(self.text, extensions=['codehilite', 'fenced_code']))
+        return self.get_rendered_markdown('text')
 
     def save(self, *args, **kwargs):
         if self.ticket.status == 'open' and not self.ticket.project.is_archived:
-            email_tuples = []
-            team = self.ticket.team
-            project = self.ticket.project
-            for subscriber in self.ticket.subscribers.all():
-                if subscriber in team.members.all() and (subscriber in project.developers.all() or subscriber == project.manager):
-                    email_tuples.append((
-                        f'New comment on subscribed ticket: {self.ticket.title}',
-                        f'Comment posted by {self.user}: {self.text}',
-                        'noreply@monksbugtracker.com',
-                        [subscriber.email]
-                    ))
-            email_tuples = tuple(email_tuples)
-            mail.send_mass_mail(email_tuples)
+            outbox.send_mass_mail(notifications.ticket_event_emails(
+                notifications.ticket_event_recipients(self.ticket),
+                f'New comment on subscribed ticket: {self.ticket.title}',
+                f'Comment posted by {self.user}: {self.text}',
+            ))
         super().save(*args, **kwargs)
 
     class Meta:
@@ -334,3 +429,93 @@ class TicketFile(models.Model):
 
     def __str__(self):
         return self.title
+
+
+class OutboundEmail(models.Model):
+    """An email queued by tracker/outbox.py and delivered by the `send_queued_email` worker."""
+    PENDING = 1
+    SENT = 2
+    FAILED = 3
+
+    STATUSES = (
+        (PENDING, 'Pending',),
+        (SENT, 'Sent',),
+        (FAILED, 'Failed',),
+    )
+
+    subject = models.TextField()
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = JSONField(default=list)
+    status = models.IntegerField(choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_on = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_on = models.DateTimeField(auto_now_add=True)
+    sent_on = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the worker only ever scans pending rows, so sent and failed rows stay out of its index
+            models.Index(fields=['next_attempt_on'], name='tracker_outbox_pending', condition=Q(status=1)),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.recipients)}'
+
+
+class ViewMetric(models.Model):
+    """Request totals of one view, method and status, summed over every worker by tracker/metrics.py."""
+    view = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    status = models.PositiveSmallIntegerField()
+    requests = models.BigIntegerField(default=0)
+    duration_seconds = models.FloatField(default=0)
+    # requests per latency bucket of metrics.LATENCY_BUCKETS, with one more for slower requests
+    duration_buckets = ArrayField(models.BigIntegerField(), default=list)
+    queries = models.BigIntegerField(default=0)
+    query_seconds = models.FloatField(default=0)
+    response_bytes = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('view', 'method', 'status',)
+
+    def __str__(self):
+        return f'{self.method} {self.view} {self.status}'
+
+
+class RequestProfile(models.Model):
+    """The sampled call stacks of one profiled request, in the collapsed format of tracker/profiling.py."""
+    view = models.CharField(max_length=255)
+    path = models.CharField(max_length=2000)
+    method = models.CharField(max_length=10)
+    status = models.PositiveSmallIntegerField()
+    created_on = models.DateTimeField(auto_now_add=True)
+    duration = models.FloatField()
+    interval = models.FloatField()
+    samples = models.PositiveIntegerField()
+    stacks = models.TextField(blank=True)
+
+    class Meta:
+        # the profiles page, filtered by view
+        indexes = [models.Index(fields=['view', '-created_on'], name='tracker_profile_view')]
+
+    def __str__(self):
+        return f'{self.method} {self.view} {self.created_on:%Y-%m-%d %H:%M:%S}'
+
+
+class SqlStatement(models.Model):
+    """Totals of one normalized SQL statement run by one view, summed over every worker by tracker/sqlstats.py."""
+    view = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=12)
+    sql = models.TextField()
+    calls = models.BigIntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+    max_seconds = models.FloatField(default=0)
+    rows = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('view', 'fingerprint',)
+
+    def __str__(self):
+        return f'{self.view} {self.fingerprint}'
@@ -0,0 +1,47 @@
+"""Recipient resolution for ticket event emails (new ticket, new comment, ticket closed).
+
+A subscriber is only emailed about a ticket while they are still a member of the ticket's team and the manager or a
+developer of its project, has an email address and has not turned off the subscribed_ticket_activity setting. All of
+that is checked in one query, instead of testing each subscriber against the team and project member lists.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef, Q
+
+from . import models
+
+User = get_user_model()
+
+TICKET_ACTIVITY_SETTING = 'subscribed_ticket_activity'
+
+
+def ticket_event_recipients(ticket, subscribed_to=None, setting=TICKET_ACTIVITY_SETTING):
+    """Returns (pk, email, notification_settings) rows, ordered by pk, of the users to email about a ticket event.
+
+    Candidates are the subscribers of `subscribed_to`, which is the ticket itself by default; pass the ticket's
+    project to notify project subscribers instead.
+    """
+    subscribed_to = subscribed_to or ticket
+    subscriptions = type(subscribed_to).subscribers.through.objects.filter(
+        **{f'{subscribed_to._meta.model_name}_id': subscribed_to.pk}, user_id=OuterRef('pk')
+    )
+    memberships = models.TeamMembership.objects.filter(team_id=ticket.team_id, user_id=OuterRef('pk'))
+    project = ticket.project
+    developers = models.Project.developers.through.objects.filter(project_id=project.pk, user_id=OuterRef('pk'))
+    return User.objects.annotate(
+        is_project_developer=Exists(developers),
+    ).filter(
+        Exists(subscriptions),
+        Exists(memberships),
+        Q(pk=project.manager_id) | Q(is_project_developer=True),
+    ).exclude(
+        email=''
+    ).exclude(
+        notification_settings__contains={setting: False}
+    ).order_by('pk').values_list('pk', 'email', 'notification_settings', named=True)
+
+
+def ticket_event_emails(recipients, subject, message):
+    """Builds send_mass_mail tuples, one email per recipient."""
+    return tuple(
+        (subject, message, 'noreply@monksbugtracker.com', [recipient.email]) for recipient in recipients
+    )
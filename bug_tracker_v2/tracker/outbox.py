@@ -0,0 +1,132 @@
+"""A database-backed outbox for notification emails.
+
+`send_mail` and `send_mass_mail` take the same arguments as their django.core.mail counterparts, but only insert
+OutboundEmail rows. The rows are written in the caller's transaction, so an email is queued if and only if the change
+it announces is committed, and the request never waits on the mail provider. `manage.py send_queued_email` claims due
+rows in batches, sends them over a single backend connection and reschedules failures with exponential backoff.
+
+With settings.EMAIL_OUTBOX_EAGER the rows are delivered as soon as the transaction that queued them commits (right away
+outside one), which is what the tests and local development use. Delivery is never run while a transaction is open,
+so a slow mail provider cannot keep row locks held. The eager path claims its rows like a worker, so a worker running
+at the same time doesn't send them too, and an error it meets is logged rather than raised from the commit hook: the
+change it announces is already committed, and the rows are left pending for a worker to send once the claim expires.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import mail
+from django.db import transaction
+from django.utils import timezone
+
+from . import models, tracing
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+RETRY_BACKOFF = timedelta(seconds=30)
+MAX_RETRY_BACKOFF = timedelta(hours=6)
+# how long a claimed row is hidden from other workers; a worker that dies mid-batch releases its rows after this
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def send_mail(subject, message, from_email, recipient_list):
+    return send_mass_mail(((subject, message, from_email, recipient_list),))
+
+
+def send_mass_mail(datatuple):
+    """Queues one email per (subject, message, from_email, recipient_list) tuple. Returns the number queued."""
+    emails = [
+        models.OutboundEmail(subject=subject, body=message, from_email=from_email, recipients=list(recipient_list))
+        for subject, message, from_email, recipient_list in datatuple
+        if recipient_list
+    ]
+    if not emails:
+        return 0
+    with tracing.span('email.queue', **{'email.count': len(emails)}):
+        models.OutboundEmail.objects.bulk_create(emails)
+    if getattr(settings, 'EMAIL_OUTBOX_EAGER', False):
+        transaction.on_commit(lambda: deliver_eagerly([email.pk for email in emails]))
+    return len(emails)
+
+
+def retry_backoff(attempts):
+    return min(RETRY_BACKOFF * 2 ** min(attempts - 1, 16), MAX_RETRY_BACKOFF)
+
+
+def _claim(due):
+    """Locks the emails of a queryset of due ones, pushes them out of reach of other workers for CLAIM_LEASE and
+    returns them. The claim is its own short transaction: the rows are not kept locked while the emails are being sent.
+    """
+    with transaction.atomic():
+        emails = list(due.select_for_update(skip_locked=True))
+        models.OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            next_attempt_on=timezone.now() + CLAIM_LEASE
+        )
+    return emails
+
+
+def _due():
+    return models.OutboundEmail.objects.filter(
+        status=models.OutboundEmail.PENDING, next_attempt_on__lte=timezone.now()
+    ).order_by('next_attempt_on')
+
+
+def claim_batch(batch_size=BATCH_SIZE):
+    """Claims up to batch_size due emails, the oldest first, and returns them."""
+    return _claim(_due()[:batch_size])
+
+
+def deliver_eagerly(pks):
+    """Claims and sends the given emails, unless a worker got to them first. Errors are logged, never raised."""
+    try:
+        emails = _claim(_due().filter(pk__in=pks))
+        if emails:
+            deliver(emails)
+    except Exception:
+        logger.exception('Could not send %d queued emails eagerly; leaving them to the worker.', len(pks))
+
+
+def deliver(emails, connection=None):
+    """Sends the emails over one backend connection and records the outcome of each. Returns (sent, failed).
+
+    A connection passed in is left open, so that a worker can reuse it across batches.
+    """
+    if connection is None:
+        with mail.get_connection() as connection:
+            return deliver(emails, connection)
+
+    sent = failed = 0
+    for email in emails:
+        email.attempts += 1
+        message = mail.EmailMessage(
+            email.subject, email.body, email.from_email, email.recipients, connection=connection
+        )
+        try:
+            with tracing.span('email.send', **{'email.recipients': len(email.recipients)}):
+                message.send()
+        except Exception as e:
+            failed += 1
+            email.last_error = repr(e)
+            if email.attempts >= MAX_ATTEMPTS:
+                email.status = models.OutboundEmail.FAILED
+                logger.error(f'Giving up on outbound email {email.pk} after {email.attempts} attempts: {e!r}')
+            else:
+                email.next_attempt_on = timezone.now() + retry_backoff(email.attempts)
+                logger.warning(f'Outbound email {email.pk} failed (attempt {email.attempts}): {e!r}')
+        else:
+            sent += 1
+            email.status = models.OutboundEmail.SENT
+            email.sent_on = timezone.now()
+            email.last_error = ''
+        email.save(update_fields=['attempts', 'status', 'next_attempt_on', 'sent_on', 'last_error'])
+    return sent, failed
+
+
+def purge_sent(older_than):
+    """Deletes emails sent before now - older_than. Returns the number deleted."""
+    deleted, _ = models.OutboundEmail.objects.filter(
+        status=models.OutboundEmail.SENT, sent_on__lt=timezone.now() - older_than
+    ).delete()
+    return deleted
@@ -0,0 +1,202 @@
+"""Keyset (cursor) pagination for the django_tables2 tables.
+
+OFFSET paging has to walk past every skipped row and needs a COUNT(*) for the page links, so deep pages of a large
+team's tickets get slower the further in they are. KeysetPaginator instead continues from the sort key of the last
+row shown: the table's ordering (created_on, last_updated_on, priority_rank, the lower-cased title annotation, a
+foreign key, ...) plus the pk as a tie-breaker, turned into a WHERE clause the ordering index can seek to.
+
+The position is carried in an opaque, signed `cursor` query parameter. A cursor that was issued for a different
+ordering or that fails to verify restarts at the first page. Orderings that cannot be expressed as a keyset (e.g. a
+many-to-many column) fall back to a regular Paginator.
+
+The total is only computed if a template asks for `paginator.count`. With `estimate_count` it is read from the
+planner's row estimate for the query rather than counted.
+"""
+import datetime
+import json
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django_tables2.rows import BoundRows
+
+CURSOR_FIELD = 'cursor'
+CURSOR_SALT = 'tracker.pagination.cursor'
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder truncates datetimes to milliseconds, which would break equality on the sort key."""
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def estimated_count(queryset):
+    """The planner's estimate of the number of rows in the queryset on Postgres, an exact count elsewhere."""
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+def keyset_columns(queryset):
+    """Returns the (name, descending) keys the queryset is ordered by, ending with the pk, or None if the ordering
+    includes something that cannot be compared in a WHERE clause."""
+    columns = []
+    for ordering in queryset.query.order_by:
+        if not isinstance(ordering, str) or '__' in ordering or ordering == '?':
+            return None
+        descending = ordering.startswith('-')
+        name = ordering.lstrip('-')
+        if name == 'pk':
+            name = queryset.model._meta.pk.name
+        if name not in queryset.query.annotations:
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.many_to_many:
+                return None
+            name = field.attname
+        columns.append((name, descending))
+    pk_name = queryset.model._meta.pk.attname
+    if pk_name not in [name for name, _descending in columns]:
+        columns.append((pk_name, False))
+    return columns
+
+
+def _after(name, descending, value):
+    """Q for the rows that sort after `value` on one key, given that Postgres puts NULLs last in ascending order."""
+    if descending:
+        return Q(**{f'{name}__isnull': False}) if value is None else Q(**{f'{name}__lt': value})
+    return Q(pk__in=[]) if value is None else Q(**{f'{name}__gt': value}) | Q(**{f'{name}__isnull': True})
+
+
+def _equal(name, value):
+    return Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+
+def keyset_filter(columns, values):
+    """Q for the rows strictly after the row with the given key values: (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ..."""
+    q = Q(pk__in=[])
+    equal = Q()
+    for (name, descending), value in zip(columns, values):
+        q |= equal & _after(name, descending, value)
+        equal &= _equal(name, value)
+    return q
+
+
+class KeysetPage:
+    is_keyset = True
+    number = None
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """A paginator_class for django_tables2's table_pagination. `object_list` is the table's BoundRows."""
+
+    def __init__(self, object_list, per_page, cursor=None, estimate_count=False, **kwargs):
+        self.rows = object_list
+        self.queryset = object_list.data.data
+        self.per_page = int(per_page)
+        self.cursor = cursor
+        self.estimate_count = estimate_count
+        self.columns = keyset_columns(self.queryset) if hasattr(self.queryset, 'query') else None
+        self.fallback = None
+        if self.columns is None:
+            self.fallback = Paginator(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        if self.fallback is not None:
+            return self.fallback.count
+        return estimated_count(self.queryset) if self.estimate_count else self.queryset.count()
+
+    @property
+    def num_pages(self):
+        if self.fallback is not None:
+            return self.fallback.num_pages
+        return 1
+
+    def _ordering(self):
+        return [f'{"-" if descending else ""}{name}' for name, descending in self.columns]
+
+    def encode_cursor(self, record, backwards=False):
+        values = [getattr(record, name) for name, _descending in self.columns]
+        payload = {'o': self._ordering(), 'v': json.loads(json.dumps(values, cls=CursorEncoder))}
+        if backwards:
+            payload['b'] = True
+        return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        """Returns (values, backwards) for a cursor issued for this ordering, or None."""
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            return None
+        if payload.get('o') != self._ordering() or len(payload.get('v', ())) != len(self.columns):
+            return None
+        values = []
+        for (name, _descending), value in zip(self.columns, payload['v']):
+            if value is not None and name not in self.queryset.query.annotations:
+                value = self.queryset.model._meta.get_field(name).to_python(value)
+            values.append(value)
+        return values, payload.get('b', False)
+
+    def page(self, number=1):
+        if self.fallback is not None:
+            return self.fallback.page(number)
+
+        decoded = self.decode_cursor(self.cursor) if self.cursor else None
+        queryset = self.queryset.order_by(*self._ordering())
+        columns = self.columns
+        backwards = False
+        if decoded is not None:
+            values, backwards = decoded
+            if backwards:
+                columns = [(name, not descending) for name, descending in columns]
+                queryset = queryset.reverse()
+            queryset = queryset.filter(keyset_filter(columns, values))
+
+        records = list(queryset[:self.per_page + 1])
+        has_more = len(records) > self.per_page
+        records = records[:self.per_page]
+        if backwards:
+            records.reverse()
+
+        if not records:
+            return KeysetPage(BoundRows(records, self.rows.table), self)
+        if backwards:
+            next_cursor = self.encode_cursor(records[-1])
+            previous_cursor = self.encode_cursor(records[0], backwards=True) if has_more else None
+        else:
+            next_cursor = self.encode_cursor(records[-1]) if has_more else None
+            previous_cursor = self.encode_cursor(records[0], backwards=True) if decoded is not None else None
+        return KeysetPage(BoundRows(records, self.rows.table), self, next_cursor, previous_cursor)
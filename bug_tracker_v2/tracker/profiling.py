@@ -0,0 +1,183 @@
+"""Sampled request profiles, stored as collapsed stacks for flame graphs.
+
+The request metrics say which view is slow and how much of it is SQL; they can't say whether the rest of a slow
+TicketDetails goes to rendering markdown, to django_tables2 or to building querysets. config.middleware.
+ProfilingMiddleware answers that in production. It profiles a random PROFILING_SAMPLE_RATE fraction of requests,
+none by default, and any request carrying a signed token in an `X-Profile` header. Staff get a token from the
+profiles page or `manage.py profiles --token`. It names the staff user it was issued to, only profiles requests while
+that user is active and staff, and expires after PROFILING_TOKEN_MAX_AGE seconds. It is not accepted in the query
+string, where access logs, Referer headers and the traffic capture would record it.
+
+cProfile would slow the whole request down and loses the call stacks a flame graph needs. A profiled request is
+sampled instead: a background thread records the request thread's stack every PROFILING_INTERVAL seconds, which
+costs the request a few percent. The stacks are stored in the RequestProfile table, one row per request with its url
+name and time, in the collapsed format flamegraph.pl and speedscope read: one line per distinct stack, frames from
+the outermost joined by semicolons, then the number of samples. Only the newest PROFILING_KEEP profiles are kept.
+
+breakdown() attributes each sample to the innermost frame of a known library, for a first answer without a flame
+graph; a query run while rendering a template counts as the ORM's.
+"""
+import functools
+import logging
+import os
+import random
+import sys
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import DatabaseError
+
+from . import metrics, models
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SALT = 'bug_tracker_v2.tracker.profiling'
+HEADER = 'HTTP_X_PROFILE'
+
+# (category, path fragments of its frames), innermost match first
+CATEGORIES = (
+    ('orm', ('django/db/',)),
+    ('markdown', ('markdown/',)),
+    ('tables', ('django_tables2/',)),
+    ('templates', ('django/template/',)),
+)
+OTHER = 'other'
+
+# sys.path entries, longest first, stripped from the file names of frames
+_PREFIXES = sorted({os.path.join(path, '') for path in sys.path if path}, key=len, reverse=True)
+
+
+@functools.lru_cache(maxsize=4096)
+def frame_label(code):
+    """`function (file:first line)`, with the file relative to its sys.path entry."""
+    filename = code.co_filename
+    for prefix in _PREFIXES:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+            break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+def collapse(frame):
+    """The stack ending in the frame, outermost first, as semicolon-separated frame labels."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Records the stack of a thread every `interval` seconds from a background thread while entered."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def collapsed(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in sorted(self.stacks.items()))
+
+
+def make_token(username):
+    """A token that has requests profiled for PROFILING_TOKEN_MAX_AGE seconds, while `username` is an active staff
+    user."""
+    return signing.dumps(username, salt=TOKEN_SALT)
+
+
+def is_staff(username):
+    return get_user_model().objects.filter(username=username, is_active=True, is_staff=True).exists()
+
+
+def should_profile(request):
+    token = request.META.get(HEADER)
+    if token:
+        try:
+            username = signing.loads(token, salt=TOKEN_SALT, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+        except signing.BadSignature:
+            pass
+        else:
+            if is_staff(username):
+                return True
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def store(request, response, sampler, duration):
+    """Saves a profiled request and deletes the profiles beyond the newest PROFILING_KEEP. A failed write is logged,
+    so profiling never fails the request."""
+    try:
+        profile = models.RequestProfile.objects.create(
+            view=metrics.view_name(request),
+            path=request.path[:models.RequestProfile._meta.get_field('path').max_length],
+            method=request.method[:10],
+            status=response.status_code,
+            duration=duration,
+            interval=sampler.interval,
+            samples=sampler.samples,
+            stacks=sampler.collapsed(),
+        )
+        prune(settings.PROFILING_KEEP)
+    except DatabaseError:
+        logger.exception('Could not store the profile of %s.', request.path)
+        return None
+    return profile
+
+
+def prune(keep):
+    """Deletes all but the newest `keep` profiles."""
+    newest_stale = list(models.RequestProfile.objects.order_by('-pk').values_list('pk', flat=True)[keep:keep + 1])
+    if newest_stale:
+        models.RequestProfile.objects.filter(pk__lte=newest_stale[0]).delete()
+
+
+def parse(collapsed):
+    """Yields (stack, samples) from collapsed stacks."""
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if stack:
+            yield stack, int(count)
+
+
+def categorize(stack):
+    for label in reversed(stack.split(';')):
+        for category, fragments in CATEGORIES:
+            if any(fragment in label for fragment in fragments):
+                return category
+    return OTHER
+
+
+def breakdown(collapsed):
+    """{category: fraction of the samples} over CATEGORIES and OTHER, attributing each sample to its innermost frame
+    of a known library."""
+    totals = Counter()
+    for stack, count in parse(collapsed):
+        totals[categorize(stack)] += count
+    samples = sum(totals.values())
+    return {
+        category: totals[category] / samples if samples else 0.0
+        for category in [category for category, _fragments in CATEGORIES] + [OTHER]
+    }
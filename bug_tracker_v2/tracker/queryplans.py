@@ -0,0 +1,154 @@
+"""Query plan checks for the tracker's hot pages.
+
+An index dropped in a migration, or a queryset change that defeats one, doesn't fail any test: the page still
+renders, just slower once a team has enough tickets. `manage.py explain_hot_paths` guards against that. It renders
+each hot page for a team owner, captures the SELECTs the page runs and EXPLAINs them with
+`(ANALYZE, BUFFERS, FORMAT JSON)`. The plans are then compared against the baseline checked in as
+explain_baseline.json, recorded with `--update` against a fresh database filled by `manage.py seed_scale` with its
+default options, so anyone can reproduce it.
+
+Queries are matched to their baseline entry by fingerprint: the SQL with literals and IN lists replaced by
+placeholders, so the same query against different rows gets the same key. A query is flagged when it:
+
+- sequentially scans at least SEQ_SCAN_MIN_ROWS rows,
+- sorts or hashes on disk instead of in memory,
+- has a planner cost more than the tolerance above its baseline cost,
+- changed plan shape (node types, tables and indexes) or runs more often than it did, or
+- has no baseline entry at all.
+
+Planner costs rather than timings are compared, because they don't depend on the load of the machine the check runs
+on.
+"""
+import hashlib
+import json
+import re
+
+from django.db import connection
+
+SEQ_SCAN_MIN_ROWS = 10000
+COST_TOLERANCE = 0.5
+# cost differences below this are noise on any dataset worth checking
+MIN_COST_REGRESSION = 100
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+# the query parameters of SQL from an execute wrapper, which sees it before the values are filled in
+_PLACEHOLDER = re.compile(r'%s')
+_IN_LIST = re.compile(r'\bIN \((?:\s*\?\s*,)*\s*\?\s*\)', re.IGNORECASE)
+_ROW = r'\((?:\s*\?\s*,)*\s*\?\s*\)'
+_VALUES_LIST = re.compile(rf'\bVALUES {_ROW}(?:\s*,\s*{_ROW})*', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """The SQL with its literal values and parameters replaced by `?`, and every IN list and the rows of a multi-row
+    INSERT shortened to `(...)`."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _VALUES_LIST.sub('VALUES (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize_sql(sql).encode()).hexdigest()[:12]
+
+
+def explain(sql):
+    """The root plan node of EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) for a captured SELECT. This runs the query."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}')
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+def walk(node, depth=0):
+    """Yields (node, depth) for every node of a plan tree, parents first."""
+    yield node, depth
+    for child in node.get('Plans', ()):
+        yield from walk(child, depth + 1)
+
+
+def plan_shape(plan):
+    """The plan tree as indented lines of node type, table and index, without costs or row counts."""
+    shape = []
+    for node, depth in walk(plan):
+        label = node['Node Type']
+        if 'Relation Name' in node:
+            label += f" on {node['Relation Name']}"
+        if 'Index Name' in node:
+            label += f" using {node['Index Name']}"
+        shape.append('  ' * depth + label)
+    return shape
+
+
+def _sort_methods(node):
+    yield node.get('Sort Method', ''), node.get('Sort Space Type', '')
+    for groups in ('Full-sort Groups', 'Pre-sorted Groups'):
+        if groups in node:
+            for method in node[groups].get('Sort Methods Used', ()):
+                yield method, 'Disk' if node[groups].get('Sort Space Disk') else ''
+
+
+def plan_problems(plan, seq_scan_min_rows=SEQ_SCAN_MIN_ROWS):
+    """Sequential scans over at least seq_scan_min_rows rows and sorts or hashes that spilled to disk."""
+    problems = []
+    for node, _depth in walk(plan):
+        if node['Node Type'] == 'Seq Scan':
+            scanned = (node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0)) * node.get('Actual Loops', 1)
+            if scanned >= seq_scan_min_rows:
+                problems.append(f"sequential scan of {scanned} rows on {node['Relation Name']}")
+        for method, space in _sort_methods(node):
+            if space == 'Disk' or 'external' in method:
+                problems.append(f"{node['Node Type'].lower()} spilled to disk ({method})")
+        if node.get('Hash Batches', 1) > 1:
+            problems.append(f"hash spilled to disk ({node['Hash Batches']} batches)")
+    return problems
+
+
+def summarize(queries, seq_scan_min_rows=SEQ_SCAN_MIN_ROWS):
+    """Groups captured SELECTs by fingerprint and EXPLAINs the first of each group.
+
+    Returns {fingerprint: {'sql', 'count', 'cost', 'shape', 'problems'}}; 'problems' is left out of baselines.
+    """
+    summary = {}
+    for sql in queries:
+        key = fingerprint(sql)
+        if key in summary:
+            summary[key]['count'] += 1
+            continue
+        plan = explain(sql)
+        summary[key] = {
+            'sql': normalize_sql(sql),
+            'count': 1,
+            'cost': round(plan['Total Cost'], 2),
+            'shape': plan_shape(plan),
+            'problems': plan_problems(plan, seq_scan_min_rows),
+        }
+    return summary
+
+
+def plan_problems_of(summary):
+    """Returns a list of (fingerprint, problem) for the problems found in the plans themselves."""
+    return [(key, problem) for key, query in summary.items() for problem in query['problems']]
+
+
+def compare(summary, baseline, cost_tolerance=COST_TOLERANCE):
+    """Returns a list of (fingerprint, problem) for the queries of a page, given its baseline entries."""
+    problems = plan_problems_of(summary)
+    for key, query in summary.items():
+        expected = baseline.get(key)
+        if expected is None:
+            problems.append((key, 'not in the baseline'))
+            continue
+        if query['shape'] != expected['shape']:
+            problems.append((key, 'plan changed:\n' + '\n'.join(query['shape'])))
+        if query['count'] > expected['count']:
+            problems.append((key, f"runs {query['count']} times, {expected['count']} in the baseline"))
+        if (query['cost'] > expected['cost'] * (1 + cost_tolerance)
+                and query['cost'] - expected['cost'] >= MIN_COST_REGRESSION):
+            problems.append((key, f"cost {query['cost']}, {expected['cost']} in the baseline"))
+    return problems
@@ -0,0 +1,130 @@
+"""Signal receivers for the tracker app. Connected in TrackerConfig.ready()."""
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import counters, invitations, roles, search, visibility
+from .models import Comment, Project, Team, TeamInvitation, TeamMembership, Ticket, TicketFile
+
+
+def _added_pairs(instance, reverse, pk_set):
+    """Normalizes an m2m_changed post_add into (forward pk, related pk) pairs regardless of which side was used."""
+    if reverse:
+        return [(pk, instance.pk) for pk in pk_set]
+    return [(instance.pk, pk) for pk in pk_set]
+
+
+def _changed_forward_pks(sender, instance, action, reverse, model, pk_set):
+    """Returns the pks on the forward side of an auto-created m2m relation touched by an m2m_changed action.
+
+    Auto-created through models never send post_delete, so removals and clears have to be picked up here. A clear
+    from the reverse side does not carry a pk_set, so the affected pks are read on pre_clear, stashed on the instance
+    and returned on post_clear, once the rows are actually gone.
+    """
+    if not reverse:
+        return [instance.pk] if action in ('post_add', 'post_remove', 'post_clear') else []
+    if action in ('post_add', 'post_remove'):
+        return pk_set
+    stash = f'_pre_clear_{sender._meta.model_name}_pks'
+    if action == 'pre_clear':
+        forward_field = f'{model._meta.model_name}_id'
+        setattr(instance, stash, list(sender.objects.filter(user_id=instance.pk).values_list(forward_field, flat=True)))
+    elif action == 'post_clear':
+        return instance.__dict__.pop(stash, [])
+    return []
+
+
+# TeamMembership is an explicit through model, so removals and clears on Team.members delete its rows one by one
+# and post_delete covers them; only additions (which are bulk created) need an m2m_changed receiver.
+
+@receiver(post_save, sender=TeamMembership)
+@receiver(post_delete, sender=TeamMembership)
+def invalidate_membership_role(sender, instance, **kwargs):
+    roles.invalidate_team_roles(instance.team_id, [instance.user_id])
+    visibility.refresh_team_members(instance.team_id, [instance.user_id])
+
+
+@receiver(m2m_changed, sender=Team.members.through)
+def invalidate_added_member_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_add':
+        for team_id, user_id in _added_pairs(instance, reverse, pk_set):
+            roles.invalidate_team_roles(team_id, [user_id])
+            visibility.refresh_team_members(team_id, [user_id])
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project_staff(sender, instance, **kwargs):
+    roles.invalidate_project(instance.pk)
+
+
+@receiver(post_save, sender=Project)
+def refresh_project_visibility(sender, instance, **kwargs):
+    visibility.refresh_projects([instance.pk])
+
+
+@receiver(m2m_changed, sender=Project.developers.through)
+def invalidate_project_developers(sender, instance, action, reverse, model, pk_set, **kwargs):
+    project_ids = _changed_forward_pks(sender, instance, action, reverse, model, pk_set)
+    for project_id in project_ids:
+        roles.invalidate_project(project_id)
+    visibility.refresh_projects(project_ids)
+
+
+@receiver(post_delete, sender=Ticket)
+def invalidate_deleted_ticket_developers(sender, instance, **kwargs):
+    roles.invalidate_ticket(instance.pk)
+
+
+@receiver(m2m_changed, sender=Ticket.developer.through)
+def invalidate_ticket_developers(sender, instance, action, reverse, model, pk_set, **kwargs):
+    for ticket_id in _changed_forward_pks(sender, instance, action, reverse, model, pk_set):
+        roles.invalidate_ticket(ticket_id)
+
+
+@receiver(post_save, sender=Ticket)
+def refresh_ticket_search_vector(sender, instance, **kwargs):
+    search.refresh_tickets([instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def refresh_commented_ticket_search_vector(sender, instance, **kwargs):
+    search.refresh_tickets([instance.ticket_id])
+
+
+@receiver(post_save, sender=Ticket)
+def count_saved_ticket(sender, instance, created, **kwargs):
+    counters.ticket_saved(instance, created)
+
+
+@receiver(post_delete, sender=Ticket)
+def count_deleted_ticket(sender, instance, **kwargs):
+    counters.ticket_deleted(instance)
+
+
+@receiver(post_save, sender=Comment)
+def count_added_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.comment_added(instance.ticket_id)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.comment_added(instance.ticket_id, -1)
+
+
+@receiver(post_save, sender=TicketFile)
+def count_added_file(sender, instance, created, **kwargs):
+    if created:
+        counters.file_added(instance.ticket_id)
+
+
+@receiver(post_delete, sender=TicketFile)
+def count_deleted_file(sender, instance, **kwargs):
+    counters.file_added(instance.ticket_id, -1)
+
+
+@receiver(post_save, sender=TeamInvitation)
+@receiver(post_delete, sender=TeamInvitation)
+def invalidate_pending_invitations(sender, instance, **kwargs):
+    invitations.invalidate_pending_invitations([instance.invitee_id])
@@ -0,0 +1,78 @@
+"""Markdown rendering with the rendered HTML stored next to its source text.
+
+Rendering with codehilite runs Pygments over every code block, which is too slow to repeat on every page view (the
+ticket details page renders a description, a resolution and eight comments). Models using RenderedMarkdownMixin keep
+an `<field>_html` and an `<field>_hash` column for each of their `markdown_fields`; the HTML is re-rendered on save only
+when the hash of the source no longer matches. Reads fall back to rendering on the fly when the stored copy is missing
+or stale, e.g. for rows written before the columns existed or changed with a queryset update.
+
+The hash is MD5 over RENDERER_VERSION and the text, which Postgres can compute too: `stale_q()` finds the rows that
+`manage.py render_markdown` has to backfill without loading them. Bump RENDERER_VERSION whenever
+MARKDOWN_EXTENSIONS or their configuration change, so that every stored copy is regenerated.
+"""
+import hashlib
+
+from django.db.models import F, Q, Value
+from django.db.models.functions import MD5, Concat
+from django.utils.html import mark_safe
+from markdown import markdown
+
+from . import tracing
+
+MARKDOWN_EXTENSIONS = ['codehilite', 'fenced_code']
+RENDERER_VERSION = '1'
+
+
+def render_markdown(text):
+    with tracing.span('markdown.render', **{'markdown.length': len(text or '')}):
+        return markdown(text or '', extensions=MARKDOWN_EXTENSIONS)
+
+
+def content_hash(text):
+    return hashlib.md5(f'{RENDERER_VERSION}:{text or ""}'.encode()).hexdigest()
+
+
+def stale_q(model):
+    """A Q matching the rows of the model with at least one missing or stale rendering. Needs `annotate_hashes`."""
+    q = Q()
+    for field in model.markdown_fields:
+        q |= ~Q(**{f'{field}_hash': F(f'{field}_current_hash')})
+    return q
+
+
+def annotate_hashes(queryset):
+    """Annotates `<field>_current_hash`, the hash of each markdown field as computed by the database."""
+    return queryset.annotate(**{
+        f'{field}_current_hash': MD5(Concat(Value(f'{RENDERER_VERSION}:'), field))
+        for field in queryset.model.markdown_fields
+    })
+
+
+class RenderedMarkdownMixin:
+    markdown_fields = ()
+
+    def render_markdown_fields(self):
+        """Re-renders every markdown field whose source changed. Returns the names of the columns updated."""
+        updated = []
+        for field in self.markdown_fields:
+            digest = content_hash(getattr(self, field))
+            if getattr(self, f'{field}_hash') != digest:
+                setattr(self, f'{field}_html', render_markdown(getattr(self, field)))
+                setattr(self, f'{field}_hash', digest)
+                updated += [f'{field}_html', f'{field}_hash']
+        return updated
+
+    def get_rendered_markdown(self, field):
+        text = getattr(self, field)
+        if getattr(self, f'{field}_hash') == content_hash(text):
+            return mark_safe(getattr(self, f'{field}_html'))
+        return mark_safe(render_markdown(text))
+
+    def save(self, *args, **kwargs):
+        updated = self.render_markdown_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {
+                column for column in updated if column.rsplit('_', 1)[0] in update_fields
+            }
+        super().save(*args, **kwargs)
@@ -0,0 +1,131 @@
+"""Cached role and permission resolution for the tracker permission mixins.
+
+The mixins used to answer "is this user a member/owner of this team?" with `user in team.members.all()`, which pulls
+the whole member list into Python on every request. Instead, every answer is built from three small records kept in
+the default Django cache:
+
+    * a user's role on a team (one key per team/user pair),
+    * a project's manager pk and developer pks (one key per project),
+    * a ticket's developer pks (one key per ticket).
+
+The receivers in receivers.py drop the affected keys whenever a TeamMembership, Project.manager, Project.developers
+or Ticket.developer changes, once the change commits: dropped any earlier, a concurrent request could cache the old
+rows again before the new ones are visible to it. That only reaches every process when the cache is shared between
+them, which is why production uses Redis or the database cache rather than the per-process LocMemCache. A request that
+read the old rows before the commit can still write them back after the keys are dropped, so entries only live for
+ROLE_CACHE_TIMEOUT seconds: a revoked role is honoured at most that long.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from . import models
+
+# bounds how long a stale entry written back after an invalidation can keep a revoked role alive
+ROLE_CACHE_TIMEOUT = 30
+
+# cached in place of None so that a cached "not a member" can be told apart from a cache miss
+NO_ROLE = 0
+
+TEAM_ROLE_KEY = 'tracker:team-role:{team_id}:{user_id}'
+PROJECT_STAFF_KEY = 'tracker:project-staff:{project_id}'
+TICKET_DEVELOPERS_KEY = 'tracker:ticket-developers:{ticket_id}'
+
+
+def _pk(obj):
+    return getattr(obj, 'pk', obj)
+
+
+def invalidate_team_roles(team_id, user_ids):
+    keys = [TEAM_ROLE_KEY.format(team_id=team_id, user_id=user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_project(project_id):
+    key = PROJECT_STAFF_KEY.format(project_id=project_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def invalidate_ticket(ticket_id):
+    key = TICKET_DEVELOPERS_KEY.format(ticket_id=ticket_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def get_team_role(team, user):
+    """Returns the user's TeamMembership role on the team, or None if they are not a member."""
+    team_id, user_id = _pk(team), _pk(user)
+    if team_id is None or user_id is None:
+        return None
+    key = TEAM_ROLE_KEY.format(team_id=team_id, user_id=user_id)
+    role = cache.get(key)
+    if role is None:
+        role = models.TeamMembership.objects.filter(
+            team_id=team_id, user_id=user_id
+        ).values_list('role', flat=True).first() or NO_ROLE
+        cache.set(key, role, ROLE_CACHE_TIMEOUT)
+    return role or None
+
+
+def get_project_staff(project):
+    """Returns a (manager_pk, frozenset of developer pks) tuple for the project."""
+    project_id = _pk(project)
+    key = PROJECT_STAFF_KEY.format(project_id=project_id)
+    staff = cache.get(key)
+    if staff is None:
+        manager_id = models.Project.objects.filter(pk=project_id).values_list('manager_id', flat=True).first()
+        developer_ids = models.Project.developers.through.objects.filter(
+            project_id=project_id
+        ).values_list('user_id', flat=True)
+        staff = (manager_id, frozenset(developer_ids))
+        cache.set(key, staff, ROLE_CACHE_TIMEOUT)
+    return staff
+
+
+def get_ticket_developer_ids(ticket):
+    """Returns a frozenset of the pks of the developers assigned to the ticket."""
+    ticket_id = _pk(ticket)
+    key = TICKET_DEVELOPERS_KEY.format(ticket_id=ticket_id)
+    developer_ids = cache.get(key)
+    if developer_ids is None:
+        developer_ids = frozenset(
+            models.Ticket.developer.through.objects.filter(ticket_id=ticket_id).values_list('user_id', flat=True)
+        )
+        cache.set(key, developer_ids, ROLE_CACHE_TIMEOUT)
+    return developer_ids
+
+
+def is_team_member(team, user):
+    return get_team_role(team, user) is not None
+
+
+def is_team_manager(team, user):
+    return get_team_role(team, user) == models.TeamMembership.MANAGER
+
+
+def is_team_owner(team, user):
+    return get_team_role(team, user) == models.TeamMembership.OWNER
+
+
+def is_project_staff(project, user):
+    """Whether the user is the project's manager or one of its developers."""
+    manager_id, developer_ids = get_project_staff(project)
+    return _pk(user) == manager_id or _pk(user) in developer_ids
+
+
+def can_view_project(team, project, user):
+    """Staff and team owners can view every project; other team members only the ones they manage or develop."""
+    if user.is_staff:
+        return True
+    role = get_team_role(team, user)
+    if role == models.TeamMembership.OWNER:
+        return True
+    if role is None:
+        return False
+    return is_project_staff(project, user)
+
+
+def can_update_ticket(team, ticket, user):
+    """Team owners, the ticket's project manager, the ticket's developers and staff can update a ticket."""
+    if user.is_staff or is_team_owner(team, user):
+        return True
+    manager_id, _developer_ids = get_project_staff(ticket.project_id)
+    return _pk(user) == manager_id or _pk(user) in get_ticket_developer_ids(ticket)
@@ -0,0 +1,83 @@
+"""Ticket table rows fetched in a single query.
+
+The ticket tables used to render full Ticket instances: each row followed `ticket.team` for its link (one query per
+row unless the team happened to be shared), and the developers column needed a separate prefetch of the developer
+many-to-many, which built a User instance for every assignment shown.
+
+`ticket_rows()` turns a ticket queryset into one that selects only what the tables display. The team slug and title,
+the project title and the reporter's username are joined in, and the developers' usernames are aggregated into an
+array by a correlated subquery. Using a subquery rather than a GROUP BY keeps the queryset composable: the filtersets,
+the table's ordering annotations, the search ranking and the keyset paginator all apply to it like to any other
+ticket queryset. Each row comes back as a TicketRow with its links already reversed, so one page of a table is one
+query whatever its size.
+"""
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import CharField, F, OuterRef, Subquery
+from django.db.models.query import ValuesIterable
+from django.urls import reverse
+
+from . import models
+
+ROW_FIELDS = (
+    'id', 'title', 'status', 'priority', 'priority_rank', 'created_on', 'last_updated_on', 'user_id', 'team_id',
+    'project_id',
+)
+
+
+def developer_names():
+    """The usernames of a ticket's developers, in alphabetical order, or NULL if it has none."""
+    assignments = models.Ticket.developer.through.objects.filter(ticket=OuterRef('pk')).order_by().values('ticket')
+    return Subquery(
+        assignments.annotate(names=ArrayAgg('user__username', ordering='user__username')).values('names'),
+        output_field=ArrayField(CharField()),
+    )
+
+
+class TicketRow:
+    """What a ticket table row displays. Every selected column, including annotations like the search rank or the
+    table's ordering keys, is an attribute, so the keyset paginator can read its cursor values off the row."""
+    _priority_labels = dict(models.Ticket.PRIORITY_CHOICES)
+
+    def __init__(self, values):
+        self.__dict__.update(values)
+        self.pk = self.id
+        if self.team_slug is None:
+            self.url = self.project_url = self.team_url = None
+        else:
+            self.url = reverse('tracker:ticket_details', kwargs={'team_slug': self.team_slug, 'pk': self.id})
+            self.project_url = reverse(
+                'tracker:project_details', kwargs={'team_slug': self.team_slug, 'project_pk': self.project_id}
+            )
+            self.team_url = reverse('team_details', kwargs={'team_slug': self.team_slug})
+
+    def __str__(self):
+        return self.title
+
+    def get_absolute_url(self):
+        return self.url
+
+    def get_priority_display(self):
+        return self._priority_labels.get(self.priority, self.priority)
+
+
+class TicketRowIterable(ValuesIterable):
+    def __iter__(self):
+        for values in super().__iter__():
+            yield TicketRow(values)
+
+
+def ticket_rows(queryset):
+    """Returns the ticket queryset as one yielding TicketRows. Annotations already on it are kept, and ones added
+    later (e.g. by a table's order_FOO method) are selected too."""
+    queryset = queryset.annotate(
+        team_slug=F('team__slug'),
+        team_title=F('team__title'),
+        project_title=F('project__title'),
+        user_name=F('user__username'),
+        developer_names=developer_names(),
+    )
+    queryset = queryset.values(*ROW_FIELDS, *queryset.query.annotations)
+    # the same hook values_list(named=True) uses to build its rows
+    queryset._iterable_class = TicketRowIterable
+    return queryset
@@ -0,0 +1,88 @@
+"""Full-text ticket search.
+
+Every ticket keeps a `search_vector` built from its title (weight A), description and resolution (B) and the text of
+its comments (C). The receivers in receivers.py rebuild it with a single UPDATE whenever the ticket or one of its
+comments is saved or deleted, and the GIN index on it keeps searches off a sequential scan of the ticket table.
+
+Search terms are matched as prefixes, so a partial word like "logi" still finds "login", which is what the title
+`icontains` filters this replaces did. Databases other than Postgres have no tsvector support, so there the search
+falls back to `icontains` over the same fields. So does a search made only of stopwords ("the", "a"): the english
+configuration drops every word of it, and the empty tsquery left would match nothing.
+"""
+import re
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery
+
+from . import models
+
+SEARCH_CONFIG = 'english'
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def ticket_search_vector():
+    """The expression `search_vector` is set to, for use in an UPDATE over the ticket table."""
+    comments = models.Comment.objects.filter(ticket=OuterRef('pk')).order_by().values('ticket').annotate(
+        text=StringAgg('text', delimiter=' ')
+    ).values('text')
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', 'resolution', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(Subquery(comments), weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def refresh_tickets(ticket_ids):
+    if is_supported():
+        models.Ticket.objects.filter(pk__in=list(ticket_ids)).update(search_vector=ticket_search_vector())
+
+
+def _prefix_terms(text):
+    """The raw tsquery text matching every word of `text` as a prefix, or None if it has no words."""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return ' & '.join(f'{word}:*' for word in words)
+
+
+def prefix_query(text):
+    """Turns free text into a tsquery matching tickets that contain every word, each as a prefix, or None."""
+    terms = _prefix_terms(text)
+    if terms is None:
+        return None
+    return SearchQuery(terms, search_type='raw', config=SEARCH_CONFIG)
+
+
+def only_stopwords(text):
+    """Whether every word of `text` is a stopword, which leaves its tsquery empty."""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT numnode(to_tsquery(%s::regconfig, %s))', [SEARCH_CONFIG, _prefix_terms(text)])
+        return cursor.fetchone()[0] == 0
+
+
+def contains(queryset, text):
+    """Filters a ticket queryset down to the tickets whose text contains `text`, without the search vector."""
+    commented = models.Comment.objects.filter(text__icontains=text).values('ticket')
+    return queryset.filter(
+        Q(title__icontains=text) | Q(description__icontains=text) | Q(resolution__icontains=text)
+        | Q(pk__in=commented)
+    )
+
+
+def search_tickets(queryset, text):
+    """Filters a ticket queryset down to the matches for `text`, best matches first."""
+    if not is_supported():
+        return contains(queryset, text)
+    query = prefix_query(text)
+    if query is None:
+        return queryset
+    if only_stopwords(text):
+        return contains(queryset, text)
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=SearchRank(F('search_vector'), query)
+    ).order_by('-search_rank', '-created_on')
@@ -0,0 +1,265 @@
+"""A deterministic generator of large, production-shaped tenants for performance work.
+
+The test helpers create a handful of rows one `save()` at a time, which says nothing about how a page behaves for a
+team with a hundred thousand tickets. ScaleSeeder writes whole tenants with `bulk_create` in chunks: teams with
+thousands of members in mixed roles, projects with managers and developers, and tickets with developers,
+subscribers, comments and file records (stubs; no file is written to storage).
+
+The shape loosely follows what a long-lived team accumulates: a few projects get most of the tickets, most tickets
+are closed, a ticket's developers come from its project's developers, and comments and files cluster on a minority of
+tickets. Every choice is drawn from a `random.Random(seed)`, and timestamps are offsets from a fixed date. The same
+seed and options therefore produce the same rows (primary keys aside), so measurements taken on different machines or
+before and after a change are comparable.
+
+`bulk_create` skips `save()` and the signal receivers, so the derived data they maintain is written here instead:
+priority ranks and rendered markdown as rows are built, and the project visibility table, the ticket counters and
+the search vectors once all rows exist. Finally the tables are analyzed, so the planner sees the new row counts.
+"""
+import datetime
+import random
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.utils.text import slugify
+
+from . import counters, models, rendering, search, visibility
+from bug_tracker_v2.users.models import User
+
+EPOCH = datetime.datetime(2018, 1, 1, tzinfo=datetime.timezone.utc)
+SPAN = datetime.timedelta(days=3 * 365)
+
+WORDS = (
+    'login', 'dashboard', 'export', 'report', 'invoice', 'search', 'upload', 'profile', 'settings', 'email',
+    'notification', 'payment', 'checkout', 'session', 'cache', 'timeout', 'permission', 'import', 'calendar', 'api',
+)
+PROBLEMS = (
+    'fails for', 'is slow on', 'crashes when opening', 'shows the wrong', 'does not save', 'times out on',
+    'renders a blank', 'duplicates the', 'ignores the', 'loses the',
+)
+DESCRIPTIONS = (
+    'Steps to reproduce:\n\n1. Open the {a} page\n2. Start the {b}\n\nThe {b} {p} {a} every time.',
+    'Since the last release the {a} {p} {b}. It worked before.',
+    'Seen in production:\n\n```\nError: {a} {p} {b}\n```\n\nHappens for about one in ten users.',
+    'The {a} should update the {b}, but it {p} it instead.',
+)
+COMMENTS = (
+    'I can reproduce this.', 'Looking into it.', 'Fixed on the `{a}` branch, please check.',
+    'Still happening after the last deploy.', 'This is related to the {a} issue from last month.',
+    'Can we raise the priority? Customers are asking about the {a}.', 'Closing, this works for me now.',
+)
+PRIORITIES = (models.Ticket.LOW, models.Ticket.MEDIUM, models.Ticket.HIGH, models.Ticket.URGENT)
+PRIORITY_WEIGHTS = (50, 30, 15, 5)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+@contextmanager
+def stored_timestamps(*model_classes):
+    """Lets bulk_create keep the generated created/updated timestamps instead of overwriting them with now()."""
+    fields = [
+        field for model in model_classes for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class ScaleSeeder:
+    password_text = 'password'
+
+    def __init__(self, teams=2, members=1000, projects=50, tickets=100000, comments=3.0, files=0.05,
+                 seed=0, prefix='scale', chunk_size=5000, log=None):
+        self.teams = teams
+        self.members = members
+        self.projects = projects
+        self.tickets = tickets
+        self.comments = comments
+        self.files = files
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.rng = random.Random(seed)
+        self.log = log or (lambda message: None)
+        self.password = make_password(self.password_text)
+        self._rendered = {}
+
+    def timestamp(self, fraction):
+        """The moment `fraction` (0 to 1) of the way through the seeded history."""
+        return EPOCH + SPAN * fraction
+
+    def markdown(self, instance, field, text):
+        """Sets a markdown field with its stored rendering, rendering each distinct text only once."""
+        if text not in self._rendered:
+            self._rendered[text] = (rendering.render_markdown(text), rendering.content_hash(text))
+        setattr(instance, field, text)
+        setattr(instance, f'{field}_html', self._rendered[text][0])
+        setattr(instance, f'{field}_hash', self._rendered[text][1])
+
+    def text(self, templates):
+        a, b = self.rng.sample(WORDS, 2)
+        return self.rng.choice(templates).format(a=a, b=b, p=self.rng.choice(PROBLEMS))
+
+    def bulk_create(self, model, instances):
+        created = []
+        with stored_timestamps(model):
+            for chunk in chunked(instances, self.chunk_size):
+                created += model.objects.bulk_create(chunk)
+        return created
+
+    def bulk_link(self, through, pairs):
+        """bulk_creates many-to-many rows from (dict of field values) without keeping them in memory."""
+        count = 0
+        for chunk in chunked(pairs, self.chunk_size):
+            through.objects.bulk_create([through(**fields) for fields in chunk])
+            count += len(chunk)
+        return count
+
+    def run(self):
+        for number in range(1, self.teams + 1):
+            self.seed_team(number)
+        self.log('Rebuilding project visibility.')
+        team_slugs = [f'{self.prefix}-team-{number}' for number in range(1, self.teams + 1)]
+        projects = models.Project.objects.filter(team__slug__in=team_slugs)
+        visibility.rebuild(projects, chunk_size=self.chunk_size)
+        self.log('Reconciling counters and search vectors.')
+        counters.reconcile(models.Project, list(projects.values_list('pk', flat=True)))
+        ticket_pks = models.Ticket.objects.filter(team__slug__in=team_slugs).order_by('pk').values_list('pk', flat=True)
+        for chunk in chunked(ticket_pks.iterator(), self.chunk_size):
+            counters.reconcile(models.Ticket, chunk)
+            search.refresh_tickets(chunk)
+        self.log('Analyzing the seeded tables.')
+        self.analyze()
+
+    def analyze(self):
+        """Refreshes the planner statistics of the seeded tables, which a bulk load leaves stale.
+
+        Outside a transaction the tables are vacuumed as well, setting the visibility map that index-only scans depend
+        on; otherwise plans on a freshly seeded database differ from the ones it settles into once autovacuum runs.
+        """
+        if connection.vendor != 'postgresql':
+            return
+        statement = 'ANALYZE' if connection.in_atomic_block else 'VACUUM ANALYZE'
+        seeded = (
+            User, models.Team, models.TeamMembership, models.Project, models.Project.developers.through,
+            models.ProjectVisibility, models.Ticket, models.Ticket.developer.through, models.Ticket.subscribers.through,
+            models.Comment, models.TicketFile,
+        )
+        with connection.cursor() as cursor:
+            for model in seeded:
+                cursor.execute(f'{statement} {connection.ops.quote_name(model._meta.db_table)}')
+
+    def seed_team(self, number):
+        rng = self.rng
+        title = f'{self.prefix.title()} Team {number}'
+        team = models.Team(title=title, slug=slugify(f'{self.prefix}-team-{number}'))
+        self.markdown(team, 'description', f'Seeded team {number}.')
+        team.save()
+
+        joined = self.timestamp(0)
+        users = self.bulk_create(User, (
+            User(
+                username=f'{self.prefix}-{number}-{index}', email=f'{self.prefix}-{number}-{index}@example.com',
+                password=self.password, date_joined=joined,
+            )
+            for index in range(self.members)
+        ))
+        # the first member owns the team; a couple more owners and about one in twenty managers
+        roles = [models.TeamMembership.OWNER] + [
+            rng.choices(
+                (models.TeamMembership.OWNER, models.TeamMembership.MANAGER, models.TeamMembership.MEMBER), (1, 6, 93)
+            )[0]
+            for _user in users[1:]
+        ]
+        self.bulk_create(models.TeamMembership, (
+            models.TeamMembership(team=team, user=user, role=role) for user, role in zip(users, roles)
+        ))
+        managers = [user for user, role in zip(users, roles) if role != models.TeamMembership.MEMBER]
+        self.log(f'{title}: {len(users)} members, {len(managers)} owners and managers.')
+
+        projects = []
+        for index in range(self.projects):
+            project = models.Project(
+                title=f'{rng.choice(WORDS).title()} {index + 1}', team=team, manager=rng.choice(managers),
+                created_on=self.timestamp(rng.random() * 0.5), is_archived=rng.random() < 0.1,
+            )
+            self.markdown(project, 'description', self.text(DESCRIPTIONS))
+            projects.append(project)
+        projects = self.bulk_create(models.Project, projects)
+        developers = {project.pk: rng.sample(users, min(len(users), rng.randint(5, 20))) for project in projects}
+        self.bulk_link(models.Project.developers.through, (
+            {'project_id': project.pk, 'user_id': user.pk} for project in projects for user in developers[project.pk]
+        ))
+        # a few projects get most of the tickets
+        project_weights = [1 / (rank + 1) for rank in range(len(projects))]
+
+        tickets_created = 0
+        for start in range(0, self.tickets, self.chunk_size):
+            tickets = []
+            for index in range(start, min(start + self.chunk_size, self.tickets)):
+                project = rng.choices(projects, project_weights)[0]
+                # projects start in the first half of the history, tickets arrive steadily over the second
+                created_on = self.timestamp(0.5 + 0.5 * index / self.tickets)
+                priority = rng.choices(PRIORITIES, PRIORITY_WEIGHTS)[0]
+                closed = rng.random() < 0.75 * (1 - index / self.tickets) + 0.1
+                ticket = models.Ticket(
+                    title=f'{rng.choice(WORDS).title()} {rng.choice(PROBLEMS)} {rng.choice(WORDS)}',
+                    user=rng.choice(users), project=project, team=team, priority=priority,
+                    priority_rank=models.Ticket.PRIORITY_RANKS[priority],
+                    status=models.Ticket.CLOSED if closed else models.Ticket.OPEN,
+                    created_on=created_on,
+                    last_updated_on=created_on + datetime.timedelta(hours=rng.randint(0, 24 * 60)),
+                )
+                self.markdown(ticket, 'description', self.text(DESCRIPTIONS))
+                self.markdown(ticket, 'resolution', 'Fixed.' if closed else '')
+                tickets.append(ticket)
+            tickets = self.bulk_create(models.Ticket, tickets)
+            self.seed_ticket_relations(tickets, users, developers)
+            tickets_created += len(tickets)
+            self.log(f'{title}: {tickets_created}/{self.tickets} tickets.')
+
+    def seed_ticket_relations(self, tickets, users, developers):
+        rng = self.rng
+        assigned = {ticket.pk: rng.sample(developers[ticket.project_id], rng.choice((0, 1, 1, 1, 2, 2, 3))) for ticket in tickets}
+        self.bulk_link(models.Ticket.developer.through, (
+            {'ticket_id': ticket.pk, 'user_id': user.pk} for ticket in tickets for user in assigned[ticket.pk]
+        ))
+        self.bulk_link(models.Ticket.subscribers.through, (
+            {'ticket_id': ticket.pk, 'user_id': user_pk}
+            for ticket in tickets
+            for user_pk in {ticket.user_id, *(user.pk for user in assigned[ticket.pk])}
+        ))
+
+        comments = []
+        ticket_files = []
+        for ticket in tickets:
+            # most tickets get a comment or two, a few get long threads
+            count = min(int(rng.expovariate(1 / self.comments)), 50) if self.comments else 0
+            people = [ticket.user] + assigned[ticket.pk]
+            for index in range(count):
+                comment = models.Comment(
+                    ticket=ticket, user=rng.choice(people),
+                    created_on=ticket.created_on + datetime.timedelta(hours=index * rng.randint(1, 48)),
+                )
+                self.markdown(comment, 'text', self.text(COMMENTS))
+                comments.append(comment)
+            if rng.random() < self.files:
+                ticket_files.append(models.TicketFile(
+                    ticket=ticket, title=f'attachment-{ticket.pk}.txt', uploaded_by=ticket.user,
+                    uploaded_on=ticket.created_on, file=f'ticket_files/seeded/attachment-{ticket.pk}.txt',
+                ))
+        self.bulk_create(models.Comment, comments)
+        self.bulk_create(models.TicketFile, ticket_files)
@@ -0,0 +1,183 @@
+"""Per-view SQL statement statistics, like pg_stat_statements but broken down by the view that ran them.
+
+The request metrics count a view's queries and the query budgets catch a view running more of them; neither says
+which statement is the expensive one, and pg_stat_statements can't say which view runs it. config.middleware.
+SqlStatsMiddleware collects that with a database execute wrapper, so it works with DEBUG off. Each statement is
+normalized with queryplans.normalize_sql, which replaces the literals and parameters and shortens IN lists, and
+counted under its fingerprint: calls, total and slowest time, and the rows it returned or changed.
+
+Memory is bounded twice over. A request keeps one entry per distinct statement, not one per query, and normalizing
+is cached per SQL string in an LRU cache. A worker keeps at most SQL_STATS_MAX_ENTRIES (view, fingerprint) pairs;
+like metrics.py, it adds them to the SqlStatement table and starts over every METRICS_FLUSH_INTERVAL seconds, or as
+soon as the limit is reached. Statements of a new pair arriving while the worker is full are dropped, and counted as
+such; that takes a single request running more distinct statements than the limit.
+
+The table holds the totals of all workers together. The ORM produces a fixed set of statements per view once the
+literals are gone, so it stays small; `manage.py sql_stats --reset` empties it to start a new measurement.
+"""
+import functools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, F, FloatField, Max, Sum
+from django.db.models.functions import Cast
+
+from . import models, queryplans
+
+logger = logging.getLogger(__name__)
+
+# characters of normalized SQL kept per statement
+MAX_SQL_LENGTH = 2000
+
+# the orders of top(), by the annotation they sort on
+ORDERS = {
+    'total': 'seconds',
+    'calls': 'call_count',
+    'mean': 'mean',
+    'max': 'slowest',
+    'rows': 'row_count',
+}
+
+
+@functools.lru_cache(maxsize=2048)
+def normalize(sql):
+    """(fingerprint, normalized SQL) of a statement."""
+    normalized = queryplans.normalize_sql(sql)
+    return queryplans.fingerprint(normalized), normalized[:MAX_SQL_LENGTH]
+
+
+class Statement:
+    __slots__ = ('sql', 'calls', 'seconds', 'max_seconds', 'rows')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+
+    def add(self, other):
+        self.calls += other.calls
+        self.seconds += other.seconds
+        self.max_seconds = max(self.max_seconds, other.max_seconds)
+        self.rows += other.rows
+
+
+class StatementLog:
+    """An execute wrapper adding up the queries run by fingerprint, in `statements`."""
+
+    def __init__(self):
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - started
+            key, normalized = normalize(sql)
+            statement = self.statements.get(key)
+            if statement is None:
+                statement = self.statements[key] = Statement(normalized)
+            statement.calls += 1
+            statement.seconds += seconds
+            statement.max_seconds = max(statement.max_seconds, seconds)
+            statement.rows += max(context['cursor'].rowcount, 0)
+
+
+_lock = threading.Lock()
+_pending = {}
+_last_flush = time.monotonic()
+dropped = 0
+
+
+def record(view, statements):
+    """Adds a request's statements, a StatementLog's `statements`, to this process's totals."""
+    global dropped
+    limit = settings.SQL_STATS_MAX_ENTRIES
+    with _lock:
+        for key, statement in statements.items():
+            totals = _pending.get((view, key))
+            if totals is None:
+                if limit is not None and len(_pending) >= limit:
+                    dropped += statement.calls
+                    continue
+                totals = _pending[(view, key)] = Statement(statement.sql)
+            totals.add(statement)
+
+
+def _upsert_sql():
+    table = connection.ops.quote_name(models.SqlStatement._meta.db_table)
+    return f"""
+        INSERT INTO {table} (view, fingerprint, sql, calls, total_seconds, max_seconds, rows)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (view, fingerprint) DO UPDATE SET
+            calls = {table}.calls + EXCLUDED.calls,
+            total_seconds = {table}.total_seconds + EXCLUDED.total_seconds,
+            max_seconds = greatest({table}.max_seconds, EXCLUDED.max_seconds),
+            rows = {table}.rows + EXCLUDED.rows
+    """
+
+
+def flush():
+    """Adds this process's totals to the SqlStatement table and starts over. Returns the number of rows written.
+
+    When the write fails, the totals are kept for the next flush, as far as SQL_STATS_MAX_ENTRIES allows.
+    """
+    global _pending, _last_flush
+    with _lock:
+        pending, _pending = _pending, {}
+        _last_flush = time.monotonic()
+    if not pending:
+        return 0
+    rows = [
+        (view, key, statement.sql, statement.calls, statement.seconds, statement.max_seconds, statement.rows)
+        for (view, key), statement in sorted(pending.items())
+    ]
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(_upsert_sql(), rows)
+    except DatabaseError:
+        logger.exception('Could not write the SQL statement statistics; keeping them for the next flush.')
+        for (view, key), statement in pending.items():
+            record(view, {key: statement})
+        return 0
+    return len(rows)
+
+
+def maybe_flush():
+    """Flushes when METRICS_FLUSH_INTERVAL seconds have passed since the last flush, or when the totals are full."""
+    interval = settings.METRICS_FLUSH_INTERVAL
+    limit = settings.SQL_STATS_MAX_ENTRIES
+    if ((interval is not None and time.monotonic() - _last_flush >= interval)
+            or (limit is not None and len(_pending) >= limit)):
+        flush()
+
+
+def top(order='total', limit=20, view=None, by_view=True):
+    """The statements with the highest `order`, a key of ORDERS, as dicts. Without by_view, each statement is summed
+    over the views running it and its 'view' is None."""
+    statements = models.SqlStatement.objects.all()
+    if view:
+        statements = statements.filter(view=view)
+    statements = statements.values(*(('view', 'fingerprint') if by_view else ('fingerprint',))).annotate(
+        statement=Max('sql'), call_count=Sum('calls'), seconds=Sum('total_seconds'), slowest=Max('max_seconds'),
+        row_count=Sum('rows'), view_count=Count('view', distinct=True),
+    ).annotate(mean=F('seconds') / Cast('call_count', FloatField()))
+    return [
+        {
+            'view': row.get('view'),
+            'views': row['view_count'],
+            'fingerprint': row['fingerprint'],
+            'calls': row['call_count'],
+            'total_seconds': row['seconds'],
+            'mean_seconds': row['mean'],
+            'max_seconds': row['slowest'],
+            'rows': row['row_count'],
+            'sql': row['statement'],
+        }
+        for row in statements.order_by(F(ORDERS[order]).desc(), 'fingerprint')[:limit]
+    ]
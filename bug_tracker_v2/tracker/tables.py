@@ -1,14 +1,7 @@
 import django_tables2 as tables
-from django.db.models import Func, F, Case, When, CharField, Value
+from django.db.models import Func, F
 from bug_tracker_v2.tracker import models, views
 
-PRIORITY_ORDERING = {
-    'urgent': '1',
-    'high': '2',
-    'medium': '3',
-    'low': '4'
-}
-
 # STATUS_ORDERING = {
 #     'open': '1',
 #     'assigned': '2',
@@ -18,10 +11,17 @@ PRIORITY_ORDERING = {
 
 class TicketTable(tables.Table):
 
+    # rows are tracker.rows.TicketRow objects, which carry the names and links the columns show
     title = tables.Column(accessor='title', verbose_name='Title', linkify=True)
+    user = tables.Column(accessor='user_name', verbose_name='User', order_by='user')
+    developer = tables.Column(accessor='developer_names', verbose_name='Developer', orderable=False)
+    priority = tables.Column(accessor='get_priority_display', verbose_name='Priority', order_by=('priority_rank', 'created_on'))
     created_on = tables.DateTimeColumn(accessor='created_on', verbose_name='Created', format='m/d/y', order_by='-created_on')
     last_updated_on = tables.DateTimeColumn(accessor='last_updated_on', verbose_name='Updated', format='m/d/y', order_by='-last_updated_on')
-    project = tables.Column(accessor='project', linkify=True)
+    project = tables.Column(accessor='project_title', verbose_name='Project', order_by='project', linkify=lambda record: record.project_url)
+
+    def render_developer(self, value):
+        return ', '.join(value)
 
     def order_title(self, queryset, is_descending): # making title ordering case-insensitive
         queryset = queryset.annotate(
@@ -29,14 +29,6 @@ class TicketTable(tables.Table):
         ).order_by(('-' if is_descending else '') + 'title_lower')
         return (queryset, True)
 
-    def order_priority(self, queryset, is_descending):
-        queryset = queryset.annotate(
-            priority_order=Case(
-                *[When(priority=i, then=Value(j)) for i, j in PRIORITY_ORDERING.items()], default=0, output_field=CharField()
-            )
-        ).order_by(('-' if is_descending else '') + 'priority_order')
-        return (queryset, True)
-
     # def order_status(self, queryset, is_descending):
     #     queryset = queryset.annotate(
     #         status_order=Case(
@@ -49,7 +41,7 @@ class TicketTable(tables.Table):
     class Meta:
         model = models.Ticket
         fields = ('title', 'user', 'developer', 'project', 'priority', 'created_on', 'last_updated_on')
-        template_name = 'django_tables2/bootstrap4.html'
+        template_name = 'tracker/keyset_table.html'
         attrs = {'class': "table table-striped table-bordered table-hover table-sm"}
         order_by = 'created_on'
 
@@ -57,14 +49,14 @@ class TicketTable(tables.Table):
 class ProjectTable(tables.Table):
     title = tables.Column(accessor='title', verbose_name='Title', linkify=True)
     manager = tables.Column(accessor='manager', verbose_name='Manager')
-    open_tickets = tables.Column(accessor='open_tickets', verbose_name='Open Tickets')
+    open_tickets = tables.Column(accessor='open_ticket_count', verbose_name='Open Tickets')
     created_on = tables.DateTimeColumn(accessor='created_on', verbose_name='Created', format='m/d/y', order_by='-created_on') # format='M d, Y' for old version
 
     class Meta:
         model = models.Project
         fields = ('title', 'description', 'manager', 'created_on', 'open_tickets') # including project_tickets__count in this tuple works too, but allows less customization
         sequence = ('title', '...', 'created_on')
-        template_name = 'django_tables2/bootstrap4.html'
+        template_name = 'tracker/keyset_table.html'
         attrs = {'class': "table table-striped table-bordered table-hover table-sm"}
         order_by = 'created_on'
 
@@ -74,8 +66,8 @@ class SubscriptionsTable(tables.Table):
     # is displayed to reflect the new column name
     check = tables.CheckBoxColumn(accessor='pk', attrs = { "th__input": {"onclick": "toggle(this)"}}, orderable=False)
     title = tables.Column(accessor='title', verbose_name='Title', linkify=True)
-    team = tables.Column(accessor='team', verbose_name='Team', linkify=True)
-    project = tables.Column(accessor='project', verbose_name='Project', linkify=True)
+    team = tables.Column(accessor='team_title', verbose_name='Team', order_by='team', linkify=lambda record: record.team_url)
+    project = tables.Column(accessor='project_title', verbose_name='Project', order_by='project', linkify=lambda record: record.project_url)
     last_updated_on = tables.DateTimeColumn(accessor='last_updated_on', verbose_name='Updated', format='m/d/y', order_by='-last_updated_on')
     # unsub = tables.Column(
     #     accessor='title',
@@ -91,7 +83,7 @@ class SubscriptionsTable(tables.Table):
         model = models.Ticket
         fields = ('title', 'team', 'project')
         sequence = ('check', '...', 'last_updated_on')
-        template_name = 'django_tables2/bootstrap4.html'
+        template_name = 'tracker/keyset_table.html'
         attrs = {'class': "table table-striped table-bordered table-hover table-sm"}
         order_by = 'team'
 
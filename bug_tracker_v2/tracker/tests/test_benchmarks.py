@@ -0,0 +1,78 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+
+from .. import benchmarks
+from ..models import Project, TeamMembership, Ticket
+
+from .utils_for_test_creation import create_team, user
+
+
+class TestBenchmarkHelpers(SimpleTestCase):
+    def test_percentile(self):
+        samples = list(range(1, 21))
+        self.assertEqual(benchmarks.percentile(samples, 0.5), 10)
+        self.assertEqual(benchmarks.percentile(samples, 0.95), 19)
+        self.assertEqual(benchmarks.percentile([3], 0.95), 3)
+
+    def test_url_names(self):
+        names = dict(benchmarks.url_names())
+        self.assertEqual(names['tracker:project_details'], {'team_slug', 'project_pk'})
+        self.assertEqual(names['manage_subscriptions'], set())
+        self.assertFalse(any(name.startswith(('users:', 'admin:')) for name in names))
+
+    def test_compare(self):
+        result = {'status': 200, 'p50_ms': 40.0, 'p95_ms': 50.0, 'queries': 10}
+        self.assertEqual(benchmarks.compare({'a': result}, {'a': result}), [])
+        # a small absolute change is noise
+        self.assertEqual(benchmarks.compare({'a': {**result, 'p50_ms': 4.0}}, {'a': {**result, 'p50_ms': 2.0}}), [])
+        # the p95 is only reported
+        self.assertEqual(benchmarks.compare({'a': {**result, 'p95_ms': 500.0}}, {'a': result}), [])
+        regressed = {**result, 'status': 500, 'p50_ms': 80.0, 'queries': 12}
+        self.assertEqual([problem for _key, problem in benchmarks.compare({'a': regressed, 'b': result}, {'a': result})], [
+            'responded with 500, 200 before', 'runs 12 queries, 10 before', 'p50 80.0 ms, 40.0 ms before',
+        ])
+
+
+class TestBenchmarkViewsCommand(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.team = create_team(self.owner)
+        self.developer, self.member = user('developer'), user('member')
+        for member in (self.developer, self.member):
+            TeamMembership.objects.create(team=self.team, user=member, role=TeamMembership.MEMBER)
+        self.project = Project.objects.create(title='Project', description='Description', team=self.team)
+        self.project.developers.add(self.developer)
+        Ticket.objects.create(title='Ticket', user=self.owner, project=self.project, team=self.team)
+        self.output = os.path.join(tempfile.mkdtemp(), 'results.json')
+
+    def benchmark(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('benchmark_views', '--iterations=2', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_records_and_compares(self):
+        _out, err = self.benchmark('--output', self.output)
+        self.assertIn('has no manager', err)
+        with open(self.output) as f:
+            recorded = json.load(f)
+        details = recorded['results']['tracker:project_details:owner']
+        self.assertEqual(details['status'], 200)
+        self.assertGreater(details['queries'], 0)
+        self.assertIn('tracker:ticket_details:developer', recorded['results'])
+        self.assertEqual(recorded['results']['tracker:ticket_details:member']['status'], 404)
+        self.assertNotIn('tracker:delete_comment:owner', recorded['results'])
+        self.assertNotIn('tracker:project_list:manager', recorded['results'])
+        # nothing the requests wrote is kept
+        self.assertFalse(Project.objects.filter(is_archived=True).exists())
+
+        for result in recorded['results'].values():
+            result['queries'] = 0
+        with open(self.output, 'w') as f:
+            json.dump(recorded, f)
+        with self.assertRaises(CommandError):
+            self.benchmark('--only', 'project_details', '--compare', self.output)
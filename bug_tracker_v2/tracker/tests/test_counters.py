@@ -0,0 +1,123 @@
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import counters
+from ..models import Comment, Project, Ticket, TicketFile
+
+from .utils_for_test_creation import create_team, user
+
+
+class TestCounters(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.team = create_team(self.owner)
+        self.project = Project.objects.create(title='Project', description='Description', team=self.team)
+        self.ticket = Ticket.objects.create(title='Ticket', user=self.owner, project=self.project, team=self.team)
+
+    def assertProjectCounts(self, project, open_tickets, closed_tickets):
+        project = Project.objects.get(pk=project.pk)
+        self.assertEqual((project.open_ticket_count, project.closed_ticket_count), (open_tickets, closed_tickets))
+
+    def assertNoDrift(self):
+        for model in (Project, Ticket):
+            self.assertFalse(counters.drifted(model).exists())
+
+    def test_ticket_create_close_reopen_delete(self):
+        Ticket.objects.create(title='Other', user=self.owner, project=self.project, team=self.team)
+        self.assertProjectCounts(self.project, 2, 0)
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        ticket.status = Ticket.CLOSED
+        ticket.save()
+        # a second save in the same state must not count the ticket twice
+        ticket.save()
+        self.assertProjectCounts(self.project, 1, 1)
+        ticket.status = Ticket.OPEN
+        ticket.save()
+        self.assertProjectCounts(self.project, 2, 0)
+        ticket.delete()
+        self.assertProjectCounts(self.project, 1, 0)
+        self.assertNoDrift()
+
+    def test_ticket_moved_to_another_project(self):
+        other = Project.objects.create(title='Other', description='Description', team=self.team)
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        ticket.project = other
+        ticket.status = Ticket.CLOSED
+        ticket.save()
+        self.assertProjectCounts(self.project, 0, 0)
+        self.assertProjectCounts(other, 0, 1)
+
+    def test_deleting_closed_ticket_changed_in_memory(self):
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        ticket.status = Ticket.CLOSED
+        ticket.delete()
+        self.assertProjectCounts(self.project, 0, 0)
+
+    def test_comment_and_file_counts(self):
+        comment = Comment.objects.create(text='Comment', user=self.owner, ticket=self.ticket)
+        Comment.objects.create(text='Another', user=self.owner, ticket=self.ticket)
+        ticket_file = TicketFile.objects.create(
+            title='File', ticket=self.ticket, uploaded_by=self.owner,
+            file=SimpleUploadedFile('file.txt', b'contents', content_type='text/plain'),
+        )
+        comment.delete()
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        self.assertEqual((ticket.comment_count, ticket.file_count), (1, 1))
+        ticket_file.file.delete(save=False)
+        ticket_file.delete()
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).file_count, 0)
+        self.assertNoDrift()
+
+    def test_stale_instance_save_keeps_counters(self):
+        Comment.objects.create(text='Comment', user=self.owner, ticket=self.ticket)
+        Ticket.objects.create(title='Other', user=self.owner, project=self.project, team=self.team)
+        self.ticket.title = 'Renamed'
+        self.ticket.save()
+        self.project.title = 'Renamed'
+        self.project.save()
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).comment_count, 1)
+        self.assertProjectCounts(self.project, 2, 0)
+        self.assertNoDrift()
+
+    def test_views_update_counters(self):
+        self.client.force_login(self.owner)
+        url = reverse('tracker:ticket_details', kwargs={'team_slug': self.team.slug, 'pk': self.ticket.pk})
+        self.client.post(url, {'post_comment': '', 'comment': 'Comment'})
+        self.client.post(url, {'close_ticket': '', 'resolution': 'Fixed.'})
+        self.assertProjectCounts(self.project, 0, 1)
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).comment_count, 2)
+        self.client.post(url, {'reopen_ticket': ''})
+        self.assertProjectCounts(self.project, 1, 0)
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).comment_count, 3)
+        self.assertNoDrift()
+
+    def test_locked_state_moves_a_ticket_once(self):
+        # two requests load the open ticket, then close it one after the other
+        first, second = Ticket.objects.get(pk=self.ticket.pk), Ticket.objects.get(pk=self.ticket.pk)
+        for ticket in (first, second):
+            with transaction.atomic():
+                counters.lock_counted_state(ticket)
+                ticket.status = Ticket.CLOSED
+                ticket.save()
+        self.assertProjectCounts(self.project, 0, 1)
+        self.assertNoDrift()
+
+    def test_reconcile_command(self):
+        Comment.objects.create(text='Comment', user=self.owner, ticket=self.ticket)
+        Ticket.objects.filter(pk=self.ticket.pk).update(status=Ticket.CLOSED, comment_count=5)
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('reconcile_counters', '--check', stdout=out)
+        self.assertIn(f'Ticket {self.ticket.pk}: comment_count 5 -> 1', out.getvalue())
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).comment_count, 5)
+
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertProjectCounts(self.project, 0, 1)
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).comment_count, 1)
+        self.assertNoDrift()
+        call_command('reconcile_counters', '--check', stdout=StringIO())
@@ -0,0 +1,46 @@
+import datetime
+
+import pytz
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Project, Ticket
+
+from .utils_for_test_creation import create_team, user
+
+
+class TestDayFilters(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.team = create_team(self.owner)
+        self.project = Project.objects.create(title='Project', description='Description', team=self.team)
+        self.tz = pytz.timezone('America/New_York')
+        # 23:30 on June 1st in New York is already June 2nd in UTC
+        self.late = Ticket.objects.create(title='Late', user=self.owner, project=self.project, team=self.team)
+        self.early = Ticket.objects.create(title='Early', user=self.owner, project=self.project, team=self.team)
+        Ticket.objects.filter(pk=self.late.pk).update(created_on=self.tz.localize(datetime.datetime(2020, 6, 1, 23, 30)))
+        Ticket.objects.filter(pk=self.early.pk).update(created_on=self.tz.localize(datetime.datetime(2020, 6, 2, 0, 0)))
+        self.url = reverse('tracker:ticket_list', kwargs={'team_slug': self.team.slug})
+        self.client.force_login(self.owner)
+
+    def titles(self, **params):
+        with timezone.override(self.tz):
+            table = self.client.get(self.url, params).context['table']
+        return sorted(row.record.title for row in table.page.object_list)
+
+    def test_dates_are_days_in_the_current_timezone(self):
+        self.assertEqual(self.titles(created_start_date='2020-06-01', created_end_date='2020-06-01'), ['Late'])
+        self.assertEqual(self.titles(created_start_date='2020-06-02', created_end_date='2020-06-02'), ['Early'])
+        self.assertEqual(self.titles(created_start_date='2020-06-01'), ['Early', 'Late'])
+        self.assertEqual(self.titles(created_end_date='2020-05-31'), [])
+
+    def test_last_date_is_no_upper_bound(self):
+        self.assertEqual(self.titles(created_end_date='9999-12-31'), ['Early', 'Late'])
+
+    def test_filter_compares_the_column(self):
+        with timezone.override(self.tz):
+            response = self.client.get(self.url, {'created_start_date': '2020-06-01'})
+        sql = str(response.context['table'].data.data.query)
+        self.assertIn('"tracker_ticket"."created_on" >=', sql)
+        self.assertNotIn('AT TIME ZONE', sql)
@@ -0,0 +1,55 @@
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from .. import invitations
+from ..context_processors import pending_invitations
+from ..models import TeamInvitation
+
+from .utils_for_test_creation import create_team, user
+
+
+class TestPendingInvitationCount(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.invitee = user('invitee')
+        self.invitee.email = 'invitee@email.com'
+        self.invitee.save()
+        self.team = create_team(self.owner)
+        self.other_team = create_team(self.owner, title='Other Team')
+        self.invitation = TeamInvitation.objects.create(
+            team=self.team, invitee=self.invitee, invitee_email=self.invitee.email
+        )
+
+    def test_count_is_cached(self):
+        self.assertEqual(invitations.get_pending_invitation_count(self.invitee), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(invitations.get_pending_invitation_count(self.invitee), 1)
+
+    def test_send_accept_and_decline_update_the_count(self):
+        self.assertEqual(invitations.get_pending_invitation_count(self.invitee), 1)
+        self.client.force_login(self.owner)
+        self.client.post(reverse('team_invite', kwargs={'team_slug': self.other_team.slug}), {'invitee': 'invitee'})
+        self.assertEqual(invitations.get_pending_invitation_count(self.invitee), 2)
+
+        self.client.force_login(self.invitee)
+        self.client.get(reverse('accept_team_invitation') + f'?invitation={self.invitation.pk}')
+        self.assertEqual(invitations.get_pending_invitation_count(self.invitee), 1)
+        other = TeamInvitation.objects.get(team=self.other_team)
+        self.client.get(reverse('decline_team_invitation') + f'?invitation={other.pk}')
+        self.assertEqual(invitations.get_pending_invitation_count(self.invitee), 0)
+
+    def test_context_processor_is_lazy(self):
+        request = RequestFactory().get('/')
+        request.user = self.invitee
+        with self.assertNumQueries(0):
+            context = pending_invitations(request)
+        self.assertEqual(int(context['pending_invitations_count']), 1)
+
+        request.user = AnonymousUser()
+        self.assertEqual(pending_invitations(request), {'pending_invitations_count': 0})
+
+    def test_badge_rendered(self):
+        self.client.force_login(self.invitee)
+        response = self.client.get(reverse('team_list'))
+        self.assertContains(response, 'Pending Invitations (1)')
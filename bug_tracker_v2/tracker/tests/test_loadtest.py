@@ -0,0 +1,86 @@
+import json
+import os
+import socket
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.test import LiveServerTestCase, SimpleTestCase, override_settings
+
+from .. import loadtest
+from ..models import Project, Ticket
+
+from .utils_for_test_creation import create_team, team_add_member, user
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class TestSmtpSink(SimpleTestCase):
+    def test_messages_are_counted_and_written(self):
+        directory = os.path.join(tempfile.mkdtemp(), 'mail')
+        port = free_port()
+        with loadtest.SmtpSink(port, directory) as sink:
+            connection = mail.get_connection('django.core.mail.backends.smtp.EmailBackend', host='127.0.0.1', port=port)
+            mail.send_mail('Subject', 'Body\n.\nmore', 'from@email.com', ['to@email.com'], connection=connection)
+        self.assertEqual(sink.messages, 1)
+        with open(os.path.join(directory, '000001.eml')) as f:
+            message = f.read()
+        self.assertIn('Subject: Subject', message)
+        self.assertIn('Body\n.\nmore', message.replace('\r\n', '\n'))
+
+
+class TestLoadTest(LiveServerTestCase):
+    def setUp(self):
+        owner = user('owner')
+        self.team = create_team(owner)
+        project = Project.objects.create(title='Project', description='Description', team=self.team)
+        subscriber = user('subscriber')
+        subscriber.email = 'subscriber@email.com'
+        subscriber.save()
+        team_add_member(subscriber, self.team)
+        project.developers.add(subscriber)
+        for name in ('first', 'second'):
+            developer = user(name)
+            team_add_member(developer, self.team)
+            project.developers.add(developer)
+            ticket = Ticket.objects.create(title='Ticket', description='desc', user=owner, project=project, team=self.team)
+            ticket.developer.add(developer)
+            ticket.subscribers.add(subscriber)
+        self.port = free_port()
+
+    def test_users_close_reopen_and_subscribe(self):
+        out = StringIO()
+        output = os.path.join(tempfile.mkdtemp(), 'report.json')
+        flows = {'read': 1, 'comment': 1, 'close_reopen': 2, 'subscribe': 1}
+        with mock.patch.dict(loadtest.FLOWS, flows), override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.port,
+        ):
+            call_command(
+                'load_test', '--url', self.live_server_url, '--users', '2', '--duration', '1.5',
+                '--smtp-port', str(self.port), '--output', output, stdout=out,
+            )
+        with open(output) as f:
+            report = json.load(f)
+        self.assertGreater(report['requests'], 6)
+        self.assertEqual(report['error_rate'], 0, report['statuses'])
+        self.assertLessEqual(set(report['urls']), {
+            'tracker:ticket_list', 'tracker:ticket_details', 'comment', 'close', 'reopen', 'tracker:subscribe_ticket',
+            'tracker:unsubscribe_ticket',
+        })
+        self.assertIn('close', report['urls'])
+        self.assertGreater(report['emails'], 0)
+        self.assertIn('requests/s', out.getvalue())
+        # the users' sessions are gone
+        self.assertFalse(Session.objects.exists())
+
+    def test_no_users(self):
+        Ticket.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('load_test', '--url', self.live_server_url, stdout=StringIO())
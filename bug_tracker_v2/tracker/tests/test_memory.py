@@ -0,0 +1,97 @@
+import json
+import os
+import signal
+import tracemalloc
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .. import memory
+
+from .utils_for_test_creation import create_team, user
+
+
+def allocate():
+    return [str(i) * 10 for i in range(20000)]
+
+
+class MemoryTestCase(SimpleTestCase):
+    def setUp(self):
+        # whatever earlier requests in this process left behind
+        memory._views.clear()  # pylint: disable=protected-access
+        memory._samples.clear()  # pylint: disable=protected-access
+        self.addCleanup(memory.stop)
+
+
+class TestMemory(MemoryTestCase):
+    def test_rss(self):
+        self.assertGreater(memory.rss(), 0)
+        self.assertGreaterEqual(memory.peak_rss(), memory.rss() // 2)
+
+    @override_settings(MEMORY_RSS_THRESHOLD=1000)
+    def test_requests_are_added_up_per_view_and_sampled(self):
+        memory.record('a', 5000, 5500)
+        memory.record('a', 5500, 5400)
+        self.assertFalse(memory.samples())
+        with self.assertLogs('bug_tracker_v2.tracker.memory', 'WARNING'):
+            memory.record('b', 5000, 7000)
+
+        self.assertEqual(memory.views(), [
+            {'view': 'b', 'requests': 1, 'rss_growth_bytes': 2000, 'peak_rss_growth_bytes': 2000,
+             'peak_rss_bytes': 7000},
+            {'view': 'a', 'requests': 2, 'rss_growth_bytes': 500, 'peak_rss_growth_bytes': 500,
+             'peak_rss_bytes': 5500},
+        ])
+        [sample] = memory.samples()
+        self.assertEqual((sample['view'], sample['rss_growth_bytes']), ('b', 2000))
+        # allocations aren't traced, so there are no sites to report
+        self.assertNotIn('snapshot', sample)
+
+    def test_snapshots_are_compared_with_the_previous_one(self):
+        first = memory.snapshot()
+        self.assertTrue(tracemalloc.is_tracing())
+        self.assertFalse(first['compared'])
+
+        kept = allocate()
+        second = memory.snapshot(limit=5)
+        self.assertTrue(second['compared'])
+        self.assertLessEqual(len(second['sites']), 5)
+        site = second['sites'][0]
+        self.assertEqual(site['site'], f'{__file__}:{allocate.__code__.co_firstlineno + 1}')
+        self.assertGreater(site['size_diff_bytes'], 0)
+        del kept
+
+        memory.stop()
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertFalse(memory.snapshot()['compared'])
+
+    @override_settings(MEMORY_SIGNAL='SIGUSR2')
+    def test_signal_logs_a_snapshot(self):
+        self.addCleanup(signal.signal, signal.SIGUSR2, signal.getsignal(signal.SIGUSR2))
+        memory.install_signal_handler()
+        with self.assertLogs('bug_tracker_v2.tracker.memory', 'WARNING') as logs:
+            os.kill(os.getpid(), signal.SIGUSR2)
+        self.assertIn(f'Memory snapshot of worker {os.getpid()}', logs.output[0])
+
+
+class TestMemoryView(MemoryTestCase, TestCase):
+    def test_endpoint(self):
+        owner = user('owner')
+        team = create_team(owner)
+        self.client.force_login(owner)
+        url = reverse('memory')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        owner.is_staff = True
+        owner.save()
+        self.client.get(reverse('tracker:ticket_list', kwargs={'team_slug': team.slug}))
+        data = json.loads(self.client.get(url).content)
+        self.assertEqual(data['pid'], os.getpid())
+        self.assertIn('tracker:ticket_list', [view['view'] for view in data['views']])
+        self.assertIsNone(data['snapshot'])
+
+        data = json.loads(self.client.get(url, {'snapshot': '', 'limit': 3}).content)
+        self.assertTrue(data['tracing'])
+        self.assertLessEqual(len(data['snapshot']['sites']), 3)
+        self.assertFalse(json.loads(self.client.get(url, {'stop': ''}).content)['tracing'])
+        self.assertEqual(self.client.get(url, {'limit': 'all'}).status_code, 400)
@@ -0,0 +1,85 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import metrics, sqlstats
+from ..models import Project, Ticket, ViewMetric
+
+from .utils_for_test_creation import create_team, user
+
+
+class TestViewMetrics(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.team = create_team(self.owner)
+        self.project = Project.objects.create(title='Project', description='Description', team=self.team)
+        Ticket.objects.create(title='Ticket', user=self.owner, project=self.project, team=self.team)
+        # start from an empty table, whatever earlier tests left in this process's totals
+        metrics.flush()
+        ViewMetric.objects.all().delete()
+        self.client.force_login(self.owner)
+
+    def test_requests_are_recorded_per_view(self):
+        url = reverse('tracker:ticket_list', kwargs={'team_slug': self.team.slug})
+        for _ in range(2):
+            response = self.client.get(url)
+        self.client.get('/no-such-page/')
+        metrics.flush()
+
+        row = ViewMetric.objects.get(view='tracker:ticket_list')
+        self.assertEqual((row.method, row.status, row.requests), ('GET', 200, 2))
+        self.assertEqual(sum(row.duration_buckets), 2)
+        self.assertEqual(len(row.duration_buckets), len(metrics.LATENCY_BUCKETS) + 1)
+        self.assertGreater(row.queries, 2)
+        self.assertGreater(row.query_seconds, 0)
+        self.assertEqual(row.response_bytes, 2 * len(response.content))
+        self.assertEqual(ViewMetric.objects.get(view=metrics.UNRESOLVED).status, 404)
+
+    def test_flushes_are_not_counted_as_queries_of_the_request(self):
+        url = reverse('tracker:ticket_list', kwargs={'team_slug': self.team.slug})
+        self.client.get(url)
+        metrics.flush()
+        ViewMetric.objects.all().delete()
+        self.client.get(url)
+        metrics.flush()
+        queries = ViewMetric.objects.get(view='tracker:ticket_list').queries
+        ViewMetric.objects.all().delete()
+        with override_settings(METRICS_FLUSH_INTERVAL=0):
+            self.client.get(url)
+        # this request flushed its own metrics and SQL statistics
+        self.assertEqual(ViewMetric.objects.get(view='tracker:ticket_list').queries, queries)
+        sqlstats.flush()
+
+    def test_flushes_from_several_workers_add_up(self):
+        metrics.record('tracker:ticket_list', 'GET', 200, 0.003, 5, 0.001, 100)
+        metrics.flush()
+        metrics.record('tracker:ticket_list', 'GET', 200, 0.2, 7, 0.002, 50)
+        metrics.record('tracker:ticket_list', 'BREW', 200, 20, 1, 0.001, 1)
+        metrics.flush()
+
+        row = ViewMetric.objects.get(view='tracker:ticket_list', method='GET')
+        self.assertEqual((row.requests, row.queries, row.response_bytes), (2, 12, 150))
+        self.assertEqual(row.duration_buckets, [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0])
+        self.assertEqual(ViewMetric.objects.get(method='OTHER').duration_buckets[-1], 1)
+
+    def test_endpoint(self):
+        metrics.record('say "hi"', 'GET', 200, 0.02, 3, 0.001, 10)
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.owner.is_staff = True
+        self.owner.save()
+        text = self.client.get(url).content.decode()
+        labels = 'view="say \\"hi\\"",method="GET",status="200"'
+        self.assertIn(f'bug_tracker_request_duration_seconds_bucket{{{labels},le="0.01"}} 0\n', text)
+        self.assertIn(f'bug_tracker_request_duration_seconds_bucket{{{labels},le="0.025"}} 1\n', text)
+        self.assertIn(f'bug_tracker_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1\n', text)
+        self.assertIn(f'bug_tracker_request_duration_seconds_count{{{labels}}} 1\n', text)
+        self.assertIn(f'bug_tracker_db_queries_total{{{labels}}} 3\n', text)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_token(self):
+        self.client.logout()
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer sécret').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
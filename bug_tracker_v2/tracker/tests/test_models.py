@@ -75,6 +75,12 @@ class TestTicket(TestCase):
     def test_get_absolute_url(self):
         self.assertEqual(f'/teams/{self.ticket.team.slug}/tickets/{self.ticket.pk}/', self.ticket.get_absolute_url())
 
+    def test_priority_rank_follows_priority(self):
+        self.assertEqual(self.ticket.priority_rank, Ticket.PRIORITY_RANKS[Ticket.LOW])
+        self.ticket.priority = Ticket.URGENT
+        self.ticket.save(update_fields=['priority'])
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).priority_rank, Ticket.PRIORITY_RANKS[Ticket.URGENT])
+
 
 class TestComment(TestCase):
     @classmethod
@@ -0,0 +1,53 @@
+from django.test import TestCase
+
+from bug_tracker_v2.users.models import User
+from .. import notifications
+from ..models import Project, Ticket
+
+from .utils_for_test_creation import create_team, team_add_member
+
+
+def user_with_email(username):
+    return User.objects.create_user(username=username, password='password', email=f'{username}@email.com')
+
+
+class TestTicketEventRecipients(TestCase):
+    def setUp(self):
+        self.owner = user_with_email('owner')
+        self.manager = user_with_email('manager')
+        self.developer = user_with_email('developer')
+        self.member = user_with_email('member')
+        self.non_member = user_with_email('non_member')
+        self.team = create_team(self.owner)
+        for member in (self.manager, self.developer, self.member):
+            team_add_member(member, self.team)
+        self.project = Project.objects.create(title='Project', description='desc', team=self.team, manager=self.manager)
+        self.project.developers.add(self.developer, self.non_member)
+        self.ticket = Ticket.objects.create(title='Ticket', user=self.owner, project=self.project, team=self.team)
+        self.ticket.subscribers.add(self.manager, self.developer, self.member, self.non_member)
+
+    def recipient_pks(self, **kwargs):
+        return [recipient.pk for recipient in notifications.ticket_event_recipients(self.ticket, **kwargs)]
+
+    def test_only_team_members_on_the_project_staff_are_recipients(self):
+        # the owner did not subscribe, the member is not project staff and the non-member left the team
+        self.assertEqual(self.recipient_pks(), [self.manager.pk, self.developer.pk])
+
+    def test_resolved_in_a_single_query(self):
+        with self.assertNumQueries(1):
+            recipients = list(notifications.ticket_event_recipients(self.ticket))
+        self.assertEqual(recipients[0].email, self.manager.email)
+
+    def test_opted_out_subscribers_are_skipped(self):
+        self.developer.notification_settings = {notifications.TICKET_ACTIVITY_SETTING: False}
+        self.developer.save()
+        self.assertEqual(self.recipient_pks(), [self.manager.pk])
+
+    def test_subscribers_without_email_are_skipped(self):
+        self.manager.email = ''
+        self.manager.save()
+        self.assertEqual(self.recipient_pks(), [self.developer.pk])
+
+    def test_project_subscribers(self):
+        self.project.subscribers.add(self.developer)
+        self.assertEqual(self.recipient_pks(subscribed_to=self.project), [self.developer.pk])
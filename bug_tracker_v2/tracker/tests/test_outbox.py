@@ -0,0 +1,135 @@
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import outbox
+from ..models import OutboundEmail
+
+from .transaction_checks import execute_on_commit
+
+
+class FailingBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('mail provider unavailable')
+
+
+class UnreachableBackend(locmem.EmailBackend):
+    def open(self):
+        raise ConnectionRefusedError('mail provider unavailable')
+
+
+class FlakyBackend(locmem.EmailBackend):
+    """Refuses the first two connections."""
+    refused = 0
+
+    def open(self):
+        if FlakyBackend.refused < 2:
+            FlakyBackend.refused += 1
+            raise ConnectionRefusedError('mail provider unavailable')
+        return super().open()
+
+
+@override_settings(EMAIL_OUTBOX_EAGER=False)
+class TestOutbox(TestCase):
+    def queue(self, count=1):
+        return outbox.send_mass_mail(
+            (f'Subject {i}', 'Body', 'noreply@monksbugtracker.com', [f'user{i}@email.com']) for i in range(count)
+        )
+
+    def test_send_mail_only_queues(self):
+        self.assertEqual(self.queue(3), 3)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.PENDING).count(), 3)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_empty_recipient_list_is_skipped(self):
+        self.assertEqual(outbox.send_mail('Subject', 'Body', 'noreply@monksbugtracker.com', []), 0)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_claim_and_deliver(self):
+        self.queue(3)
+        batch = outbox.claim_batch(batch_size=2)
+        self.assertEqual(len(batch), 2)
+        # claimed rows are leased, so a second worker only sees the remaining one
+        self.assertEqual(len(outbox.claim_batch()), 1)
+        self.assertEqual(outbox.deliver(batch), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.SENT).count(), 2)
+
+    @override_settings(EMAIL_BACKEND='bug_tracker_v2.tracker.tests.test_outbox.FailingBackend')
+    def test_failure_is_retried_with_backoff(self):
+        self.queue()
+        self.assertEqual(outbox.deliver(outbox.claim_batch()), (0, 1))
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.status, OutboundEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('mail provider unavailable', email.last_error)
+        self.assertGreater(email.next_attempt_on, timezone.now())
+        self.assertEqual(outbox.claim_batch(), [])
+
+    @override_settings(EMAIL_BACKEND='bug_tracker_v2.tracker.tests.test_outbox.FailingBackend')
+    def test_gives_up_after_max_attempts(self):
+        self.queue()
+        OutboundEmail.objects.update(attempts=outbox.MAX_ATTEMPTS - 1)
+        outbox.deliver(outbox.claim_batch())
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.FAILED)
+
+    def test_retry_backoff_is_capped(self):
+        self.assertEqual(outbox.retry_backoff(1), outbox.RETRY_BACKOFF)
+        self.assertEqual(outbox.retry_backoff(2), outbox.RETRY_BACKOFF * 2)
+        self.assertEqual(outbox.retry_backoff(50), outbox.MAX_RETRY_BACKOFF)
+
+    def test_worker_drains_outbox(self):
+        self.queue(5)
+        call_command('send_queued_email', '--once', '--batch-size', '2', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertFalse(OutboundEmail.objects.filter(status=OutboundEmail.PENDING).exists())
+
+    @override_settings(EMAIL_BACKEND='bug_tracker_v2.tracker.tests.test_outbox.FlakyBackend')
+    def test_worker_retries_connecting(self):
+        FlakyBackend.refused = 0
+        self.queue(2)
+        err = StringIO()
+        with mock.patch('time.sleep') as sleep:
+            call_command('send_queued_email', '--once', stdout=StringIO(), stderr=err)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [1, 2])
+        self.assertEqual(err.getvalue().count('Could not connect to the mail provider'), 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(EMAIL_OUTBOX_EAGER=True)
+    def test_eager_delivery(self):
+        with execute_on_commit():
+            self.queue()
+            # not while the transaction that queued it is open
+            self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.SENT)
+
+    @override_settings(EMAIL_OUTBOX_EAGER=True)
+    def test_eager_delivery_skips_claimed_emails(self):
+        with execute_on_commit():
+            self.queue()
+            # a worker claims the email before the commit hook runs
+            self.assertEqual(len(outbox.claim_batch()), 1)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.PENDING)
+
+    @override_settings(
+        EMAIL_OUTBOX_EAGER=True, EMAIL_BACKEND='bug_tracker_v2.tracker.tests.test_outbox.UnreachableBackend'
+    )
+    def test_eager_delivery_failure_is_left_to_the_worker(self):
+        later = []
+        with self.assertLogs('bug_tracker_v2.tracker.outbox', 'ERROR'), execute_on_commit():
+            self.queue()
+            transaction.on_commit(lambda: later.append(True))
+        # the other commit hooks still ran
+        self.assertEqual(later, [True])
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.status, email.attempts), (OutboundEmail.PENDING, 0))
+        self.assertGreater(email.next_attempt_on, timezone.now())
@@ -0,0 +1,86 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Project, Ticket
+from ..pagination import KeysetPage, keyset_columns
+
+from .utils_for_test_creation import create_team, user
+
+
+class TestKeysetPagination(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.team = create_team(self.owner)
+        self.project = Project.objects.create(title='Project', description='desc', team=self.team, manager=self.owner)
+        priorities = [Ticket.LOW, Ticket.MEDIUM, Ticket.HIGH, Ticket.URGENT]
+        self.tickets = [
+            Ticket.objects.create(
+                title=f'{"abc"[i % 3]} ticket {i:02}', priority=priorities[i % 4], user=self.owner, project=self.project, team=self.team
+            )
+            for i in range(23)
+        ]
+        # identical timestamps on some tickets, so that the pk tie-breaker matters
+        Ticket.objects.filter(pk__in=[ticket.pk for ticket in self.tickets[:5]]).update(created_on=self.tickets[0].created_on)
+        self.url = reverse('tracker:ticket_list', kwargs={'team_slug': self.team.slug})
+        self.client.force_login(self.owner)
+
+    def get_page(self, **params):
+        table = self.client.get(self.url, params).context['table']
+        return table.page, [row.record.pk for row in table.page.object_list]
+
+    def walk(self, **params):
+        page, pks = self.get_page(**params)
+        self.assertIsInstance(page, KeysetPage)
+        self.assertFalse(page.has_previous())
+        seen = list(pks)
+        while page.has_next():
+            page, pks = self.get_page(cursor=page.next_cursor, **params)
+            self.assertTrue(page.has_previous())
+            seen += pks
+        return seen, page
+
+    def test_walks_every_ticket_once_in_order(self):
+        for sort in ('created_on', '-created_on', 'title', '-title', 'priority', '-last_updated_on', 'user'):
+            seen, _page = self.walk(sort=sort)
+            self.assertEqual(len(seen), len(self.tickets), sort)
+            self.assertCountEqual(seen, [ticket.pk for ticket in self.tickets])
+
+    def test_title_ordering_matches_unpaginated_table(self):
+        seen, _page = self.walk(sort='title')
+        expected = sorted(self.tickets, key=lambda ticket: (ticket.title.lower(), ticket.pk))
+        self.assertEqual(seen, [ticket.pk for ticket in expected])
+
+    def test_priority_ordering_matches_unpaginated_table(self):
+        seen, _page = self.walk(sort='priority')
+        ranks = Ticket.PRIORITY_RANKS
+        tickets = Ticket.objects.filter(pk__in=[ticket.pk for ticket in self.tickets])
+        expected = sorted(tickets, key=lambda ticket: (ranks[ticket.priority], ticket.created_on, ticket.pk))
+        self.assertEqual(seen, [ticket.pk for ticket in expected])
+        self.assertEqual(Ticket.objects.get(pk=seen[0]).priority, Ticket.URGENT)
+
+    def test_previous_page(self):
+        first, first_pks = self.get_page()
+        second, _second_pks = self.get_page(cursor=first.next_cursor)
+        back, back_pks = self.get_page(cursor=second.previous_cursor)
+        self.assertEqual(back_pks, first_pks)
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_invalid_or_foreign_cursor_restarts(self):
+        _first, first_pks = self.get_page()
+        _page, pks = self.get_page(cursor='not-a-cursor')
+        self.assertEqual(pks, first_pks)
+        by_title, _pks = self.get_page(sort='title')
+        _page, pks = self.get_page(cursor=by_title.next_cursor)
+        self.assertEqual(pks, first_pks)
+
+    def test_keyset_columns(self):
+        self.assertEqual(keyset_columns(Ticket.objects.order_by('-created_on')), [('created_on', True), ('id', False)])
+        self.assertEqual(keyset_columns(Ticket.objects.order_by('user', '-pk')), [('user_id', False), ('id', True)])
+        # many-to-many and related-field orderings cannot be paged by key
+        self.assertIsNone(keyset_columns(Ticket.objects.order_by('developer')))
+        self.assertIsNone(keyset_columns(Ticket.objects.order_by('project__title')))
+
+    def test_estimated_count(self):
+        page, _pks = self.get_page()
+        self.assertGreater(page.paginator.count, 0)
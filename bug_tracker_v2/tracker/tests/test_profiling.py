@@ -0,0 +1,144 @@
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .. import profiling
+from ..models import Project, RequestProfile, Ticket
+
+from .utils_for_test_creation import create_team, user
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestStackSampler(SimpleTestCase):
+    def test_samples_the_thread_it_watches(self):
+        with profiling.StackSampler(threading.get_ident(), 0.001) as sampler:
+            busy(0.05)
+        self.assertGreater(sampler.samples, 0)
+        stacks = dict(profiling.parse(sampler.collapsed()))
+        self.assertEqual(sum(stacks.values()), sampler.samples)
+        self.assertTrue(any(
+            stack.endswith(';busy (bug_tracker_v2/tracker/tests/test_profiling.py:18)') for stack in stacks
+        ), stacks)
+
+    def test_breakdown_counts_the_innermost_library(self):
+        collapsed = '\n'.join([
+            'main (app.py:1);render (django/template/base.py:9);execute (django/db/backends/utils.py:3) 3',
+            'main (app.py:1);render (django/template/base.py:9) 2',
+            'main (app.py:1);convert (markdown/core.py:5) 4',
+            'main (app.py:1) 1',
+        ])
+        self.assertEqual(profiling.breakdown(collapsed), {
+            'orm': 0.3, 'markdown': 0.4, 'tables': 0.0, 'templates': 0.2, 'other': 0.1,
+        })
+        self.assertEqual(profiling.breakdown('')['other'], 0.0)
+
+
+@override_settings(PROFILING_INTERVAL=0.001)
+class TestProfilingMiddleware(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.team = create_team(self.owner)
+        self.project = Project.objects.create(title='Project', description='Description', team=self.team)
+        self.ticket = Ticket.objects.create(title='Ticket', user=self.owner, project=self.project, team=self.team)
+        self.url = reverse('tracker:ticket_details', kwargs={'team_slug': self.team.slug, 'pk': self.ticket.pk})
+        self.client.force_login(self.owner)
+
+    def test_only_requests_with_a_valid_token_are_profiled(self):
+        self.owner.is_staff = True
+        self.owner.save()
+        token = profiling.make_token('owner')
+        self.client.get(self.url)
+        self.client.get(self.url, HTTP_X_PROFILE='forged')
+        # not from the query string, where logs would record it
+        self.client.get(self.url, {'profile': token})
+        self.assertFalse(RequestProfile.objects.exists())
+
+        self.client.get(self.url, HTTP_X_PROFILE=token)
+        self.client.get(self.url, HTTP_X_PROFILE=token)
+        profiles = RequestProfile.objects.all()
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual(
+            (profiles[0].view, profiles[0].method, profiles[0].status, profiles[0].path),
+            ('tracker:ticket_details', 'GET', 200, self.url),
+        )
+        self.assertEqual(profiles[0].samples, sum(count for _stack, count in profiling.parse(profiles[0].stacks)))
+
+        with override_settings(PROFILING_TOKEN_MAX_AGE=-1):
+            self.client.get(self.url, HTTP_X_PROFILE=token)
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+    def test_token_needs_an_active_staff_user(self):
+        user('member')
+        get_user_model().objects.create_user('inactive', is_staff=True, is_active=False)
+        for name in ('member', 'inactive', 'nobody'):
+            self.client.get(self.url, HTTP_X_PROFILE=profiling.make_token(name))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_KEEP=2)
+    def test_sampled_requests_are_profiled_and_the_oldest_pruned(self):
+        for _ in range(3):
+            self.client.get(self.url)
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+    def test_staff_pages(self):
+        profile = RequestProfile.objects.create(
+            view='tracker:ticket_details', path=self.url, method='GET', status=200, duration=0.2, interval=0.005,
+            samples=3, stacks='main (app.py:1);execute (django/db/backends/utils.py:3) 3',
+        )
+        stacks_url = reverse('profile_stacks', kwargs={'profile_pk': profile.pk})
+        self.assertEqual(self.client.get(reverse('profiles')).status_code, 403)
+        self.assertEqual(self.client.get(stacks_url).status_code, 403)
+
+        self.owner.is_staff = True
+        self.owner.save()
+        response = self.client.get(reverse('profiles'), {'view': 'tracker:ticket_details'})
+        self.assertContains(response, '200 ms')
+        self.assertContains(response, '<td>100%</td>', html=True)
+        self.assertNotContains(self.client.get(reverse('profiles'), {'view': 'team_list'}), stacks_url)
+
+        response = self.client.get(stacks_url)
+        self.assertEqual(response.content.decode(), profile.stacks + '\n')
+        self.assertIn('attachment; filename="tracker-ticket_details-', response['Content-Disposition'])
+
+
+class TestProfilesCommand(TestCase):
+    def setUp(self):
+        self.profile = RequestProfile.objects.create(
+            view='tracker:ticket_details', path='/teams/a/tickets/1/', method='GET', status=200, duration=0.25,
+            interval=0.005, samples=4, stacks='main (app.py:1) 1\nmain (app.py:1);convert (markdown/core.py:5) 3',
+        )
+
+    def test_list_and_export(self):
+        out = StringIO()
+        call_command('profiles', stdout=out)
+        header, row = out.getvalue().splitlines()
+        self.assertEqual(header.split()[:3], ['id', 'time', 'view'])
+        self.assertIn('tracker:ticket_details  GET /teams/a/tickets/1/  200     250', row)
+        self.assertEqual(row.split()[-5:], ['0%', '75%', '0%', '0%', '25%'])
+
+        output = os.path.join(tempfile.mkdtemp(), 'stacks.txt')
+        call_command('profiles', '--export', str(self.profile.pk), '--output', output, stdout=StringIO())
+        with open(output) as f:
+            self.assertEqual(f.read(), self.profile.stacks + '\n')
+        with self.assertRaises(CommandError):
+            call_command('profiles', '--export', '0', stdout=StringIO())
+
+    def test_token(self):
+        with self.assertRaises(CommandError):
+            call_command('profiles', '--token', 'admin', stdout=StringIO())
+        get_user_model().objects.create_user('admin', is_staff=True)
+        out = StringIO()
+        call_command('profiles', '--token', 'admin', stdout=out)
+        self.assertEqual(profiling.signing.loads(out.getvalue().strip(), salt=profiling.TOKEN_SALT), 'admin')
@@ -0,0 +1,155 @@
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import Http404
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import loaders
+from ..models import Comment, Project, Team, TeamInvitation, Ticket, TicketFile
+
+from .utils_for_test_creation import create_team, team_add_manager, team_add_member, user
+
+# The number of queries each page runs for the team owner, with the role cache cold. A change to one of these numbers
+# should be deliberate: update it in the same commit and say why. The pages run in autocommit: none of them opens a
+# transaction (or, inside a test, a savepoint).
+VIEW_QUERY_COUNTS = {
+    'team_list': 7,
+    'team_details': 8,
+    'tracker:team_update': 5,
+    'team_ownership_warning': 5,
+    'manage_team_ownership': 9,
+    'team_invite': 5,
+    'pending_invitations': 6,
+    'manage_subscriptions': 7,
+    'manage_notifications': 3,
+    'tracker:ticket_list': 11,
+    'tracker:closed_ticket_list': 11,
+    'tracker:assigned_ticket_list': 10,
+    'tracker:closed_assigned_ticket_list': 10,
+    'tracker:create_ticket': 7,
+    'tracker:ticket_details': 10,
+    'tracker:ticket_update': 9,
+    'tracker:project_list': 9,
+    'tracker:archived_project_list': 10,
+    'tracker:project_details': 13,
+    'tracker:project_details_closed_tickets': 13,
+    'tracker:project_update': 9,
+    'tracker:project_manage_developers': 12,
+    'tracker:create_project': 7,
+}
+
+
+class TestViewQueryCounts(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.manager = user('manager')
+        self.developer = user('developer')
+        self.member = user('member')
+        self.team = create_team(self.owner)
+        team_add_manager(self.manager, self.team)
+        team_add_member(self.developer, self.team)
+        team_add_member(self.member, self.team)
+        TeamInvitation.objects.create(team=self.team, invitee=self.owner, invitee_email='owner@example.com')
+
+        self.project = Project.objects.create(
+            title='Project', description='Description', team=self.team, manager=self.manager
+        )
+        self.project.developers.add(self.developer, self.owner)
+        Project.objects.create(title='Archived', description='Description', team=self.team, is_archived=True)
+        self.tickets = []
+        for i in range(12):
+            ticket = Ticket.objects.create(
+                title=f'Ticket {i}', description='Description', user=self.owner, project=self.project,
+                team=self.team, status=Ticket.CLOSED if i % 3 == 0 else Ticket.OPEN,
+            )
+            ticket.developer.add(self.developer, self.owner)
+            self.tickets.append(ticket)
+        self.ticket = self.tickets[1]
+        for i in range(10):
+            Comment.objects.create(text=f'Comment {i}', user=self.developer, ticket=self.ticket)
+        TicketFile.objects.create(
+            title='File', ticket=self.ticket, uploaded_by=self.owner,
+            file=SimpleUploadedFile('file.txt', b'contents', content_type='text/plain'),
+        )
+        self.owner.last_viewed_project_pk = self.project.pk
+        self.owner.save()
+
+    def urls(self):
+        team = {'team_slug': self.team.slug}
+        project = {**team, 'project_pk': self.project.pk}
+        ticket = {**team, 'pk': self.ticket.pk}
+        kwargs = {
+            'team_list': {}, 'pending_invitations': {}, 'manage_subscriptions': {}, 'manage_notifications': {},
+            'tracker:ticket_details': ticket, 'tracker:ticket_update': ticket,
+            'tracker:project_details': project, 'tracker:project_details_closed_tickets': project,
+            'tracker:project_update': project, 'tracker:project_manage_developers': project,
+        }
+        query = {'tracker:create_ticket': f'?project={self.project.pk}'}
+        for name in VIEW_QUERY_COUNTS:
+            yield name, reverse(name, kwargs=kwargs.get(name, team)) + query.get(name, '')
+
+    def test_query_counts(self):
+        self.client.force_login(self.owner)
+        counts = {}
+        for name, url in self.urls():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, name)
+            counts[name] = len(queries)
+        self.assertEqual(counts, VIEW_QUERY_COUNTS)
+
+    def test_objects_are_shared_within_a_request(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('tracker:ticket_details', kwargs={'team_slug': self.team.slug, 'pk': self.ticket.pk}))
+        ticket = response.context['ticket']
+        self.assertIs(ticket.team, response.context['current_team'])
+        self.assertIs(ticket.project.team, response.context['current_team'])
+
+        response = self.client.get(reverse('tracker:project_details', kwargs={'team_slug': self.team.slug, 'project_pk': self.project.pk}))
+        self.assertIs(response.context['project'].team, response.context['current_team'])
+
+
+class TestRequestLoader(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.team = create_team(self.owner)
+        self.project = Project.objects.create(title='Project', description='Description', team=self.team)
+        self.ticket = Ticket.objects.create(title='Ticket', user=self.owner, project=self.project, team=self.team)
+        self.loader = loaders.RequestLoader()
+
+    def test_each_row_is_fetched_once(self):
+        with self.assertNumQueries(3):
+            team = self.loader.team(self.team.slug)
+            ticket = self.loader.ticket(self.ticket.pk)
+            project = self.loader.project(str(self.project.pk))
+        with self.assertNumQueries(0):
+            self.assertIs(self.loader.team(self.team.slug), team)
+            self.assertIs(self.loader.get(Team, pk=self.team.pk), team)
+            self.assertIs(self.loader.ticket(str(self.ticket.pk)), ticket)
+            self.assertIs(ticket.team, team)
+            self.assertIs(ticket.project, project)
+            self.assertIs(project.team, team)
+
+    def test_lazily_fetched_relations_are_registered(self):
+        ticket = self.loader.ticket(self.ticket.pk)
+        team = ticket.team
+        with self.assertNumQueries(0):
+            self.assertIs(self.loader.team(self.team.slug), team)
+
+    def test_select_related_instances_are_registered(self):
+        self.loader.get(Ticket, queryset=Ticket.objects.select_related('project'), pk=self.ticket.pk)
+        with self.assertNumQueries(0):
+            self.loader.project(self.project.pk)
+
+    def test_share(self):
+        team = self.loader.team(self.team.slug)
+        with self.assertNumQueries(1):
+            tickets = list(self.loader.share(Ticket.objects.all()))
+            self.assertIs(tickets[0].team, team)
+
+    def test_missing_rows_raise_404(self):
+        with self.assertRaises(Http404):
+            self.loader.team('missing')
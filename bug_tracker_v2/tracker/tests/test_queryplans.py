@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+
+from .. import queryplans
+from ..management.commands.explain_hot_paths import HOT_PATHS
+from ..models import Project, Ticket
+
+from .utils_for_test_creation import create_team, user
+
+
+def node(node_type, *children, **fields):
+    return {'Node Type': node_type, 'Plans': list(children), **fields}
+
+
+class TestPlanChecks(SimpleTestCase):
+    def test_fingerprint_ignores_literals(self):
+        first = 'SELECT * FROM "tracker_ticket" WHERE ("team_id" = 12 AND "title" = \'it\'\'s\' AND "id" IN (1, 2, 3))'
+        second = 'SELECT * FROM "tracker_ticket" WHERE ("team_id" = 7 AND "title" = \'other\' AND "id" IN (4))'
+        self.assertEqual(queryplans.fingerprint(first), queryplans.fingerprint(second))
+        self.assertEqual(
+            queryplans.normalize_sql(first),
+            'SELECT * FROM "tracker_ticket" WHERE ("team_id" = ? AND "title" = ? AND "id" IN (...))',
+        )
+        self.assertNotEqual(queryplans.fingerprint(first), queryplans.fingerprint('SELECT * FROM "tracker_team"'))
+
+    def test_normalize_sql_replaces_parameters(self):
+        self.assertEqual(
+            queryplans.normalize_sql('SELECT * FROM "tracker_ticket" WHERE ("team_id" = %s AND "id" IN (%s, %s))'),
+            'SELECT * FROM "tracker_ticket" WHERE ("team_id" = ? AND "id" IN (...))',
+        )
+        self.assertEqual(
+            queryplans.normalize_sql('INSERT INTO "tracker_comment" ("text", "user_id") VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO "tracker_comment" ("text", "user_id") VALUES (...)',
+        )
+
+    def test_plan_problems(self):
+        plan = node(
+            'Sort',
+            node('Seq Scan', **{'Relation Name': 'tracker_ticket', 'Actual Rows': 10, 'Rows Removed by Filter': 50000, 'Actual Loops': 1}),
+            node('Seq Scan', **{'Relation Name': 'tracker_team', 'Actual Rows': 20, 'Actual Loops': 1}),
+            node('Hash', **{'Hash Batches': 4}),
+            **{'Sort Method': 'external merge', 'Sort Space Type': 'Disk'},
+        )
+        self.assertEqual(queryplans.plan_problems(plan), [
+            'sort spilled to disk (external merge)',
+            'sequential scan of 50010 rows on tracker_ticket',
+            'hash spilled to disk (4 batches)',
+        ])
+        self.assertEqual(queryplans.plan_shape(plan), [
+            'Sort', '  Seq Scan on tracker_ticket', '  Seq Scan on tracker_team', '  Hash',
+        ])
+
+    def test_compare(self):
+        query = {'sql': 'SELECT ?', 'count': 1, 'cost': 100.0, 'shape': ['Index Scan on tracker_ticket'], 'problems': []}
+        self.assertEqual(queryplans.compare({'a': query}, {'a': query}), [])
+        regressed = {**query, 'count': 3, 'cost': 400.0, 'shape': ['Seq Scan on tracker_ticket']}
+        problems = [problem for _key, problem in queryplans.compare({'a': regressed, 'b': query}, {'a': query})]
+        self.assertEqual(problems, [
+            'plan changed:\nSeq Scan on tracker_ticket',
+            'runs 3 times, 1 in the baseline',
+            'cost 400.0, 100.0 in the baseline',
+            'not in the baseline',
+        ])
+        # small absolute cost changes are noise
+        self.assertEqual(queryplans.compare({'a': {**query, 'cost': 190.0}}, {'a': query}), [])
+
+
+class TestExplainHotPathsCommand(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.team = create_team(self.owner)
+        self.project = Project.objects.create(title='Project', description='Description', team=self.team)
+        for i in range(3):
+            ticket = Ticket.objects.create(title=f'Ticket {i}', user=self.owner, project=self.project, team=self.team)
+            ticket.developer.add(self.owner)
+        self.baseline = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+
+    def test_update_then_check(self):
+        call_command('explain_hot_paths', '--update', '--baseline', self.baseline, stdout=StringIO())
+        with open(self.baseline) as f:
+            baseline = json.load(f)
+        self.assertEqual(set(baseline), set(HOT_PATHS))
+
+        out = StringIO()
+        call_command('explain_hot_paths', '--baseline', self.baseline, stdout=out)
+        self.assertIn('No query plan regressions.', out.getvalue())
+
+        for queries in baseline.values():
+            for query in queries.values():
+                query['shape'] = ['Result']
+        with open(self.baseline, 'w') as f:
+            json.dump(baseline, f)
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('explain_hot_paths', '--baseline', self.baseline, stdout=out)
+        self.assertIn('plan changed', out.getvalue())
+
+    def test_missing_baseline(self):
+        with self.assertRaises(CommandError):
+            call_command('explain_hot_paths', '--baseline', self.baseline, stdout=StringIO())
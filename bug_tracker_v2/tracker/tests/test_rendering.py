@@ -0,0 +1,51 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from markdown import markdown
+
+from .. import rendering
+from ..models import Comment, Project, Ticket
+
+from .utils_for_test_creation import create_team, user
+
+SOURCE = '# Heading\n\n```python\nprint("hello")\n```'
+
+
+class TestRenderedMarkdown(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.team = create_team(self.owner)
+        self.project = Project.objects.create(title='Project', description=SOURCE, team=self.team)
+        self.ticket = Ticket.objects.create(title='Ticket', description=SOURCE, user=self.owner, project=self.project, team=self.team)
+
+    def test_rendered_on_save(self):
+        self.assertEqual(self.ticket.description_html, markdown(SOURCE, extensions=rendering.MARKDOWN_EXTENSIONS))
+        self.assertEqual(self.ticket.description_hash, rendering.content_hash(SOURCE))
+        self.assertEqual(self.ticket.resolution_html, '')
+
+    def test_stored_html_is_served(self):
+        Ticket.objects.filter(pk=self.ticket.pk).update(description_html='<p>stored</p>')
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        self.assertEqual(ticket.get_description_as_markdown(), '<p>stored</p>')
+
+    def test_stale_rows_fall_back_to_rendering(self):
+        Ticket.objects.filter(pk=self.ticket.pk).update(description='*changed*')
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        self.assertEqual(ticket.get_description_as_markdown(), '<p><em>changed</em></p>')
+
+    def test_save_with_update_fields_rerenders(self):
+        self.ticket.resolution = 'Fixed.'
+        self.ticket.save(update_fields=['resolution'])
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).resolution_html, '<p>Fixed.</p>')
+
+    def test_backfill_command(self):
+        comment = Comment.objects.create(text='**bold**', user=self.owner, ticket=self.ticket)
+        Comment.objects.update(text_html='', text_hash='')
+        Ticket.objects.update(description='*changed*')
+        call_command('render_markdown', '--chunk-size', '1', stdout=StringIO())
+        self.assertEqual(Comment.objects.get(pk=comment.pk).text_html, '<p><strong>bold</strong></p>')
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).description_html, '<p><em>changed</em></p>')
+        for model in (Project, Ticket, Comment):
+            stale = rendering.annotate_hashes(model.objects.all()).filter(rendering.stale_q(model))
+            self.assertFalse(stale.exists())
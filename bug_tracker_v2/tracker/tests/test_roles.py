@@ -0,0 +1,119 @@
+from django.test import TestCase
+
+from bug_tracker_v2.users.models import User
+from .. import roles
+from ..models import Project, Ticket, TeamMembership
+
+from .transaction_checks import execute_on_commit
+from .utils_for_test_creation import create_team, team_add_manager, team_add_member, user
+
+
+class TestTeamRoleCache(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.member = user('member')
+        self.non_member = user('non_member')
+        self.team = create_team(self.owner)
+        team_add_member(self.member, self.team)
+
+    def test_roles(self):
+        self.assertEqual(roles.get_team_role(self.team, self.owner), TeamMembership.OWNER)
+        self.assertEqual(roles.get_team_role(self.team, self.member), TeamMembership.MEMBER)
+        self.assertIsNone(roles.get_team_role(self.team, self.non_member))
+        self.assertTrue(roles.is_team_owner(self.team, self.owner))
+        self.assertFalse(roles.is_team_owner(self.team, self.member))
+        self.assertFalse(roles.is_team_member(self.team, self.non_member))
+
+    def test_cached_role_is_served_without_queries(self):
+        roles.get_team_role(self.team, self.member)
+        with self.assertNumQueries(0):
+            self.assertTrue(roles.is_team_member(self.team, self.member))
+            self.assertEqual(self.team.get_users_role(self.member), TeamMembership.MEMBER)
+
+    def test_non_membership_is_cached(self):
+        roles.get_team_role(self.team, self.non_member)
+        with self.assertNumQueries(0):
+            self.assertFalse(roles.is_team_member(self.team, self.non_member))
+        with self.assertRaises(TeamMembership.DoesNotExist):
+            self.team.get_users_role(self.non_member)
+
+    def test_membership_role_change_invalidates(self):
+        self.assertFalse(roles.is_team_manager(self.team, self.member))
+        with execute_on_commit():
+            team_add_manager(self.member, self.team)
+        self.assertTrue(roles.is_team_manager(self.team, self.member))
+
+    def test_m2m_add_and_remove_invalidates(self):
+        self.assertFalse(roles.is_team_member(self.team, self.non_member))
+        with execute_on_commit():
+            self.team.members.add(self.non_member)
+        self.assertTrue(roles.is_team_member(self.team, self.non_member))
+        with execute_on_commit():
+            self.non_member.teams.remove(self.team)
+        self.assertFalse(roles.is_team_member(self.team, self.non_member))
+
+    def test_remove_member_invalidates(self):
+        self.assertTrue(roles.is_team_member(self.team, self.member))
+        with execute_on_commit():
+            self.team.remove_member(self.member)
+        self.assertFalse(roles.is_team_member(self.team, self.member))
+
+
+class TestProjectAndTicketPermissionCache(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.manager = user('manager')
+        self.developer = user('developer')
+        self.member = user('member')
+        self.staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+        self.team = create_team(self.owner)
+        team_add_manager(self.manager, self.team)
+        team_add_member(self.developer, self.team)
+        team_add_member(self.member, self.team)
+        self.project = Project.objects.create(title='Project', description='desc', team=self.team, manager=self.manager)
+        self.project.developers.add(self.developer)
+        self.ticket = Ticket.objects.create(title='Ticket', user=self.owner, project=self.project, team=self.team)
+
+    def test_can_view_project(self):
+        self.assertTrue(roles.can_view_project(self.team, self.project, self.owner))
+        self.assertTrue(roles.can_view_project(self.team, self.project, self.manager))
+        self.assertTrue(roles.can_view_project(self.team, self.project, self.developer))
+        self.assertTrue(roles.can_view_project(self.team, self.project, self.staff))
+        self.assertFalse(roles.can_view_project(self.team, self.project, self.member))
+
+    def test_project_developer_changes_invalidate(self):
+        self.assertFalse(roles.can_view_project(self.team, self.project, self.member))
+        with execute_on_commit():
+            self.project.developers.add(self.member)
+        self.assertTrue(roles.can_view_project(self.team, self.project, self.member))
+        with execute_on_commit():
+            self.project.developers.remove(self.member)
+        self.assertFalse(roles.can_view_project(self.team, self.project, self.member))
+
+    def test_project_manager_change_invalidates(self):
+        self.assertTrue(roles.can_view_project(self.team, self.project, self.manager))
+        with execute_on_commit():
+            self.project.manager = None
+            self.project.save()
+        self.assertFalse(roles.can_view_project(self.team, self.project, self.manager))
+
+    def test_remove_manager_invalidates_managed_projects(self):
+        self.assertTrue(roles.is_project_staff(self.project, self.manager))
+        with execute_on_commit():
+            self.team.remove_manager(self.manager)
+        self.assertFalse(roles.is_project_staff(self.project, self.manager))
+
+    def test_can_update_ticket(self):
+        self.assertTrue(roles.can_update_ticket(self.team, self.ticket, self.owner))
+        self.assertTrue(roles.can_update_ticket(self.team, self.ticket, self.manager))
+        self.assertTrue(roles.can_update_ticket(self.team, self.ticket, self.staff))
+        self.assertFalse(roles.can_update_ticket(self.team, self.ticket, self.developer))
+
+    def test_ticket_developer_changes_invalidate(self):
+        self.assertFalse(roles.can_update_ticket(self.team, self.ticket, self.developer))
+        with execute_on_commit():
+            self.ticket.developer.add(self.developer)
+        self.assertTrue(roles.can_update_ticket(self.team, self.ticket, self.developer))
+        with execute_on_commit():
+            self.developer.assigned_tickets.clear()
+        self.assertFalse(roles.can_update_ticket(self.team, self.ticket, self.developer))
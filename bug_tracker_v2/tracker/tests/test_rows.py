@@ -0,0 +1,71 @@
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import IntegerField, Value
+from django.db.models.functions import Lower
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import rows
+from ..models import Project, Ticket
+
+from .utils_for_test_creation import create_team, team_add_member, user
+
+
+class TestTicketRows(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.developer = user('developer')
+        self.team = create_team(self.owner)
+        team_add_member(self.developer, self.team)
+        self.project = Project.objects.create(title='Project', description='Description', team=self.team)
+        self.project.developers.add(self.developer, self.owner)
+        for i in range(25):
+            ticket = Ticket.objects.create(
+                title=f'Ticket {i}', description='Description', user=self.owner, project=self.project,
+                team=self.team, priority=Ticket.HIGH,
+            )
+            ticket.developer.add(self.developer, self.owner)
+            self.owner.ticket_subscriptions.add(ticket)
+        self.ticket = Ticket.objects.create(title='Unassigned', user=self.developer, project=self.project, team=self.team)
+
+    def test_row_contents(self):
+        with self.assertNumQueries(1):
+            row = rows.ticket_rows(Ticket.objects.filter(pk=self.ticket.pk)).get()
+        self.assertEqual(row.pk, self.ticket.pk)
+        self.assertEqual(row.get_absolute_url(), self.ticket.get_absolute_url())
+        self.assertEqual(row.project_url, self.project.get_absolute_url())
+        self.assertEqual(row.team_url, self.team.get_absolute_url())
+        self.assertEqual((row.project_title, row.team_title, row.user_name), ('Project', self.team.title, 'developer'))
+        self.assertEqual(row.get_priority_display(), 'Low')
+        self.assertIsNone(row.developer_names)
+
+        with self.assertNumQueries(1):
+            row = rows.ticket_rows(Ticket.objects.filter(developer=self.developer)).order_by('pk').first()
+        self.assertEqual(row.developer_names, ['developer', 'owner'])
+
+    def test_annotations_are_kept(self):
+        queryset = rows.ticket_rows(Ticket.objects.annotate(rank=Value(1, output_field=IntegerField())))
+        queryset = queryset.annotate(title_lower=Lower('title')).order_by('title_lower')
+        row = queryset.first()
+        self.assertEqual((row.rank, row.title_lower), (1, 'ticket 0'))
+
+    def page_queries(self, url_name, kwargs, per_page):
+        self.client.force_login(self.owner)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name, kwargs=kwargs), {'per_page': per_page})
+        self.assertEqual(len(response.context['table'].page.object_list), per_page)
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        team = {'team_slug': self.team.slug}
+        for url_name, kwargs in (
+            ('tracker:ticket_list', team),
+            ('tracker:assigned_ticket_list', team),
+            ('tracker:project_details', {**team, 'project_pk': self.project.pk}),
+            ('manage_subscriptions', {}),
+        ):
+            self.assertEqual(
+                self.page_queries(url_name, kwargs, 2), self.page_queries(url_name, kwargs, 20), url_name
+            )
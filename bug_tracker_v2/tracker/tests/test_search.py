@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Project, Ticket
+
+from .utils_for_test_creation import create_team, user
+
+
+class TestTicketSearch(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.team = create_team(self.owner)
+        self.project = Project.objects.create(title='Project', description='desc', team=self.team, manager=self.owner)
+        self.login_ticket = Ticket.objects.create(
+            title='Login page crashes', description='Stack trace attached.', user=self.owner, project=self.project, team=self.team
+        )
+        self.export_ticket = Ticket.objects.create(
+            title='Export is slow', description='The CSV export times out.', user=self.owner, project=self.project, team=self.team
+        )
+
+    def search(self, text):
+        return list(search.search_tickets(Ticket.objects.all(), text))
+
+    def test_title_prefix(self):
+        self.assertEqual(self.search('logi'), [self.login_ticket])
+
+    def test_description_and_resolution(self):
+        self.assertEqual(self.search('csv'), [self.export_ticket])
+        self.login_ticket.resolution = 'Patched the session middleware.'
+        self.login_ticket.save()
+        self.assertEqual(self.search('middleware'), [self.login_ticket])
+
+    def test_comments_are_indexed(self):
+        comment = Comment.objects.create(text='Happens with the Firefox session too.', user=self.owner, ticket=self.export_ticket)
+        self.assertEqual(self.search('firefox'), [self.export_ticket])
+        comment.delete()
+        self.assertEqual(self.search('firefox'), [])
+
+    def test_title_matches_rank_first(self):
+        Comment.objects.create(text='Maybe related to the login crash?', user=self.owner, ticket=self.export_ticket)
+        self.assertEqual(self.search('login'), [self.login_ticket, self.export_ticket])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('export crashes'), [])
+
+    def test_punctuation_only_query(self):
+        self.assertEqual(len(self.search('&|!')), 2)
+
+    def test_stopwords_only_query_falls_back_to_contains(self):
+        self.assertTrue(search.only_stopwords('the'))
+        self.assertFalse(search.only_stopwords('the export'))
+        self.assertEqual(self.search('the'), [self.export_ticket])
+        self.assertEqual(self.search('the export'), [self.export_ticket])
+
+    def test_fallback_without_postgres(self):
+        Comment.objects.create(text='Firefox only.', user=self.owner, ticket=self.export_ticket)
+        with mock.patch.object(search, 'is_supported', return_value=False):
+            self.assertEqual(self.search('page crash'), [self.login_ticket])
+            self.assertEqual(self.search('firefox'), [self.export_ticket])
+
+    def test_ticket_list_filter(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('tracker:ticket_list', kwargs={'team_slug': self.team.slug}) + '?title=csv')
+        self.assertContains(response, 'Export is slow')
+        self.assertNotContains(response, 'Login page crashes')
@@ -0,0 +1,54 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from .. import counters, visibility
+from ..models import Comment, Project, ProjectVisibility, Team, TeamMembership, Ticket, TicketFile
+from ..seeding import EPOCH, ScaleSeeder
+
+
+def seed(prefix, seed=1):
+    ScaleSeeder(
+        teams=1, members=15, projects=4, tickets=60, comments=2.0, files=0.2, seed=seed, prefix=prefix, chunk_size=7
+    ).run()
+    return Team.objects.get(slug=f'{prefix}-team-1')
+
+
+def ticket_shape(team):
+    return list(Ticket.objects.filter(team=team).order_by('pk').values_list(
+        'title', 'project__title', 'user__username', 'status', 'priority', 'created_on', 'comment_count', 'file_count'
+    ))
+
+
+class TestScaleSeeder(TestCase):
+    def test_seeds_a_consistent_team(self):
+        team = seed('a')
+        self.assertEqual(team.memberships.count(), 15)
+        self.assertEqual(team.memberships.filter(user__username='a-1-0').get().role, TeamMembership.OWNER)
+        self.assertEqual(Project.objects.filter(team=team).count(), 4)
+        self.assertEqual(Ticket.objects.filter(team=team).count(), 60)
+        self.assertTrue(Comment.objects.filter(ticket__team=team).exists())
+        self.assertTrue(TicketFile.objects.filter(ticket__team=team).exists())
+
+        ticket = Ticket.objects.filter(team=team).order_by('pk').first()
+        self.assertEqual(ticket.priority_rank, Ticket.PRIORITY_RANKS[ticket.priority])
+        self.assertGreaterEqual(ticket.created_on, EPOCH)
+        self.assertTrue(ticket.description_html)
+        # what save() and the receivers would have maintained is in place
+        self.assertFalse(counters.drifted(Project).exists())
+        self.assertFalse(counters.drifted(Ticket).exists())
+        rows = set(ProjectVisibility.objects.values_list('user', 'project', 'access_level'))
+        visibility.rebuild()
+        self.assertEqual(rows, set(ProjectVisibility.objects.values_list('user', 'project', 'access_level')))
+
+    def test_same_seed_same_data(self):
+        first, second, other = seed('a'), seed('b'), seed('c', seed=2)
+        shape = [row[:2] + row[3:] for row in ticket_shape(first)]
+        self.assertEqual(shape, [row[:2] + row[3:] for row in ticket_shape(second)])
+        self.assertNotEqual(shape, [row[:2] + row[3:] for row in ticket_shape(other)])
+
+    def test_command_refuses_an_existing_prefix(self):
+        call_command('seed_scale', '--teams=1', '--members=3', '--projects=1', '--tickets=5', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('seed_scale', '--teams=1', '--members=3', '--projects=1', '--tickets=5', stdout=StringIO())
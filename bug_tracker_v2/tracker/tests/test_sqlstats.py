@@ -0,0 +1,96 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import sqlstats
+from ..models import Project, SqlStatement, Ticket
+
+from .utils_for_test_creation import create_team, user
+
+
+def statement(sql, calls, seconds, rows):
+    result = sqlstats.Statement(sql)
+    result.calls, result.seconds, result.max_seconds, result.rows = calls, seconds, seconds / calls, rows
+    return result
+
+
+class TestSqlStats(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.team = create_team(self.owner)
+        self.project = Project.objects.create(title='Project', description='Description', team=self.team)
+        for i in range(3):
+            Ticket.objects.create(title=f'Ticket {i}', user=self.owner, project=self.project, team=self.team)
+        # start from an empty table, whatever earlier tests left in this process's totals
+        sqlstats.flush()
+        SqlStatement.objects.all().delete()
+        self.client.force_login(self.owner)
+
+    def test_requests_are_aggregated_by_view_and_statement(self):
+        url = reverse('tracker:ticket_list', kwargs={'team_slug': self.team.slug})
+        for _ in range(2):
+            self.client.get(url)
+        sqlstats.flush()
+
+        statements = SqlStatement.objects.filter(view='tracker:ticket_list')
+        self.assertTrue(statements)
+        self.assertFalse(any('%s' in row.sql for row in statements))
+        rows = statements.get(sql__contains='FROM "tracker_ticket"', sql__startswith='SELECT "tracker_ticket"')
+        self.assertEqual((rows.calls, rows.rows), (2, 6))
+        self.assertGreaterEqual(rows.total_seconds, rows.max_seconds)
+
+    def test_flushes_from_several_workers_add_up(self):
+        sqlstats.record('a', {'f1': statement('SELECT ?', 2, 0.004, 10)})
+        sqlstats.flush()
+        sqlstats.record('a', {'f1': statement('SELECT ?', 1, 0.003, 5), 'f2': statement('UPDATE ?', 1, 0.001, 1)})
+        sqlstats.record('b', {'f1': statement('SELECT ?', 1, 0.001, 1)})
+        sqlstats.flush()
+
+        row = SqlStatement.objects.get(view='a', fingerprint='f1')
+        self.assertEqual((row.calls, row.rows), (3, 15))
+        self.assertAlmostEqual(row.total_seconds, 0.007)
+        self.assertAlmostEqual(row.max_seconds, 0.003)
+
+        self.assertEqual([s['fingerprint'] for s in sqlstats.top('calls', view='a')], ['f1', 'f2'])
+        summed = sqlstats.top('total', by_view=False)[0]
+        self.assertEqual((summed['view'], summed['views'], summed['calls'], summed['rows']), (None, 2, 4, 16))
+        self.assertAlmostEqual(summed['mean_seconds'], 0.002)
+
+    @override_settings(SQL_STATS_MAX_ENTRIES=1)
+    def test_a_full_worker_drops_new_statements(self):
+        dropped = sqlstats.dropped
+        sqlstats.record('a', {'f1': statement('SELECT ?', 1, 0.001, 1)})
+        sqlstats.record('a', {'f1': statement('SELECT ?', 1, 0.001, 1), 'f2': statement('UPDATE ?', 3, 0.001, 1)})
+        self.assertEqual(sqlstats.dropped - dropped, 3)
+        sqlstats.maybe_flush()
+        self.assertEqual(list(SqlStatement.objects.values_list('fingerprint', 'calls')), [('f1', 2)])
+
+    def test_endpoint(self):
+        sqlstats.record('a', {'f1': statement('SELECT ?', 2, 0.004, 10)})
+        url = reverse('sql_stats')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.owner.is_staff = True
+        self.owner.save()
+        data = json.loads(self.client.get(url, {'view': 'a', 'order': 'mean'}).content)
+        self.assertEqual(data['order'], 'mean')
+        self.assertEqual(
+            [(s['view'], s['fingerprint'], s['calls'], s['sql']) for s in data['statements']], [('a', 'f1', 2, 'SELECT ?')]
+        )
+        self.assertEqual(self.client.get(url, {'order': 'slowest'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'limit': 'all'}).status_code, 400)
+
+    def test_command(self):
+        sqlstats.record('a', {'f1': statement('SELECT ?', 2, 0.004, 10)})
+        sqlstats.flush()
+        out = StringIO()
+        call_command('sql_stats', '--view', 'a', stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), [
+            'f1  a  calls 2  total 4.0 ms  mean 2.00 ms  max 2.00 ms  rows 10',
+            '    SELECT ?',
+        ])
+        call_command('sql_stats', '--reset', stdout=StringIO())
+        self.assertFalse(SqlStatement.objects.exists())
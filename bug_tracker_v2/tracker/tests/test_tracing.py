@@ -0,0 +1,111 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import tracing
+from ..models import Project, Ticket
+
+from .utils_for_test_creation import create_team, user
+
+
+def attributes(span):
+    return {a['key']: next(iter(a['value'].values())) for a in span['attributes']}
+
+
+class TestTracing(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.team = create_team(self.owner)
+        self.project = Project.objects.create(title='Project', description='Description', team=self.team)
+        self.ticket = Ticket.objects.create(
+            title='Ticket', description='desc', user=self.owner, project=self.project, team=self.team
+        )
+        subscriber = user('subscriber')
+        subscriber.email = 'subscriber@email.com'
+        subscriber.save()
+        self.team.members.add(subscriber)
+        self.project.developers.add(subscriber)
+        self.ticket.subscribers.add(subscriber)
+        self.path = os.path.join(tempfile.mkdtemp(), 'traces.jsonl')
+        self.client.force_login(self.owner)
+
+    def close_ticket(self):
+        url = reverse('tracker:ticket_details', kwargs={'team_slug': self.team.slug, 'pk': self.ticket.pk})
+        return self.client.post(url, {'resolution': 'Fixed *it*', 'close_ticket': ''})
+
+    def test_slow_request_is_written_as_a_span_tree(self):
+        with override_settings(TRACING_THRESHOLD=0, TRACING_FILE=self.path):
+            self.assertEqual(self.close_ticket().status_code, 302)
+        self.assertNotIn(tracing._query, connection.execute_wrappers)  # pylint: disable=protected-access
+
+        [spans] = tracing.read(self.path)
+        root = spans[0]
+        self.assertNotIn('parentSpanId', root)
+        self.assertEqual((root['name'], root['kind']), ('POST tracker:ticket_details', tracing.SERVER))
+        self.assertEqual(attributes(root)['http.status_code'], '302')
+        self.assertEqual(attributes(root)['enduser.id'], str(self.owner.pk))
+        self.assertEqual({span['traceId'] for span in spans}, {root['traceId']})
+        ids = {span['spanId'] for span in spans}
+        self.assertTrue(all(span['parentSpanId'] in ids for span in spans[1:]))
+
+        names = {span['name'] for span in spans}
+        self.assertLessEqual({'permission', 'SELECT', 'UPDATE', 'markdown.render', 'email.queue', 'email.send'}, names)
+        query = next(span for span in spans if span['name'] == 'SELECT')
+        self.assertEqual(query['kind'], tracing.CLIENT)
+        self.assertNotIn('%s', attributes(query)['db.statement'])
+        permissions = [span for span in spans if span['name'] == 'permission']
+        self.assertEqual({span['parentSpanId'] for span in permissions}, {root['spanId']})
+        self.assertEqual(
+            [attributes(span)['code.function'] for span in permissions],
+            ['ViewProjectMixin.test_func', 'TicketDetailsResolution.post'],
+        )
+
+    def test_templates_and_tables_are_spanned(self):
+        url = reverse('tracker:ticket_list', kwargs={'team_slug': self.team.slug})
+        with override_settings(TRACING_THRESHOLD=0, TRACING_FILE=self.path):
+            self.client.get(url, {'ref': 'alice@example.com'})
+        [spans] = tracing.read(self.path)
+        self.assertEqual(attributes(spans[0])['http.target'], url)
+        by_id = {span['spanId']: span for span in spans}
+        table = next(span for span in spans if span['name'] == 'tables.render')
+        self.assertEqual(attributes(table)['table.class'], 'TicketTable')
+        self.assertEqual(by_id[table['parentSpanId']]['name'], 'template.render')
+        self.assertIn('tracker/ticket_list.html', [attributes(span).get('template.name') for span in spans])
+
+    def test_fast_and_untraced_requests_are_not_written(self):
+        with override_settings(TRACING_THRESHOLD=60, TRACING_FILE=self.path):
+            self.close_ticket()
+        with override_settings(TRACING_THRESHOLD=None, TRACING_FILE=self.path):
+            self.close_ticket()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(tracing.current())
+
+    def test_spans_over_the_limit_are_counted(self):
+        with override_settings(TRACING_THRESHOLD=0, TRACING_FILE=self.path, TRACING_MAX_SPANS=3):
+            self.close_ticket()
+        [spans] = tracing.read(self.path)
+        self.assertEqual(len(spans), 3)
+        self.assertGreater(int(attributes(spans[0])['tracer.dropped_spans']), 0)
+
+    def test_span_outside_a_trace_does_nothing(self):
+        with tracing.span('markdown.render') as span:
+            self.assertIsNone(span)
+
+    def test_command(self):
+        with override_settings(TRACING_THRESHOLD=0, TRACING_FILE=self.path):
+            self.close_ticket()
+            self.client.get(reverse('tracker:ticket_list', kwargs={'team_slug': self.team.slug}))
+            out = StringIO()
+            call_command('traces', '--view', 'tracker:ticket_details', '--min-ms', '0', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('POST tracker:ticket_details '))
+        self.assertIn('  permission ', '\n'.join(lines))
+        self.assertFalse(any('tracker:ticket_list' in line for line in lines))
+
+        with self.assertRaises(CommandError):
+            call_command('traces', '--file', self.path + '.missing', stdout=StringIO())
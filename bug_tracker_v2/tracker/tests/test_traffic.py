@@ -0,0 +1,124 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .. import traffic
+from ..models import Comment, Project, Ticket
+
+from .utils_for_test_creation import create_team, team_add_manager, team_add_member, user
+
+
+def create_workload():
+    """A team with a user of every role, a project and a ticket."""
+    people = {name: user(name) for name in ('owner', 'manager', 'developer', 'member', 'outsider')}
+    team = create_team(people['owner'], title='Secret Team')
+    team_add_manager(people['manager'], team)
+    team_add_member(people['developer'], team)
+    team_add_member(people['member'], team)
+    project = Project.objects.create(title='Project', description='Description', team=team, manager=people['manager'])
+    project.developers.add(people['developer'])
+    ticket = Ticket.objects.create(title='Ticket', description='desc', user=people['owner'], project=project, team=team)
+    return people, team, project, ticket
+
+
+class TrafficTestCase:
+    def setUp(self):
+        self.people, self.team, self.project, self.ticket = create_workload()
+        self.path = os.path.join(tempfile.mkdtemp(), 'traffic.jsonl')
+
+    def request(self, person, method, url, data=None):
+        if person is None:
+            self.client.logout()
+        else:
+            self.client.force_login(self.people[person])
+        with override_settings(TRAFFIC_CAPTURE_RATE=1.0, TRAFFIC_CAPTURE_FILE=self.path):
+            return getattr(self.client, method)(url, data)
+
+    def capture_workload(self):
+        team_kwargs = {'team_slug': self.team.slug}
+        ticket_url = reverse('tracker:ticket_details', kwargs={**team_kwargs, 'pk': self.ticket.pk})
+        self.request('owner', 'get', reverse('tracker:ticket_list', kwargs=team_kwargs),
+                     {'sort': '-priority', 'title': 'secret bug', 'created_start_date': '2020-01-31'})
+        self.request('developer', 'get', ticket_url)
+        self.request('developer', 'post', ticket_url, {'comment': 'My private comment', 'post_comment': 'Submit'})
+        self.request('manager', 'get', reverse('tracker:project_details', kwargs={
+            **team_kwargs, 'project_pk': self.project.pk
+        }))
+        self.request('member', 'get', reverse('tracker:project_list', kwargs=team_kwargs))
+        self.request('outsider', 'get', reverse('home'))
+        self.request(None, 'get', reverse('tracker:ticket_list', kwargs=team_kwargs))
+        return list(traffic.read(self.path))
+
+
+class TestTrafficCapture(TrafficTestCase, TestCase):
+    def test_requests_are_captured_anonymized(self):
+        captured = self.capture_workload()
+        self.assertEqual([(request['method'], request['view'], request['role']) for request in captured], [
+            ('GET', 'tracker:ticket_list', 'owner'),
+            ('GET', 'tracker:ticket_details', 'developer'),
+            ('POST', 'tracker:ticket_details', 'developer'),
+            ('GET', 'tracker:project_details', 'manager'),
+            ('GET', 'tracker:project_list', 'member'),
+            ('GET', 'home', traffic.USER),
+            ('GET', 'tracker:ticket_list', traffic.ANONYMOUS),
+        ])
+        tickets, details, comment = captured[:3]
+        self.assertEqual(tickets['query'], {'sort': ['-priority'], 'title': [10], 'created_start_date': ['2020-01-31']})
+        self.assertEqual(comment['body'], {'comment': [18], 'post_comment': [6]})
+        self.assertEqual((comment['status'], comment['files']), (302, 0))
+        self.assertEqual(details['kwargs'], comment['kwargs'])
+        self.assertEqual(details['kwargs']['team_slug'], tickets['kwargs']['team_slug'])
+
+        with open(self.path) as f:
+            content = f.read()
+        for secret in (self.team.slug, 'secret', 'private'):
+            self.assertNotIn(secret, content.lower())
+
+    def test_nothing_is_captured_by_default(self):
+        self.client.force_login(self.people['owner'])
+        with override_settings(TRAFFIC_CAPTURE_FILE=self.path):
+            self.client.get(reverse('tracker:ticket_list', kwargs={'team_slug': self.team.slug}))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_replay(self):
+        self.capture_workload()
+        comments = Comment.objects.count()
+        out, err = StringIO(), StringIO()
+        output = os.path.join(os.path.dirname(self.path), 'report.json')
+        call_command('replay_traffic', '--file', self.path, '--concurrency', '1', '--output', output,
+                     stdout=out, stderr=err)
+        self.assertEqual(err.getvalue(), '')
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual((report['requests'], report['errors'], report['status_mismatches']), (7, 0, 0))
+        self.assertEqual(report['views']['tracker:ticket_details']['requests'], 2)
+        self.assertIn('7 requests in', out.getvalue())
+        # every request was rolled back
+        self.assertEqual(Comment.objects.count(), comments)
+
+    def test_unknown_objects_are_skipped(self):
+        captured = self.capture_workload()
+        captured[0]['view'] = 'tracker:delete_comment'
+        self.ticket.delete()
+        replayed, skipped = traffic.prepare(captured, traffic.LocalObjects())
+        self.assertEqual(skipped, {'only posted to from another page': 1, 'no local object for its url': 2})
+        self.assertEqual(len(replayed), 4)
+
+
+class TestConcurrentReplay(TrafficTestCase, TransactionTestCase):
+    def test_requests_run_on_several_threads(self):
+        captured = self.capture_workload() * 3
+        replayed, skipped = traffic.prepare(captured, traffic.LocalObjects())
+        self.assertFalse(skipped)
+        with override_settings(TRAFFIC_CAPTURE_RATE=0.0):
+            results, wall = traffic.run(replayed, concurrency=3)
+        self.assertEqual(len(results), 21)
+        self.assertEqual([status for _replay, status, _seconds in results].count(500), 0)
+        report = traffic.report(results, wall)
+        self.assertEqual(report['status_mismatches'], 0)
+        self.assertGreater(report['throughput_rps'], 0)
@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Project, Ticket
+
+from .transaction_checks import TransactionChecker
+from .utils_for_test_creation import create_team, team_add_member, user
+
+
+class TestTransactionChecker(TestCase):
+    def test_io_inside_a_transaction_is_recorded(self):
+        with TransactionChecker().installed() as checker:
+            checker.started('/write/')
+            cache.get('key')
+            with transaction.atomic():
+                cache.set('key', 1)
+                mail.send_mail('Subject', 'Body', 'from@example.com', ['to@example.com'])
+            mail.send_mail('Subject', 'Body', 'from@example.com', ['to@example.com'])
+            checker.finished()
+        self.assertEqual(checker.violations, [
+            'cache.set in /write/ with 1 atomic block(s) open',
+            'email in /write/ with 1 atomic block(s) open',
+        ])
+
+    def test_on_commit_callbacks_run_as_in_autocommit(self):
+        calls = []
+        with TransactionChecker().installed() as checker:
+            checker.started('/write/')
+            transaction.on_commit(lambda: calls.append('outside'))
+            self.assertEqual(calls, ['outside'])
+            with transaction.atomic():
+                transaction.on_commit(lambda: calls.append('committed'))
+                with transaction.atomic():
+                    transaction.on_commit(lambda: calls.append('nested'))
+                self.assertEqual(calls, ['outside'])
+            self.assertEqual(calls, ['outside', 'committed', 'nested'])
+            try:
+                with transaction.atomic():
+                    transaction.on_commit(lambda: calls.append('rolled back'))
+                    raise ValueError
+            except ValueError:
+                pass
+            checker.finished()
+        self.assertEqual(calls, ['outside', 'committed', 'nested'])
+        self.assertEqual(checker.violations, [])
+
+
+class TestViewTransactions(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.developer = user('developer')
+        self.developer.email = 'developer@example.com'
+        self.developer.save()
+        self.team = create_team(self.owner)
+        team_add_member(self.developer, self.team)
+        self.project = Project.objects.create(title='Project', description='Description', team=self.team)
+        self.project.developers.add(self.developer)
+        self.ticket = Ticket.objects.create(title='Ticket', user=self.owner, project=self.project, team=self.team)
+        self.ticket.subscribers.add(self.developer)
+        self.client.force_login(self.owner)
+
+    def atomic_blocks(self, method, url, data=None):
+        """The number of atomic blocks the request opens."""
+        enter = transaction.Atomic.__enter__
+        with mock.patch.object(transaction.Atomic, '__enter__', autospec=True, side_effect=enter) as entered:
+            response = getattr(self.client, method)(url, data)
+        self.assertLess(response.status_code, 400)
+        return entered.call_count
+
+    def test_reads_run_outside_transactions(self):
+        team = {'team_slug': self.team.slug}
+        self.assertFalse(connection.settings_dict['ATOMIC_REQUESTS'])
+        self.assertEqual(self.atomic_blocks('get', reverse('tracker:ticket_list', kwargs=team)), 0)
+        self.assertEqual(self.atomic_blocks('get', reverse('tracker:project_list', kwargs=team)), 0)
+        self.assertEqual(self.atomic_blocks('get', reverse('tracker:ticket_details', kwargs={
+            **team, 'pk': self.ticket.pk
+        })), 0)
+
+    def test_closing_a_ticket_emails_after_the_commit(self):
+        url = reverse('tracker:ticket_details', kwargs={'team_slug': self.team.slug, 'pk': self.ticket.pk})
+        self.assertGreater(self.atomic_blocks('post', url, {'close_ticket': '', 'resolution': 'Fixed.'}), 0)
+        # sent once the view's block committed; the autouse checker fails the test had it been sent inside it
+        self.assertEqual([message.subject for message in mail.outbox], ['Ticket closed: Ticket'])
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).resolution_html, '<p>Fixed.</p>')
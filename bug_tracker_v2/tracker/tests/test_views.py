@@ -1,6 +1,11 @@
+import json
 from datetime import date, timedelta
+from unittest import mock
 
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import AnonymousUser
 from django.urls import reverse
 from django.http import Http404
@@ -8,10 +13,11 @@ from django.core import mail
 
 from bug_tracker_v2.users.models import User
 from bug_tracker_v2.users.tests.factories import UserFactory
-from .. import views
+from .. import budgets, views
 from ..models import Team, Project, Ticket, Comment, TeamInvitation
 from ..models import TeamMembership as Membership
 
+from .transaction_checks import execute_on_commit
 from .utils_for_test_creation import create_team, team_add_manager, team_add_member, user
 
 class TestCommonTemplateContextMixin(TestCase):
@@ -3483,19 +3489,23 @@ class TestProjectSubscribersReceiveEmailsOnTicketSubmission(TestCase):
 
     def test_subscriber_receives_email(self):
         self.assertEqual(len(mail.outbox), 0)
-        Ticket.objects.create(title='Ticket Title', user=self.owner, project=self.project, team=self.team)
+        with execute_on_commit():
+            Ticket.objects.create(title='Ticket Title', user=self.owner, project=self.project, team=self.team)
         self.assertEqual(len(mail.outbox), 1)
 
     def test_email_subject(self):
-        Ticket.objects.create(title='Ticket Title', user=self.owner, project=self.project, team=self.team)
+        with execute_on_commit():
+            Ticket.objects.create(title='Ticket Title', user=self.owner, project=self.project, team=self.team)
         self.assertIn(self.project.title, mail.outbox[0].subject)
 
     def test_email_body(self):
-        Ticket.objects.create(title='Ticket Title', user=self.owner, project=self.project, team=self.team)
+        with execute_on_commit():
+            Ticket.objects.create(title='Ticket Title', user=self.owner, project=self.project, team=self.team)
         self.assertIn(self.project.title, mail.outbox[0].body)
 
     def test_email_to(self):
-        Ticket.objects.create(title='Ticket Title', user=self.owner, project=self.project, team=self.team)
+        with execute_on_commit():
+            Ticket.objects.create(title='Ticket Title', user=self.owner, project=self.project, team=self.team)
         self.assertIn(self.subscriber.email, mail.outbox[0].to)
 
 
@@ -4034,3 +4044,98 @@ class TestLeaveTeam(TestCase):
         self.client.force_login(self.member)
         response = self.client.get(self.url, follow=True)
         self.assertEqual(len(mail.outbox), 1)
+
+
+class TestQueryBudgets(TestCase):
+    """Every page is requested on a team with more tickets, comments and members than a page shows, so a query per
+    row or per membership check shows up as a page over its view's query_budget."""
+    URL_NAMES = (
+        'team_list', 'team_details', 'tracker:team_update', 'team_ownership_warning', 'manage_team_ownership',
+        'team_invite', 'pending_invitations', 'manage_subscriptions', 'manage_notifications', 'tracker:ticket_list',
+        'tracker:closed_ticket_list', 'tracker:assigned_ticket_list', 'tracker:closed_assigned_ticket_list',
+        'tracker:create_ticket', 'tracker:ticket_details', 'tracker:ticket_update', 'tracker:project_list',
+        'tracker:archived_project_list', 'tracker:project_details', 'tracker:project_details_closed_tickets',
+        'tracker:project_update', 'tracker:project_manage_developers', 'tracker:create_project',
+    )
+
+    def setUp(self):
+        self.owner = user('owner')
+        self.manager = user('manager')
+        self.team = create_team(self.owner)
+        team_add_manager(self.manager, self.team)
+        self.developers = [user(f'developer{i}') for i in range(4)]
+        for member in self.developers + [user(f'member{i}') for i in range(4)]:
+            team_add_member(member, self.team)
+        TeamInvitation.objects.create(team=self.team, invitee=self.owner, invitee_email='owner@example.com')
+        other_team = create_team(self.owner, title='Other Team')
+        Project.objects.create(title='Other', description='Description', team=other_team)
+
+        self.project = Project.objects.create(
+            title='Project', description='Description', team=self.team, manager=self.manager
+        )
+        self.project.developers.add(*self.developers)
+        for i in range(3):
+            Project.objects.create(title=f'Archived {i}', description='Description', team=self.team, is_archived=True)
+            Project.objects.create(title=f'Other {i}', description='Description', team=self.team, manager=self.manager)
+        for i in range(40):
+            ticket = Ticket.objects.create(
+                title=f'Ticket {i}', description='Description', user=self.developers[i % 4], project=self.project,
+                team=self.team, status=Ticket.CLOSED if i % 2 else Ticket.OPEN, priority=Ticket.PRIORITY_CHOICES[i % 4][0],
+            )
+            ticket.developer.add(self.developers[i % 4], self.developers[(i + 1) % 4])
+            ticket.subscribers.add(self.owner, self.manager, *self.developers)
+        self.ticket = ticket
+        for i in range(25):
+            Comment.objects.create(text=f'Comment {i}', user=self.developers[i % 4], ticket=self.ticket)
+
+    def urls(self):
+        team = {'team_slug': self.team.slug}
+        project = {**team, 'project_pk': self.project.pk}
+        ticket = {**team, 'pk': self.ticket.pk}
+        kwargs = {
+            'team_list': {}, 'pending_invitations': {}, 'manage_subscriptions': {}, 'manage_notifications': {},
+            'tracker:ticket_details': ticket, 'tracker:ticket_update': ticket,
+            'tracker:project_details': project, 'tracker:project_details_closed_tickets': project,
+            'tracker:project_update': project, 'tracker:project_manage_developers': project,
+        }
+        query = {'tracker:create_ticket': f'?project={self.project.pk}'}
+        for name in self.URL_NAMES:
+            yield name, reverse(name, kwargs=kwargs.get(name, team)) + query.get(name, '')
+
+    def test_pages_stay_within_their_budgets(self):
+        for persona in (self.owner, self.manager, self.developers[0]):
+            self.client.force_login(persona)
+            for name, url in self.urls():
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                view, budget = response.wsgi_request.query_budget
+                statements = [query['sql'] for query in queries.captured_queries]
+                with self.subTest(persona=persona.username, page=name):
+                    self.assertIsNotNone(budget, f'{view} has no query_budget')
+                    self.assertLessEqual(len(statements), budget, budgets.repeated_queries(statements))
+
+    def test_requests_over_budget_are_logged(self):
+        self.client.force_login(self.owner)
+        url = reverse('tracker:ticket_details', kwargs={'team_slug': self.team.slug, 'pk': self.ticket.pk})
+        with mock.patch.object(views.TicketDetails, 'query_budget', 2), \
+                self.assertLogs('bug_tracker_v2.tracker.budgets', 'WARNING') as logs:
+            self.client.get(url)
+        warning = json.loads(logs.records[0].args[0])
+        self.assertEqual((warning['view'], warning['url_name'], warning['budget']), ('TicketDetails', 'tracker:ticket_details', 2))
+        self.assertGreater(warning['queries'], 2)
+
+        with self.assertRaises(AssertionError), self.assertLogs('bug_tracker_v2.tracker.budgets', 'WARNING'):
+            self.client.get(url)
+
+    def test_repeated_queries(self):
+        statements = [
+            'SELECT * FROM "tracker_project" WHERE "id" = 1',
+            'SELECT * FROM "tracker_team" WHERE "id" = 1',
+            'SELECT * FROM "tracker_project" WHERE "id" = 2',
+            'SELECT * FROM "tracker_project" WHERE "id" = 3',
+        ]
+        self.assertEqual(budgets.repeated_queries(statements), [{
+            'fingerprint': budgets.queryplans.fingerprint(statements[0]), 'count': 3,
+            'sql': 'SELECT * FROM "tracker_project" WHERE "id" = ?',
+        }])
@@ -0,0 +1,118 @@
+import threading
+from functools import partial
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+
+from .. import visibility
+from ..models import Project, ProjectVisibility, Ticket
+
+from .utils_for_test_creation import create_team, team_add_manager, team_add_member, user
+
+
+class TestProjectVisibility(TestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.manager = user('manager')
+        self.developer = user('developer')
+        self.member = user('member')
+        self.team = create_team(self.owner)
+        team_add_manager(self.manager, self.team)
+        team_add_member(self.developer, self.team)
+        team_add_member(self.member, self.team)
+        self.project = Project.objects.create(title='Project', description='desc', team=self.team, manager=self.manager)
+        self.project.developers.add(self.developer)
+        self.other_project = Project.objects.create(title='Other', description='desc', team=self.team)
+        self.ticket = Ticket.objects.create(title='Ticket', user=self.owner, project=self.project, team=self.team)
+        self.other_ticket = Ticket.objects.create(title='Other', user=self.owner, project=self.other_project, team=self.team)
+
+    def access_levels(self, project):
+        return dict(ProjectVisibility.objects.filter(project=project).values_list('user__username', 'access_level'))
+
+    def test_rows_follow_roles(self):
+        self.assertEqual(self.access_levels(self.project), {
+            'owner': ProjectVisibility.OWNER,
+            'manager': ProjectVisibility.MANAGER,
+            'developer': ProjectVisibility.DEVELOPER,
+        })
+        self.assertEqual(self.access_levels(self.other_project), {'owner': ProjectVisibility.OWNER})
+
+    def test_querysets_use_visibility(self):
+        self.assertEqual(set(Project.objects.filter_for_team_and_user(self.team.slug, self.owner)), {self.project, self.other_project})
+        self.assertEqual(list(Project.objects.filter_for_team_and_user(self.team.slug, self.developer)), [self.project])
+        self.assertEqual(list(Project.objects.filter_for_team_and_user(self.team.slug, self.member)), [])
+        self.assertEqual(list(Ticket.objects.filter_for_team_and_user(self.team.slug, self.manager)), [self.ticket])
+        self.assertEqual(set(Ticket.objects.filter_for_team_and_user(self.team.slug, self.owner)), {self.ticket, self.other_ticket})
+
+    def test_developer_changes_refresh(self):
+        self.project.developers.add(self.member)
+        self.assertEqual(self.access_levels(self.project)['member'], ProjectVisibility.DEVELOPER)
+        self.member.developer_assigned_projects.clear()
+        self.assertNotIn('member', self.access_levels(self.project))
+
+    def test_manager_change_refreshes(self):
+        self.other_project.manager = self.member
+        self.other_project.save()
+        self.assertEqual(self.access_levels(self.other_project)['member'], ProjectVisibility.MANAGER)
+        self.team.remove_manager(self.manager)
+        self.assertNotIn('manager', self.access_levels(self.project))
+
+    def test_ownership_changes_refresh(self):
+        self.team.add_owner(self.member)
+        self.assertEqual(self.access_levels(self.other_project)['member'], ProjectVisibility.OWNER)
+        self.team.remove_member(self.developer)
+        self.assertNotIn('developer', self.access_levels(self.project))
+
+    def test_rebuild_restores_rows(self):
+        ProjectVisibility.objects.all().delete()
+        self.assertEqual(visibility.rebuild(chunk_size=1), 4)
+        call_command('rebuild_project_visibility', '--team', self.team.slug, stdout=StringIO())
+        self.assertEqual(ProjectVisibility.objects.count(), 4)
+
+
+class TestConcurrentRefresh(TransactionTestCase):
+    def setUp(self):
+        self.owner = user('owner')
+        self.team = create_team(self.owner)
+        self.project = Project.objects.create(title='Project', description='desc', team=self.team)
+
+    def run_concurrently(self, first, second):
+        """Runs `first` in an open transaction on another connection, starts `second` on a third, then commits."""
+        started, release, errors = threading.Event(), threading.Event(), []
+
+        def in_thread(refresh, hold=False):
+            try:
+                with transaction.atomic():
+                    refresh()
+                    if hold:
+                        started.set()
+                        release.wait(5)
+            except Exception as e:  # pragma: no cover - reported by the assertion below
+                errors.append(e)
+                started.set()
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=in_thread, args=(first, True))
+        holder.start()
+        started.wait(5)
+        waiter = threading.Thread(target=in_thread, args=(second,))
+        waiter.start()
+        waiter.join(0.5)
+        release.set()
+        holder.join()
+        waiter.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(list(ProjectVisibility.objects.values_list('user__username', flat=True)), ['owner'])
+
+    def test_project_refreshes_are_serialized(self):
+        refresh = partial(visibility.refresh_projects, [self.project.pk])
+        self.run_concurrently(refresh, refresh)
+
+    def test_project_and_member_refreshes_are_serialized(self):
+        self.run_concurrently(
+            partial(visibility.refresh_team_members, self.team.pk, [self.owner.pk]),
+            partial(visibility.refresh_projects, [self.project.pk]),
+        )
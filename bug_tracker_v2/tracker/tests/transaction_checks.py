@@ -0,0 +1,122 @@
+"""Checks that requests keep external I/O out of their transactions, and runs their on_commit callbacks.
+
+TestCase runs every test inside a transaction that is rolled back, so `transaction.on_commit()` callbacks never run and
+every write looks like it happens with a transaction open. While a request made with the test client is handled, the
+checker treats the transaction depth the request started at as autocommit, the way production runs it:
+
+    * an on_commit callback registered at that depth runs right away, and one registered inside a view's atomic block
+      runs when the outermost block exits;
+    * sending an email, connecting a socket, saving a file to storage or writing to the cache at a greater depth is
+      recorded as a violation.
+
+bug_tracker_v2/conftest.py installs a checker around every test and fails the test if it recorded a violation. Code a
+test calls directly, outside a request, runs its callbacks with `execute_on_commit()`.
+"""
+import socket
+import threading
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import get_storage_class
+from django.core.signals import request_finished, request_started
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+CACHE_WRITES = ('add', 'set', 'touch', 'delete', 'set_many', 'delete_many', 'incr', 'clear')
+
+
+def depth():
+    """How many atomic blocks are open: the outermost one opens no savepoint, every nested one pushes an id."""
+    return int(connection.in_atomic_block) + len(connection.savepoint_ids)
+
+
+def run_callbacks(mark):
+    """Runs and drops the on_commit callbacks registered since `connection.run_on_commit` had `mark` entries."""
+    while len(connection.run_on_commit) > mark:
+        _sids, func = connection.run_on_commit.pop(mark)
+        func()
+
+
+@contextmanager
+def execute_on_commit():
+    """Runs the on_commit callbacks registered inside the block when it exits, as a commit would."""
+    mark = len(connection.run_on_commit)
+    yield
+    run_callbacks(mark)
+
+
+class TransactionChecker:
+    def __init__(self):
+        self.violations = []
+        self._local = threading.local()
+
+    def _request(self):
+        """The (path, baseline depth, on_commit mark) of the request this thread is handling, or None."""
+        return getattr(self._local, 'request', None)
+
+    def started(self, path):
+        """Marks the start of a request on this thread at the current transaction depth."""
+        self._local.request = (path, depth(), len(connection.run_on_commit))
+
+    def finished(self):
+        """Ends the request, running any on_commit callbacks it left behind."""
+        request = self._request()
+        if request is not None:
+            self._local.request = None
+            run_callbacks(request[2])
+
+    def _started(self, sender, environ=None, **kwargs):
+        self.started((environ or {}).get('PATH_INFO', ''))
+
+    def _finished(self, sender, **kwargs):
+        self.finished()
+
+    def _on_commit(self, original):
+        def on_commit(func, using=None):
+            request = self._request()
+            if request is not None and depth() <= request[1]:
+                func()
+            else:
+                original(func, using)
+        return on_commit
+
+    def _atomic_exit(self, original):
+        checker = self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            original(self, exc_type, exc_value, traceback)
+            request = checker._request()
+            if request is not None and exc_type is None and depth() == request[1]:
+                run_callbacks(request[2])
+        return __exit__
+
+    def _probe(self, name, original):
+        def probe(*args, **kwargs):
+            request = self._request()
+            if request is not None and depth() > request[1]:
+                self.violations.append(f'{name} in {request[0]} with {depth() - request[1]} atomic block(s) open')
+            return original(*args, **kwargs)
+        return probe
+
+    @contextmanager
+    def installed(self):
+        probed = [
+            (import_string(settings.EMAIL_BACKEND), 'send_messages', 'email'),
+            (socket.socket, 'connect', 'socket connect'),
+            (get_storage_class(), 'save', 'file storage save'),
+            *((type(caches['default']), method, f'cache.{method}') for method in CACHE_WRITES),
+        ]
+        with ExitStack() as stack:
+            for cls, attribute, name in probed:
+                stack.enter_context(mock.patch.object(cls, attribute, self._probe(name, getattr(cls, attribute))))
+            stack.enter_context(mock.patch.object(transaction, 'on_commit', self._on_commit(transaction.on_commit)))
+            stack.enter_context(
+                mock.patch.object(transaction.Atomic, '__exit__', self._atomic_exit(transaction.Atomic.__exit__))
+            )
+            request_started.connect(self._started, weak=False)
+            request_finished.connect(self._finished, weak=False)
+            stack.callback(request_started.disconnect, self._started)
+            stack.callback(request_finished.disconnect, self._finished)
+            yield self
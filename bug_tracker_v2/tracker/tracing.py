@@ -0,0 +1,274 @@
+"""Span traces of slow requests: where the time went, as a tree.
+
+A slow request shows up in the metrics, and a profile shows which functions are hot, but neither says that closing a
+ticket spent its time checking permissions twice, rendering the resolution's markdown and sending six emails one
+after the other. A trace does. With settings.TRACING_THRESHOLD set, config.middleware.TimeRequests traces every
+request: a root span for the request with nested spans for
+
+- the permission checks of the view mixins (utils.PermissionMixin) and the view's get_object,
+- every SQL query, with its normalized statement,
+- every template and django_tables2 table rendered,
+- every markdown rendering, and
+- every email queued in and sent from the outbox.
+
+The trace of a request that took at least TRACING_THRESHOLD seconds is appended to TRACING_FILE as one line of
+OTLP/JSON, the format of OpenTelemetry's file exporter, so the file can be loaded by the collector's otlpjsonfile
+receiver or read with `manage.py traces`. Faster requests are dropped.
+
+Spans are kept per thread; span() is a no-op outside a traced request, which is a thread-local lookup. A trace keeps
+at most TRACING_MAX_SPANS spans and counts the rest, so a template including another in a loop can't grow it without
+limit.
+"""
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.db import connection
+from django.template.base import Template
+
+from . import metrics
+from .sqlstats import normalize
+
+SERVICE_NAME = 'bug_tracker'
+
+# OTLP span kinds
+INTERNAL = 1
+SERVER = 2
+CLIENT = 3
+# OTLP status codes
+STATUS_ERROR = 2
+
+_local = threading.local()
+_NOOP = nullcontext()
+_write_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ('name', 'kind', 'span_id', 'parent_id', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, name, kind, parent_id, attributes):
+        self.name = name
+        self.kind = kind
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = attributes
+        self.error = None
+
+
+class Trace:
+    """The spans of one request, parents before their children."""
+
+    def __init__(self, max_spans):
+        self.trace_id = secrets.token_hex(16)
+        self.max_spans = max_spans
+        self.spans = []
+        self.open = []
+        self.dropped = 0
+
+    def start(self, name, kind=INTERNAL, attributes=None):
+        """Opens a span under the innermost open one. Returns None when the trace is full."""
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return None
+        span = Span(name, kind, self.open[-1].span_id if self.open else None, attributes or {})
+        self.spans.append(span)
+        self.open.append(span)
+        return span
+
+    def end(self, span):
+        if span is not None:
+            span.end = time.time_ns()
+            self.open.remove(span)
+
+    @property
+    def root(self):
+        return self.spans[0]
+
+    @property
+    def duration(self):
+        """Seconds the root span took."""
+        return (self.root.end - self.root.start) / 1e9
+
+
+def current():
+    """The trace of the request this thread is handling, or None."""
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def _span(trace, name, kind, attributes):
+    span = trace.start(name, kind, attributes)
+    try:
+        yield span
+    except BaseException as e:
+        if span is not None:
+            span.error = type(e).__name__
+        raise
+    finally:
+        trace.end(span)
+
+
+def span(name, kind=INTERNAL, **attributes):
+    """A context manager timing its block as a span of the current trace; does nothing outside a traced request."""
+    trace = current()
+    if trace is None:
+        return _NOOP
+    return _span(trace, name, kind, attributes)
+
+
+def _query(execute, sql, params, many, context):
+    operation = sql.split(None, 1)[0].upper() if sql.strip() else 'SQL'
+    with span(operation, CLIENT, **{'db.system': connection.vendor, 'db.statement': normalize(sql)[1]}):
+        return execute(sql, params, many, context)
+
+
+def begin(request):
+    """Starts tracing the request on this thread."""
+    trace = Trace(settings.TRACING_MAX_SPANS)
+    # the path without the query string, which holds search terms and usernames
+    trace.start(request.method, SERVER, {'http.method': request.method, 'http.target': request.path})
+    _local.trace = request._trace = trace  # pylint: disable=protected-access
+    if _query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query)
+    return trace
+
+
+def finish(request, response):
+    """Ends the request's trace and returns it, or None if the request wasn't traced."""
+    trace = getattr(request, '_trace', None)
+    if trace is None:
+        return None
+    if _query in connection.execute_wrappers:
+        connection.execute_wrappers.remove(_query)
+    _local.trace = None
+    root = trace.root
+    view = metrics.view_name(request)
+    root.name = f'{request.method} {view}'
+    root.attributes['http.route'] = view
+    root.attributes['http.status_code'] = response.status_code
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        root.attributes['enduser.id'] = str(user.pk)
+    if trace.dropped:
+        root.attributes['tracer.dropped_spans'] = trace.dropped
+    if response.status_code >= 500:
+        root.error = str(response.status_code)
+    for span in reversed(trace.open):
+        trace.end(span)
+    return trace
+
+
+def _value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _attributes(attributes):
+    return [{'key': key, 'value': _value(value)} for key, value in attributes.items()]
+
+
+def to_otlp(trace):
+    """The trace as an OTLP/JSON ExportTraceServiceRequest."""
+    spans = []
+    for span in trace.spans:
+        exported = {
+            'traceId': trace.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': span.kind,
+            'startTimeUnixNano': str(span.start),
+            'endTimeUnixNano': str(span.end),
+            'attributes': _attributes(span.attributes),
+            'status': {'code': STATUS_ERROR, 'message': span.error} if span.error else {},
+        }
+        if span.parent_id:
+            exported['parentSpanId'] = span.parent_id
+        spans.append(exported)
+    return {'resourceSpans': [{
+        'resource': {'attributes': _attributes({'service.name': SERVICE_NAME, 'process.pid': os.getpid()})},
+        'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}],
+    }]}
+
+
+def append_line(path, line):
+    """Appends a line to a file in a single write, so that the lines of threads and workers don't interleave."""
+    with _write_lock:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (line + '\n').encode())
+        finally:
+            os.close(fd)
+
+
+def write(trace, path=None):
+    """Appends the trace to TRACING_FILE as one line."""
+    append_line(path or settings.TRACING_FILE, json.dumps(to_otlp(trace), separators=(',', ':')))
+
+
+def read(path):
+    """Yields the spans of each trace in an OTLP/JSON lines file, as lists of span dicts."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield [
+                    span
+                    for resource in json.loads(line)['resourceSpans']
+                    for scope in resource['scopeSpans']
+                    for span in scope['spans']
+                ]
+
+
+def tree(spans, min_ms=0.0):
+    """Yields (depth, span, milliseconds) for the spans of a trace, depth first; the children of a span shorter than
+    min_ms are left out with it."""
+    children = {}
+    for span in spans:
+        children.setdefault(span.get('parentSpanId'), []).append(span)
+
+    def walk(parent_id, depth):
+        for span in children.get(parent_id, ()):
+            ms = (int(span['endTimeUnixNano']) - int(span['startTimeUnixNano'])) / 1e6
+            if depth and ms < min_ms:
+                continue
+            yield depth, span, ms
+            yield from walk(span['spanId'], depth + 1)
+
+    yield from walk(None, 0)
+
+
+def _traced(name, attributes_of):
+    def decorate(function):
+        def traced(self, *args, **kwargs):
+            trace = current()
+            if trace is None:
+                return function(self, *args, **kwargs)
+            with _span(trace, name, INTERNAL, attributes_of(self, *args)):
+                return function(self, *args, **kwargs)
+        traced.__wrapped__ = function
+        return traced
+    return decorate
+
+
+def install():
+    """Adds spans to template and django_tables2 table rendering. Called once, when the app is ready."""
+    from django_tables2.templatetags.django_tables2 import RenderTableNode
+
+    if not hasattr(Template.render, '__wrapped__'):
+        Template.render = _traced(
+            'template.render', lambda template, context: {'template.name': template.name or ''}
+        )(Template.render)
+    if not hasattr(RenderTableNode.render, '__wrapped__'):
+        RenderTableNode.render = _traced(
+            'tables.render', lambda node, context: {'table.class': type(node.table.resolve(context)).__name__}
+        )(RenderTableNode.render)
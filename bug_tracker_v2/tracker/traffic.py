@@ -0,0 +1,345 @@
+"""Capturing the production request mix and replaying it against a local database.
+
+`manage.py benchmark_views` requests every page the same number of times; production doesn't. With
+settings.TRAFFIC_CAPTURE_RATE above 0, config.middleware.TimeRequests appends that fraction of requests to
+TRAFFIC_CAPTURE_FILE, one JSON line each: the method, the url name, the url arguments, the query string and POST body,
+the role of the user on the team, the status and the latency. Nothing in it identifies a user or a team:
+
+- url arguments, which are team slugs and primary keys, are kept as keyed hashes, which tell requests for the same
+  object apart but can't be turned back into the slug or key,
+- query string and body values are kept only when they are numbers, dates, choices of the tracker's models or sort
+  orders; any other value, such as a title, a comment or a search, is kept as its length,
+- uploaded files are only counted, and the user is kept as their role.
+
+`manage.py replay_traffic` turns the captured requests back into requests against the local database, typically one
+seeded with `manage.py seed_scale`. Every captured team, project and ticket is mapped to a local one, the busiest
+first, so a ticket requested a hundred times is still one ticket requested a hundred times; each role is played by a
+local user with that role, and a developer by a developer of the project. Lengths become filler text of that length.
+The requests then run at the given concurrency, each in its own rolled back transaction, and their latencies are
+reported per view and overall, with the throughput.
+
+A replayed request can still answer differently from the captured one: the numbers kept from a body name production
+rows, so a form may not validate locally. The report counts such status mismatches.
+"""
+import functools
+import hashlib
+import hmac
+import json
+import re
+import threading
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.test import Client
+from django.urls import NoReverseMatch, reverse
+from django.utils.http import urlencode
+
+from . import loaders, models, roles, tracing
+from .benchmarks import SKIPPED, percentile
+
+# roles besides benchmarks.PERSONAS: a signed in user who isn't on the team, and nobody signed in
+USER = 'user'
+ANONYMOUS = 'anonymous'
+
+# query string parameters whose values are kept when they look like a (descending) field name
+ORDER_PARAMETERS = {'sort'}
+# form fields never captured
+DROPPED_FIELDS = {'csrfmiddlewaretoken'}
+
+_KEPT_VALUE = re.compile(r'\d+|\d{4}-\d{2}-\d{2}|on|true|false|')
+_ORDER_VALUE = re.compile(r'-?\w+')
+_FILLER = 'lorem ipsum dolor sit amet '
+
+ROLE_NAMES = {
+    models.TeamMembership.OWNER: 'owner',
+    models.TeamMembership.MANAGER: 'manager',
+    models.TeamMembership.MEMBER: 'member',
+}
+
+
+@functools.lru_cache(maxsize=1)
+def choice_values():
+    """The values of every choice of the tracker's model fields, as strings."""
+    return frozenset(
+        str(value)
+        for model in apps.get_app_config('tracker').get_models()
+        for field in model._meta.get_fields()
+        for value, _label in getattr(field, 'choices', None) or ()
+    )
+
+
+def anonymize_value(name, value):
+    """The value if it can't identify anyone, otherwise its length."""
+    if _KEPT_VALUE.fullmatch(value) or value in choice_values():
+        return value
+    if name in ORDER_PARAMETERS and _ORDER_VALUE.fullmatch(value):
+        return value
+    return len(value)
+
+
+def anonymize(data):
+    """A QueryDict as a dict of lists of anonymized values."""
+    return {
+        name: [anonymize_value(name, value) for value in values]
+        for name, values in data.lists() if name not in DROPPED_FIELDS
+    }
+
+
+def hash_argument(value):
+    """A url argument as a keyed hash: equal for equal values, and not reversible without the SECRET_KEY."""
+    return hmac.new(settings.SECRET_KEY.encode(), str(value).encode(), hashlib.sha256).hexdigest()[:12]
+
+
+def role(request):
+    """The user's role on the team of the url, from the objects the view already loaded; USER when the team wasn't."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS
+    kwargs = request.resolver_match.kwargs
+    loader = loaders.for_request(request)
+    team = loader.cached(models.Team, slug=kwargs.get('team_slug'))
+    team_role = roles.get_team_role(team, user) if team is not None else None
+    if team_role is None:
+        return USER
+    if team_role == models.TeamMembership.MEMBER:
+        project = loader.cached(models.Project, pk=kwargs.get('project_pk'))
+        ticket = loader.cached(models.Ticket, pk=kwargs.get('pk'))
+        project_id = project.pk if project is not None else getattr(ticket, 'project_id', None)
+        if project_id is not None and roles.is_project_staff(project_id, user):
+            return 'developer'
+    return ROLE_NAMES[team_role]
+
+
+def entry(request, response, milliseconds):
+    """The captured request as a dict, or None for a request that didn't resolve to a url."""
+    match = request.resolver_match
+    if match is None or not match.view_name:
+        return None
+    captured = {
+        'time': round(time.time(), 3),
+        'method': request.method,
+        'view': match.view_name,
+        'kwargs': {name: hash_argument(value) for name, value in match.kwargs.items()},
+        'query': anonymize(request.GET),
+        'role': role(request),
+        'status': response.status_code,
+        'ms': round(milliseconds, 2),
+    }
+    if request.method == 'POST':
+        captured['body'] = anonymize(request.POST)
+        captured['files'] = len(request.FILES)
+    return captured
+
+
+def capture(request, response, milliseconds):
+    """Appends the request to TRAFFIC_CAPTURE_FILE."""
+    captured = entry(request, response, milliseconds)
+    if captured is not None:
+        tracing.append_line(settings.TRAFFIC_CAPTURE_FILE, json.dumps(captured, separators=(',', ':')))
+
+
+def read(path):
+    """Yields the captured requests of a capture file."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def filler(length):
+    return (_FILLER * (length // len(_FILLER) + 1))[:length]
+
+
+def restore(data):
+    """Anonymized values back as a dict for the test client, lengths as filler text."""
+    return {
+        name: [filler(value) if isinstance(value, int) else value for value in values] for name, values in data.items()
+    }
+
+
+class LocalObjects:
+    """Maps the hashed url arguments of captured requests to local teams, projects, tickets and users. The n-th team
+    (project, ticket) seen is mapped to the local one with the n-th most tickets (comments), wrapping around."""
+
+    def __init__(self):
+        self.teams = list(models.Team.objects.annotate(ticket_total=Count('tickets')).order_by('-ticket_total', 'pk'))
+        self.candidates = {}
+        self.mapped = {}
+        self.users = {}
+
+    def _map(self, kind, scope, key, candidates):
+        if (kind, scope) not in self.candidates:
+            self.candidates[kind, scope] = candidates()
+        objects = self.candidates[kind, scope]
+        mapped = self.mapped.setdefault((kind, scope), {})
+        if key not in mapped and objects:
+            mapped[key] = objects[len(mapped) % len(objects)]
+        return mapped.get(key)
+
+    def team(self, key):
+        return self._map('team', None, key, lambda: self.teams)
+
+    def project(self, team, key):
+        return self._map('project', team.pk, key, lambda: list(team.projects.order_by(
+            'is_archived', (F('open_ticket_count') + F('closed_ticket_count')).desc(), 'pk'
+        )))
+
+    def ticket(self, team, key):
+        return self._map('ticket', team.pk, key, lambda: list(
+            team.tickets.select_related('project').order_by('-comment_count', 'pk')[:1000]
+        ))
+
+    def user(self, team, role_name, project):
+        """A local user with the role on the team; for a developer, one of the project's developers."""
+        key = (team.pk if team else None, role_name, project.pk if project else None)
+        if key not in self.users:
+            self.users[key] = self._find_user(team, role_name, project)
+        return self.users[key]
+
+    def _find_user(self, team, role_name, project):
+        if role_name == ANONYMOUS:
+            return None
+        if team is None or role_name == USER:
+            users = get_user_model().objects.order_by('pk')
+            return (users.exclude(pk__in=team.members.all()) if team is not None else users).first()
+        memberships = team.memberships.order_by('pk')
+        if role_name == 'developer':
+            developers = project.developers.all() if project is not None else ()
+            membership = memberships.filter(role=models.TeamMembership.MEMBER, user__in=developers).first()
+        else:
+            role_value = {name: value for value, name in ROLE_NAMES.items()}[role_name]
+            membership = memberships.filter(role=role_value).first()
+        return membership.user if membership is not None else None
+
+
+class Replayed:
+    """A captured request turned into a local one."""
+    __slots__ = ('view', 'method', 'path', 'data', 'user', 'status')
+
+    def __init__(self, view, method, path, data, user, status):
+        self.view, self.method, self.path, self.data, self.user, self.status = view, method, path, data, user, status
+
+
+def prepare(captured, objects):
+    """The captured requests as Replayed ones, and a Counter of the reasons others were skipped."""
+    replayed, skipped = [], Counter()
+    for request in captured:
+        if request['view'] in SKIPPED:
+            skipped['only posted to from another page'] += 1
+            continue
+        if request.get('files'):
+            skipped['uploads files'] += 1
+            continue
+        kwargs = request['kwargs']
+        team = objects.team(kwargs['team_slug']) if 'team_slug' in kwargs else None
+        values = {}
+        if team is not None:
+            values['team_slug'] = team.slug
+        project = ticket = None
+        if team is not None and 'project_pk' in kwargs:
+            project = objects.project(team, kwargs['project_pk'])
+            values['project_pk'] = project.pk if project else None
+        if team is not None and 'pk' in kwargs:
+            ticket = objects.ticket(team, kwargs['pk'])
+            values['pk'] = ticket.pk if ticket else None
+        if set(values) != set(kwargs) or None in values.values():
+            skipped['no local object for its url'] += 1
+            continue
+        user = objects.user(team, request['role'], project or (ticket.project if ticket else None))
+        if user is None and request['role'] != ANONYMOUS:
+            skipped[f"no local {request['role']}"] += 1
+            continue
+        try:
+            path = reverse(request['view'], kwargs=values)
+        except NoReverseMatch:
+            skipped['url no longer exists'] += 1
+            continue
+        data = restore(request['body'] if request['method'] == 'POST' else request['query'])
+        if request['method'] == 'POST' and request['query']:
+            path += '?' + urlencode(restore(request['query']), doseq=True)
+        replayed.append(Replayed(request['view'], request['method'], path, data, user, request['status']))
+    return replayed, skipped
+
+
+def _request(clients, replay):
+    client = clients.get(replay.user)
+    if client is None:
+        client = clients[replay.user] = Client(raise_request_exception=False)
+        if replay.user is not None:
+            client.force_login(replay.user)
+    with transaction.atomic():
+        started = time.perf_counter()
+        if replay.method == 'GET':
+            response = client.get(replay.path, replay.data)
+        elif replay.method == 'POST':
+            response = client.post(replay.path, replay.data)
+        else:
+            response = client.generic(replay.method, replay.path)
+        elapsed = time.perf_counter() - started
+        transaction.set_rollback(True)
+    return replay, response.status_code, elapsed
+
+
+def run(replayed, concurrency):
+    """Requests the Replayed requests from `concurrency` threads, each request in a rolled back transaction. Returns
+    the (Replayed, status, seconds) of every request and the seconds the whole run took.
+
+    Each thread has its own database connection and its own test client per user. A single thread is the calling one.
+    """
+    pending = iter(replayed)
+    lock = threading.Lock()
+    results = []
+
+    def worker(own_connection):
+        clients = {}
+        try:
+            while True:
+                with lock:
+                    replay = next(pending, None)
+                if replay is None:
+                    return
+                results.append(_request(clients, replay))
+        finally:
+            for client in clients.values():
+                client.logout()
+            if own_connection:
+                connection.close()
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker(own_connection=False)
+    else:
+        threads = [threading.Thread(target=worker, args=(True,)) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return results, time.perf_counter() - started
+
+
+def report(results, wall):
+    """Throughput and latency percentiles of a replay, overall and per view."""
+    def summary(latencies):
+        return {
+            'requests': len(latencies),
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        }
+
+    by_view = {}
+    for replay, _status, seconds in results:
+        by_view.setdefault(replay.view, []).append(seconds)
+    return {
+        'seconds': round(wall, 3),
+        'throughput_rps': round(len(results) / wall, 2) if wall else None,
+        **summary([seconds for _replay, _status, seconds in results]),
+        'errors': sum(1 for _replay, status, _seconds in results if status >= 500),
+        'status_mismatches': sum(1 for replay, status, _seconds in results if status != replay.status),
+        'views': {view: summary(latencies) for view, latencies in sorted(by_view.items())},
+    }
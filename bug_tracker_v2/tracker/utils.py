@@ -2,9 +2,9 @@ from django.contrib.auth.mixins import UserPassesTestMixin
 from django.contrib.auth.views import redirect_to_login
 from django.http import Http404
 from django.views import generic
-from django.shortcuts import get_object_or_404
 from django.core.exceptions import ValidationError
-from .models import Team, Ticket, Project, TeamInvitation
+from . import loaders, roles, rows, tracing
+from .pagination import CURSOR_FIELD, KeysetPaginator
 
 
 # CBV MIXINS
@@ -16,45 +16,98 @@ class CommonTemplateContextMixin:
             self.request.user.last_viewed_project_pk = project_pk
             self.request.user.save()
         if (team_slug:=self.kwargs.get('team_slug')):
-            team = get_object_or_404(Team, slug=team_slug)
+            team = loaders.for_request(self.request).team(team_slug)
             team_name = team.title
             context.setdefault('current_team', team)
             context.setdefault('team_pk', team.pk)
             context.setdefault('team_name', team_name)
             context.setdefault('team_slug', team.slug)
-        pending_invites = TeamInvitation.objects.filter(invitee=self.request.user, status=1).count()
-        context['pending_invites_count'] = pending_invites
         return context
 
 
+class KeysetPaginationMixin:
+    """Pages a SingleTableMixin view's table with tracker.pagination.KeysetPaginator instead of OFFSET paging.
+    Set estimate_count to show the planner's estimate of the total instead of running a COUNT(*)."""
+    estimate_count = False
+
+    def get_table_pagination(self, table):
+        paginate = super().get_table_pagination(table)
+        if paginate is False:
+            return paginate
+        return {
+            **paginate,
+            'paginator_class': KeysetPaginator,
+            'cursor': self.request.GET.get(CURSOR_FIELD),
+            'estimate_count': self.estimate_count,
+        }
+
+
+class TicketRowsMixin:
+    """Renders a SingleTableMixin view's ticket table from tracker.rows.TicketRow objects instead of Ticket instances,
+    so that each page of the table is a single query."""
+    def get_table_data(self):
+        return rows.ticket_rows(super().get_table_data())
+
+
+class QueryBudgetMixin:
+    """Holds requests to the view to `query_budget` queries, which tests enforce and production logs; see
+    tracker/budgets.py."""
+    query_budget = None
+
+    def dispatch(self, request, *args, **kwargs):
+        request.query_budget = (type(self).__name__, self.query_budget)
+        return super().dispatch(request, *args, **kwargs)
+
+
+class RequestObjectMixin(generic.detail.SingleObjectMixin):
+    """Fetches a team, project or ticket view's object through the request's identity map (tracker/loaders.py), so
+    that repeated get_object() calls, the permission mixins and any other view dispatched for the same request share a
+    single instance."""
+    def get_object(self, queryset=None):
+        with tracing.span('get_object', **{'code.namespace': self.model.__name__}):
+            if queryset is not None or self.model not in loaders.LINKED_MODELS:
+                return super().get_object(queryset)
+            loader = loaders.for_request(self.request)
+            instance = loader.cached(self.model, pk=self.kwargs.get(self.pk_url_kwarg), slug=self.kwargs.get(self.slug_url_kwarg))
+            if instance is None:
+                instance = loader.add(super().get_object())
+            return instance
+
 
 # Custom permission mixins
-class TeamManagerMixin(UserPassesTestMixin):
+class PermissionMixin(UserPassesTestMixin):
+    """Runs the view's test_func in a span of the request's trace (tracker/tracing.py)."""
+    def get_test_func(self):
+        test_func = super().get_test_func()
+
+        def traced():
+            with tracing.span('permission', **{'code.function': test_func.__qualname__}):
+                return test_func()
+        return traced
+
+
+class TeamManagerMixin(PermissionMixin):
     def test_func(self):
-        team = get_object_or_404(Team, slug=self.kwargs['team_slug'])
+        team = loaders.for_request(self.request).team(self.kwargs['team_slug'])
         user = self.request.user
         return user in team.managers.all() or user==team.owner or user.is_staff
 
 
-class StaffOnlyMixin(UserPassesTestMixin):
+class StaffOnlyMixin(PermissionMixin):
     def test_func(self):
         return self.request.user.is_staff
 
 
-class ViewProjectMixin(UserPassesTestMixin, generic.detail.SingleObjectMixin):
+class ViewProjectMixin(PermissionMixin, RequestObjectMixin):
     """Determines whether a user has permission to view a particular project based on whether they are staff or are assigned as that project's manager or one of its developers."""
     def get_project(self):
         return self.get_object()
 
     def test_func(self):
+        # the team is loaded first so that the project and ticket are linked to the same instance
+        team = loaders.for_request(self.request).team(self.kwargs['team_slug'])
         project = self.get_project()
-        team = get_object_or_404(Team, slug=self.kwargs['team_slug'])
-        user = self.request.user
-        if user.is_staff or user in team.get_owners():
-            return True
-        elif not user in team.members.all():
-            return False
-        return user in project.developers.all() or user == project.manager
+        return roles.can_view_project(team, project, self.request.user)
 
     def handle_no_permission(self): # raises 404 rather than 403 to obfuscate whether a project exists at that pk
         if self.raise_exception or self.request.user.is_authenticated:
@@ -92,14 +145,13 @@ class ViewTicketMixin(ViewProjectMixin):
         return redirect_to_login(self.request.get_full_path(), self.get_login_url(), self.get_redirect_field_name())
 
 
-class UpdateTicketMixin(UserPassesTestMixin):
+class UpdateTicketMixin(PermissionMixin):
     """A mixin requiring that the user is either the team's owner, the project's manager, or the ticket's assigned developer."""
     def test_func(self):
-        team = get_object_or_404(Team, slug=self.kwargs['team_slug'])
-        ticket = get_object_or_404(Ticket, pk=self.kwargs['pk'])
-        project = get_object_or_404(Project, pk=ticket.project.pk)
-        user = self.request.user
-        return user in team.get_owners() or user == project.manager or user in ticket.developer.all() or user.is_staff
+        loader = loaders.for_request(self.request)
+        team = loader.team(self.kwargs['team_slug'])
+        ticket = loader.ticket(self.kwargs['pk'])
+        return roles.can_update_ticket(team, ticket, self.request.user)
 
     def handle_no_permission(self):
         if self.raise_exception or self.request.user.is_authenticated:
@@ -107,11 +159,11 @@ class UpdateTicketMixin(UserPassesTestMixin):
         return redirect_to_login(self.request.get_full_path(), self.get_login_url(), self.get_redirect_field_name())
 
 
-class TeamOwnerMixin(UserPassesTestMixin, generic.detail.SingleObjectMixin):
+class TeamOwnerMixin(PermissionMixin, RequestObjectMixin):
     """A mixin requiring that the user is the owner of the currently selected team."""
     def test_func(self):
-        team = get_object_or_404(Team, slug=self.kwargs['team_slug'])
-        return self.request.user in team.get_owners()
+        team = loaders.for_request(self.request).team(self.kwargs['team_slug'])
+        return roles.is_team_owner(team, self.request.user)
 
     def handle_no_permission(self):
         if self.raise_exception or self.request.user.is_authenticated:
@@ -119,11 +171,11 @@ class TeamOwnerMixin(UserPassesTestMixin, generic.detail.SingleObjectMixin):
         return redirect_to_login(self.request.get_full_path(), self.get_login_url(), self.get_redirect_field_name())
 
 
-class TeamMemberMixin(UserPassesTestMixin):
+class TeamMemberMixin(PermissionMixin):
     """A mixin requiring that the user is a member of the currently selected team."""
     def test_func(self):
-        team = get_object_or_404(Team, slug=self.kwargs['team_slug'])
-        return self.request.user in team.members.all() or self.request.user.is_staff
+        team = loaders.for_request(self.request).team(self.kwargs['team_slug'])
+        return roles.is_team_member(team, self.request.user) or self.request.user.is_staff
 
     def handle_no_permission(self):
         if self.raise_exception or self.request.user.is_authenticated:
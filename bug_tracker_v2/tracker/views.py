@@ -1,15 +1,15 @@
+import hmac
 from datetime import date, timedelta
 
 from django.shortcuts import get_object_or_404, redirect
-from django.http import HttpResponseRedirect, Http404
-from django.db.models import Count, Q
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, Http404, JsonResponse
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.core.validators import validate_email
-from django.core import mail
 from django.urls import reverse_lazy, reverse
 from django.views import generic, View
 from django.template.loader import render_to_string
@@ -20,18 +20,21 @@ from .filters import TicketFilter, ProjectFilter, TicketFilterArchivedProjects
 from django_tables2.views import SingleTableMixin, SingleTableView
 from . import tables as my_tables
 
-from . import models
+from . import (counters, loaders, memory, metrics, models, notifications, outbox, profiling, roles, rows, search, sqlstats,
+               tracing)
 from .constants import NOTIFICATION_SETTING_DEFAULTS, NOTIFICATION_SETTING_DESCRIPTIONS
 from .forms import CommentForm, CloseTicketResolutionForm, ProjectForm, CreateTicketForm, UpdateTicketForm, TicketFileUploadForm
-from .utils import (CommonTemplateContextMixin, ViewTicketMixin, ViewProjectMixin,
-                    TeamOwnerMixin, TeamMemberMixin, UpdateTicketMixin, )
+from .utils import (CommonTemplateContextMixin, QueryBudgetMixin, ViewTicketMixin, ViewProjectMixin, RequestObjectMixin,
+                    TeamOwnerMixin, TeamMemberMixin, UpdateTicketMixin, KeysetPaginationMixin, TicketRowsMixin,
+                    StaffOnlyMixin, )
 
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
 ################################################################################ Team-related Views
-class TeamDetails(LoginRequiredMixin, TeamMemberMixin, CommonTemplateContextMixin, generic.DetailView):
+class TeamDetails(QueryBudgetMixin, LoginRequiredMixin, TeamMemberMixin, CommonTemplateContextMixin, RequestObjectMixin, generic.DetailView):
+    query_budget = 12
     model = models.Team
     template_name = 'tracker/team_details.html'
     context_object_name = 'team'
@@ -45,10 +48,14 @@ class TeamDetails(LoginRequiredMixin, TeamMemberMixin, CommonTemplateContextMixi
         # all_members = team.members.all()
         # non_managers = [user for user in all_members if user not in managers]
         context['non_managers'] = team.get_only_members()
+        # evaluated once; `user in team.get_owners` in the member loop ran a query per member
+        context['owners'] = list(team.get_owners())
+        context['is_owner'] = roles.is_team_owner(team, self.request.user)
         return context
 
 
-class TeamUpdateView(LoginRequiredMixin, TeamOwnerMixin, SuccessMessageMixin , CommonTemplateContextMixin, generic.UpdateView):
+class TeamUpdateView(QueryBudgetMixin, LoginRequiredMixin, TeamOwnerMixin, SuccessMessageMixin , CommonTemplateContextMixin, generic.UpdateView):
+    query_budget = 10
     model = models.Team
     fields = ['description',]
     template_name = 'tracker/team_update_form.html'
@@ -56,7 +63,8 @@ class TeamUpdateView(LoginRequiredMixin, TeamOwnerMixin, SuccessMessageMixin , C
     slug_url_kwarg = 'team_slug'
 
 
-class TeamListView(LoginRequiredMixin, CommonTemplateContextMixin, generic.ListView):
+class TeamListView(QueryBudgetMixin, LoginRequiredMixin, CommonTemplateContextMixin, generic.ListView):
+    query_budget = 9
     model = models.Team
     context_object_name = 'teams'
     template_name = 'tracker/team_list.html'
@@ -81,18 +89,22 @@ class TeamCreateView(LoginRequiredMixin, SuccessMessageMixin, CommonTemplateCont
 
     def form_valid(self, form):
         user = self.request.user
-        new_team = form.save()
-        models.TeamMembership.objects.create(team=new_team, user=user, role=3)
-        return super(TeamCreateView, self).form_valid(form)
+        form.instance.render_markdown_fields()
+        with transaction.atomic():
+            new_team = form.save()
+            models.TeamMembership.objects.create(team=new_team, user=user, role=3)
+            return super(TeamCreateView, self).form_valid(form)
 
 
-class ManageTeamOwnershipWarning(LoginRequiredMixin, TeamOwnerMixin, CommonTemplateContextMixin, generic.DetailView):
+class ManageTeamOwnershipWarning(QueryBudgetMixin, LoginRequiredMixin, TeamOwnerMixin, CommonTemplateContextMixin, generic.DetailView):
+    query_budget = 10
     template_name = 'tracker/add_team_owner_warning.html'
     model = models.Team
     slug_url_kwarg = 'team_slug'
 
 
-class ManageTeamOwnership(LoginRequiredMixin, TeamOwnerMixin, CommonTemplateContextMixin, generic.DetailView):
+class ManageTeamOwnership(QueryBudgetMixin, LoginRequiredMixin, TeamOwnerMixin, CommonTemplateContextMixin, generic.DetailView):
+    query_budget = 13
     template_name = 'tracker/manage_team_ownership.html'
     context_object_name = 'members'
     model = models.Team
@@ -113,24 +125,25 @@ class ManageTeamOwnership(LoginRequiredMixin, TeamOwnerMixin, CommonTemplateCont
 class TeamAddOwner(LoginRequiredMixin, TeamOwnerMixin, CommonTemplateContextMixin, generic.View):
     def get(self, request, *args, **kwargs):
         team_slug = self.kwargs['team_slug']
-        team = models.Team.objects.get(slug=team_slug)
+        team = loaders.for_request(self.request).team(team_slug)
         username = self.request.GET.get('username')
         try:
             user = User.objects.get(username=username)
             if user in team.members.all() or user in team.get_only_members():
-                team.add_owner(user)
-                messages.success(request, f'{username} added as a co-owner.')
-                notification_setting = user.notification_settings.get(
-                    'team_role_assignment', NOTIFICATION_SETTING_DEFAULTS.get('team_role_assignment', True)
-                )
-                if user.email and notification_setting:
-                    body = render_to_string('emails/added_as_team_owner.txt', {'team_title': team.title})
-                    mail.send_mail(
-                        subject=f'Added as co-owner of team {team.title}',
-                        message=body,
-                        from_email='noreply@monksbugtracker.com',
-                        recipient_list=[user.email]
+                with transaction.atomic():
+                    team.add_owner(user)
+                    notification_setting = user.notification_settings.get(
+                        'team_role_assignment', NOTIFICATION_SETTING_DEFAULTS.get('team_role_assignment', True)
                     )
+                    if user.email and notification_setting:
+                        body = render_to_string('emails/added_as_team_owner.txt', {'team_title': team.title})
+                        outbox.send_mail(
+                            subject=f'Added as co-owner of team {team.title}',
+                            message=body,
+                            from_email='noreply@monksbugtracker.com',
+                            recipient_list=[user.email]
+                        )
+                messages.success(request, f'{username} added as a co-owner.')
             else:
                 messages.warning(request, 'Cannot make co-owner. User either does not exist or is not a member of your team.')
         except ObjectDoesNotExist:
@@ -141,21 +154,23 @@ class TeamAddOwner(LoginRequiredMixin, TeamOwnerMixin, CommonTemplateContextMixi
 class TeamRemoveOwner(LoginRequiredMixin, TeamOwnerMixin, CommonTemplateContextMixin, generic.View):
     def get(self, request, *args, **kwargs):
         team_slug = self.kwargs['team_slug']
-        team = models.Team.objects.get(slug=team_slug)
+        team = loaders.for_request(self.request).team(team_slug)
         user = self.request.user
-        if team.remove_owner(user):
-            messages.success(request, f'You are no longer an owner of team {team.title}.')
+        with transaction.atomic():
+            removed = team.remove_owner(user)
             notification_setting = user.notification_settings.get(
                 'team_role_assignment', NOTIFICATION_SETTING_DEFAULTS.get('team_role_assignment', True)
             )
-            if user.email and notification_setting:
+            if removed and user.email and notification_setting:
                 body = render_to_string('emails/removed_as_team_owner.txt', {'team_title': team.title})
-                mail.send_mail(
+                outbox.send_mail(
                     subject=f'No longer an owner of team {team.title}',
                     message=body,
                     from_email='noreply@monksbugtracker.com',
                     recipient_list=[user.email]
                 )
+        if removed:
+            messages.success(request, f'You are no longer an owner of team {team.title}.')
             return HttpResponseRedirect(reverse('team_details', kwargs={'team_slug': team_slug}))
         else:
             messages.warning(request, 'You cannot step down as team owner until you promote a new member as co-owner.')
@@ -165,24 +180,25 @@ class TeamRemoveOwner(LoginRequiredMixin, TeamOwnerMixin, CommonTemplateContextM
 class TeamAddManager(LoginRequiredMixin, TeamOwnerMixin, CommonTemplateContextMixin, generic.View):
     def get(self, request, *args, **kwargs):
         team_slug = self.kwargs['team_slug']
-        team = models.Team.objects.get(slug=team_slug)
+        team = loaders.for_request(self.request).team(team_slug)
         username = self.request.GET.get('username')
         try:
             user = User.objects.get(username=username)
             if user in team.members.all():
-                team.add_manager(user)
-                messages.success(request, f'{username} added as manager.')
-                notification_setting = user.notification_settings.get(
-                    'team_role_assignment', NOTIFICATION_SETTING_DEFAULTS.get('team_role_assignment', True)
-                )
-                if user.email and notification_setting:
-                    body = render_to_string('emails/added_as_team_manager.txt', {'team_title': team.title})
-                    mail.send_mail(
-                        subject=f'Added as manager to team {team.title}',
-                        message=body,
-                        from_email='noreply@monksbugtracker.com',
-                        recipient_list=[user.email]
+                with transaction.atomic():
+                    team.add_manager(user)
+                    notification_setting = user.notification_settings.get(
+                        'team_role_assignment', NOTIFICATION_SETTING_DEFAULTS.get('team_role_assignment', True)
                     )
+                    if user.email and notification_setting:
+                        body = render_to_string('emails/added_as_team_manager.txt', {'team_title': team.title})
+                        outbox.send_mail(
+                            subject=f'Added as manager to team {team.title}',
+                            message=body,
+                            from_email='noreply@monksbugtracker.com',
+                            recipient_list=[user.email]
+                        )
+                messages.success(request, f'{username} added as manager.')
             else:
                 messages.warning(request, 'Cannot make manager. User either does not exist or is not a member of your team.')
         except ObjectDoesNotExist:
@@ -193,24 +209,25 @@ class TeamAddManager(LoginRequiredMixin, TeamOwnerMixin, CommonTemplateContextMi
 class TeamRemoveManager(LoginRequiredMixin, TeamOwnerMixin, CommonTemplateContextMixin, generic.View):
     def get(self, request, *args, **kwargs):
         team_slug = self.kwargs['team_slug']
-        team = models.Team.objects.get(slug=team_slug)
+        team = loaders.for_request(self.request).team(team_slug)
         username = self.request.GET.get('username')
         try:
             user = User.objects.get(username=username)
             if user in team.get_managers():
-                team.remove_manager(user)
-                messages.success(request, f'{username} is no longer a team manager.')
-                notification_setting = user.notification_settings.get(
-                    'team_role_assignment', NOTIFICATION_SETTING_DEFAULTS.get('team_role_assignment', True)
-                )
-                if user.email and notification_setting:
-                    body = render_to_string('emails/removed_as_team_manager.txt', {'team_title': team.title})
-                    mail.send_mail(
-                        subject=f'Removed from managers to team {team.title}',
-                        message=body,
-                        from_email='noreply@monksbugtracker.com',
-                        recipient_list=[user.email]
+                with transaction.atomic():
+                    team.remove_manager(user)
+                    notification_setting = user.notification_settings.get(
+                        'team_role_assignment', NOTIFICATION_SETTING_DEFAULTS.get('team_role_assignment', True)
                     )
+                    if user.email and notification_setting:
+                        body = render_to_string('emails/removed_as_team_manager.txt', {'team_title': team.title})
+                        outbox.send_mail(
+                            subject=f'Removed from managers to team {team.title}',
+                            message=body,
+                            from_email='noreply@monksbugtracker.com',
+                            recipient_list=[user.email]
+                        )
+                messages.success(request, f'{username} is no longer a team manager.')
             else:
                 messages.warning(request, 'Cannot remove manager. User either does not exist or is not a manager of your team.')
         except ObjectDoesNotExist:
@@ -221,24 +238,25 @@ class TeamRemoveManager(LoginRequiredMixin, TeamOwnerMixin, CommonTemplateContex
 class TeamRemoveMember(LoginRequiredMixin, TeamOwnerMixin, CommonTemplateContextMixin, generic.View):
     def get(self, request, *args, **kwargs):
         team_slug = self.kwargs['team_slug']
-        team = models.Team.objects.get(slug=team_slug)
+        team = loaders.for_request(self.request).team(team_slug)
         username = self.request.GET.get('username')
         try:
             user = User.objects.get(username=username)
             if user in team.members.all():
-                team.remove_member(user)
-                messages.success(request, f'{username} removed from team.')
-                notification_setting = user.notification_settings.get(
-                    'team_role_assignment', NOTIFICATION_SETTING_DEFAULTS.get('team_role_assignment', True)
-                )
-                if user.email and notification_setting:
-                    body = render_to_string('emails/removed_as_team_member.txt', {'team_title': team.title})
-                    mail.send_mail(
-                        subject=f'Removed from team {team.title}',
-                        message=body,
-                        from_email='noreply@monksbugtracker.com',
-                        recipient_list=[user.email]
+                with transaction.atomic():
+                    team.remove_member(user)
+                    notification_setting = user.notification_settings.get(
+                        'team_role_assignment', NOTIFICATION_SETTING_DEFAULTS.get('team_role_assignment', True)
                     )
+                    if user.email and notification_setting:
+                        body = render_to_string('emails/removed_as_team_member.txt', {'team_title': team.title})
+                        outbox.send_mail(
+                            subject=f'Removed from team {team.title}',
+                            message=body,
+                            from_email='noreply@monksbugtracker.com',
+                            recipient_list=[user.email]
+                        )
+                messages.success(request, f'{username} removed from team.')
             else:
                 messages.warning(request,
                                  'Cannot remove member. User either does not exist or is not a member of your team.')
@@ -250,22 +268,23 @@ class TeamRemoveMember(LoginRequiredMixin, TeamOwnerMixin, CommonTemplateContext
 class LeaveTeam(LoginRequiredMixin, TeamMemberMixin, CommonTemplateContextMixin, generic.View):
     def get(self, request, *args, **kwargs):
         team_slug = self.kwargs['team_slug']
-        team = models.Team.objects.get(slug=team_slug)
+        team = loaders.for_request(self.request).team(team_slug)
         user = self.request.user
         if user not in team.get_owners():
-            team.remove_member(user)
-            messages.success(request, f'You have left team {team.title}.')
-            notification_setting = user.notification_settings.get(
-                'team_role_assignment', NOTIFICATION_SETTING_DEFAULTS.get('team_role_assignment', True)
-            )
-            if user.email and notification_setting:
-                body = render_to_string('emails/left_team.txt', {'team_title': team.title})
-                mail.send_mail(
-                    subject=f'Left team {team.title}',
-                    message=body,
-                    from_email='noreply@monksbugtracker.com',
-                    recipient_list=[user.email]
+            with transaction.atomic():
+                team.remove_member(user)
+                notification_setting = user.notification_settings.get(
+                    'team_role_assignment', NOTIFICATION_SETTING_DEFAULTS.get('team_role_assignment', True)
                 )
+                if user.email and notification_setting:
+                    body = render_to_string('emails/left_team.txt', {'team_title': team.title})
+                    outbox.send_mail(
+                        subject=f'Left team {team.title}',
+                        message=body,
+                        from_email='noreply@monksbugtracker.com',
+                        recipient_list=[user.email]
+                    )
+            messages.success(request, f'You have left team {team.title}.')
             return redirect(reverse_lazy('team_list'))
         else:
             messages.warning(request, 'You cannot leave a team you own. Step down as owner first.')
@@ -284,10 +303,11 @@ class AcceptTeamInvitation(LoginRequiredMixin, generic.TemplateView):
                     messages.warning(request, 'That invitation is no longer valid.')
                     return HttpResponseRedirect(reverse('accept_team_invitation'))
                 team = invitation.team
-                team.members.add(request.user)
-                team.save()
-                invitation.status = invitation.ACCEPTED
-                invitation.save()
+                with transaction.atomic():
+                    team.members.add(request.user)
+                    team.save()
+                    invitation.status = invitation.ACCEPTED
+                    invitation.save()
                 messages.success(request, 'Invitation accepted.')
                 return HttpResponseRedirect(reverse('tracker:team_details', kwargs={'team_slug': team.slug}))
             except (ValidationError, ObjectDoesNotExist):
@@ -321,16 +341,17 @@ class DeclineTeamInvitation(LoginRequiredMixin, generic.View):
             return HttpResponseRedirect(reverse('pending_invitations'))
 
 
-class SendTeamInvitation(LoginRequiredMixin, TeamOwnerMixin, generic.TemplateView):
+class SendTeamInvitation(QueryBudgetMixin, LoginRequiredMixin, TeamOwnerMixin, generic.TemplateView):
+    query_budget = 10
     template_name = 'tracker/send_team_invitation.html'
 
     def get_context_data(self, **kwargs):
-        team = get_object_or_404(models.Team, slug=self.kwargs['team_slug'])
+        team = loaders.for_request(self.request).team(self.kwargs['team_slug'])
         return {'team_slug': self.kwargs['team_slug'], 'team_name': team.title}
 
     def post(self, request, *args, **kwargs):
         team_slug = self.kwargs['team_slug']
-        team = get_object_or_404(models.Team, slug=team_slug)
+        team = loaders.for_request(self.request).team(team_slug)
         email = ''
         if (invitee:=request.POST.get('invitee')):
             if '@' not in invitee:
@@ -358,27 +379,28 @@ class SendTeamInvitation(LoginRequiredMixin, TeamOwnerMixin, generic.TemplateVie
                 except ValidationError:
                     messages.warning(request, 'Please enter a valid email address.')
                     return HttpResponseRedirect(reverse('team_invite', kwargs={'team_slug': team_slug}))
-            new_invitation = models.TeamInvitation.objects.create(team=team, invitee_email=email, invitee=user)
-            new_invitation.save()
             try:
                 notification_setting = user.notification_settings.get(
                     'team_invites', NOTIFICATION_SETTING_DEFAULTS.get('team_invites', True)
                 )
             except AttributeError:
                 notification_setting = True
-            if notification_setting:
-                new_invitation.send_email(
-                    inviter=self.request.user.username,
-                    team=team.title,
-                    invitation_uuid=new_invitation.id
-                )
+            with transaction.atomic():
+                new_invitation = models.TeamInvitation.objects.create(team=team, invitee_email=email, invitee=user)
+                if notification_setting:
+                    new_invitation.send_email(
+                        inviter=self.request.user.username,
+                        team=team.title,
+                        invitation_uuid=new_invitation.id
+                    )
             messages.success(request, 'Invitation sent.')
             return HttpResponseRedirect(reverse('team_invite', kwargs={'team_slug': team_slug}))
         else:
             return HttpResponseRedirect(reverse('team_invite', kwargs={'team_slug': team_slug}))
 
 
-class InvitationsListView(LoginRequiredMixin, generic.ListView):
+class InvitationsListView(QueryBudgetMixin, LoginRequiredMixin, generic.ListView):
+    query_budget = 10
     model = models.TeamInvitation
     template_name = 'tracker/team_invitation_list.html'
     context_object_name = 'invites'
@@ -387,7 +409,8 @@ class InvitationsListView(LoginRequiredMixin, generic.ListView):
         return models.TeamInvitation.objects.filter(invitee=self.request.user, status=1).order_by('created_on')
 
 
-class ManageSubscriptions(LoginRequiredMixin, SingleTableView):
+class ManageSubscriptions(QueryBudgetMixin, LoginRequiredMixin, KeysetPaginationMixin, TicketRowsMixin, SingleTableView):
+    query_budget = 9
     table_class = my_tables.SubscriptionsTable
     context_object_name = 'ticket'
     template_name = 'tracker/manage_subscriptions.html'
@@ -404,10 +427,11 @@ class ManageSubscriptions(LoginRequiredMixin, SingleTableView):
         return context
 
     def get_queryset(self):
-        return self.request.user.ticket_subscriptions.filter(status='open', project__is_archived=False).select_related('team')
+        return self.request.user.ticket_subscriptions.filter(status='open', project__is_archived=False)
 
 
-class ManageNotificationSettings(LoginRequiredMixin, generic.TemplateView):
+class ManageNotificationSettings(QueryBudgetMixin, LoginRequiredMixin, generic.TemplateView):
+    query_budget = 7
     template_name = 'tracker/notification_settings.html'
 
     def get_setting(self, setting):
@@ -467,12 +491,14 @@ class DisableNotificationSetting(LoginRequiredMixin, generic.View):
 
 
 ################################################################################ Ticket Displaying Views
-class TicketTable(LoginRequiredMixin, CommonTemplateContextMixin, TeamMemberMixin, SingleTableMixin, FilterView):
+class TicketTable(QueryBudgetMixin, LoginRequiredMixin, CommonTemplateContextMixin, TeamMemberMixin, KeysetPaginationMixin, TicketRowsMixin, SingleTableMixin, FilterView):
+    query_budget = 15
     table_class = my_tables.TicketTable
     template_name = 'tracker/ticket_list.html'
     filterset_class = TicketFilter
     context_object_name = 'page'
     table_pagination = {"per_page": 10}
+    estimate_count = True
     PAGE_TITLE = 'Open Tickets'
     TICKET_STATUS_TOGGLE = 'Show Closed Tickets'
     TICKET_STATUS_TOGGLE_URL = 'tracker:closed_ticket_list'
@@ -488,8 +514,18 @@ class TicketTable(LoginRequiredMixin, CommonTemplateContextMixin, TeamMemberMixi
         context['no_tickets_message'] = self.NO_TICKETS_MESSAGE
         return context
 
+    def get_table_kwargs(self):
+        if self.request.GET.get('title') and 'sort' not in self.request.GET:
+            return {'order_by': ()}  # keep the search ranking until a column is sorted
+        return {}
+
+    def get_visible_tickets(self):
+        """The team's tickets the user can see."""
+        team = loaders.for_request(self.request).team(self.kwargs['team_slug'])
+        return models.Ticket.objects.filter_for_team_and_user(team_slug=team.slug, user=self.request.user, team=team)
+
     def get_queryset(self):
-        return models.Ticket.objects.filter_for_team_and_user(team_slug=self.kwargs['team_slug'], user=self.request.user).exclude(status='closed').distinct().select_related('project').prefetch_related('developer').select_related('user')
+        return self.get_visible_tickets().filter(status=models.Ticket.OPEN)
 
 
 class AssignedTicketTable(TicketTable): # removed DeveloperMixin
@@ -500,7 +536,7 @@ class AssignedTicketTable(TicketTable): # removed DeveloperMixin
     NO_TICKETS_MESSAGE = 'There are no open tickets assigned to you.'
 
     def get_queryset(self):
-        return models.Ticket.objects.filter_for_team_and_user(team_slug=self.kwargs['team_slug'], user=self.request.user).filter(developer=self.request.user).exclude(status='closed').distinct().select_related('project').prefetch_related('developer').select_related('user')
+        return self.get_visible_tickets().filter(developer=self.request.user).filter(status=models.Ticket.OPEN)
 
 
 class ClosedTicketTable(TicketTable):
@@ -511,7 +547,7 @@ class ClosedTicketTable(TicketTable):
     NO_TICKETS_MESSAGE = 'There are no closed tickets.'
 
     def get_queryset(self):
-        return models.Ticket.objects.filter_for_team_and_user(team_slug=self.kwargs['team_slug'], user=self.request.user).filter(status='closed').distinct().select_related('project').prefetch_related('developer').select_related('user')
+        return self.get_visible_tickets().filter(status='closed')
 
 
 class ClosedAssignedTicketTable(TicketTable): # removed DeveloperMixin
@@ -523,11 +559,12 @@ class ClosedAssignedTicketTable(TicketTable): # removed DeveloperMixin
     NO_TICKETS_MESSAGE = 'There are no closed tickets assigned to you.'
 
     def get_queryset(self):
-        return models.Ticket.objects.filter_for_team_and_user(team_slug=self.kwargs['team_slug'], user=self.request.user).filter(developer=self.request.user).filter(status='closed').distinct().select_related('project').prefetch_related('developer').select_related('user')
+        return self.get_visible_tickets().filter(developer=self.request.user).filter(status='closed')
 
 
 ################################################################################ Project Displaying Views
-class ProjectTable(LoginRequiredMixin, CommonTemplateContextMixin, TeamMemberMixin, SingleTableMixin, FilterView):
+class ProjectTable(QueryBudgetMixin, LoginRequiredMixin, CommonTemplateContextMixin, TeamMemberMixin, KeysetPaginationMixin, SingleTableMixin, FilterView):
+    query_budget = 14
     table_class = my_tables.ProjectTable
     table_pagination = {"per_page": 10}
     model = models.Project
@@ -537,14 +574,18 @@ class ProjectTable(LoginRequiredMixin, CommonTemplateContextMixin, TeamMemberMix
     ARCHIVED_VIEW_TOGGLE = 'View archived projects.'
     ARCHIVED_VIEW_TOGGLE_URL = 'tracker:archived_project_list'
 
+    def get_visible_projects(self):
+        """The team's projects the user can see, sharing the request's team instance."""
+        loader = loaders.for_request(self.request)
+        team = loader.team(self.kwargs['team_slug'])
+        return loader.share(models.Project.objects.filter_for_team_and_user(team_slug=team.slug, user=self.request.user, team=team))
+
     def get_queryset(self):
-        user = self.request.user
-        team_slug=self.kwargs['team_slug']
-        return models.Project.objects.filter_for_team_and_user(team_slug=team_slug, user=user).filter(is_archived=False).annotate(open_tickets=Count('project_tickets', filter=~Q(project_tickets__status='closed'))).select_related('manager')
+        return self.get_visible_projects().filter(is_archived=False).select_related('manager')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['project_count'] = models.Project.objects.filter_for_team_and_user(team_slug=self.kwargs['team_slug'], user=self.request.user).filter(is_archived=False).count()
+        context['project_count'] = self.get_visible_projects().filter(is_archived=False).count()
         context['empty_project_message'] = self.EMPTY_PROJECT_MESSAGE
         context['archived_view_toggle'] = self.ARCHIVED_VIEW_TOGGLE
         context['archived_view_toggle_url'] = self.ARCHIVED_VIEW_TOGGLE_URL
@@ -562,17 +603,16 @@ class ArchivedProjectTable(ProjectTable):
         return models.Project.objects.filter(is_archived=True).count()
 
     def get_queryset(self):
-        user = self.request.user
-        team_slug=self.kwargs['team_slug']
-        return models.Project.objects.filter_for_team_and_user(team_slug=team_slug, user=user).filter(is_archived=True).annotate(open_tickets=Count('project_tickets', filter=~Q(project_tickets__status='closed'))).select_related('manager')
+        return self.get_visible_projects().filter(is_archived=True).select_related('manager')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['project_count'] = models.Project.objects.filter_for_team_and_user(team_slug=self.kwargs['team_slug'], user=self.request.user).filter(is_archived=True).count()
+        context['project_count'] = self.get_visible_projects().filter(is_archived=True).count()
         return context
 
 
-class ProjectDetails(LoginRequiredMixin, ViewProjectMixin, TeamMemberMixin, CommonTemplateContextMixin, SingleTableMixin, generic.DetailView):
+class ProjectDetails(QueryBudgetMixin, LoginRequiredMixin, ViewProjectMixin, TeamMemberMixin, CommonTemplateContextMixin, KeysetPaginationMixin, SingleTableMixin, generic.DetailView):
+    query_budget = 19
     model = models.Project
     table_class = my_tables.TicketTable
     template_name = 'tracker/project_details.html'
@@ -589,17 +629,20 @@ class ProjectDetails(LoginRequiredMixin, ViewProjectMixin, TeamMemberMixin, Comm
         return qs.prefetch_related('developers')
 
     def get_table_data(self):
-        table_data = self.object.project_tickets.exclude(status='closed').select_related('user').prefetch_related('developer')
+        table_data = self.object.project_tickets.filter(status=models.Ticket.OPEN)
         if (q := self.request.GET.get('q')):
-            return table_data.filter(title__icontains=q)
-        return table_data
+            table_data = search.search_tickets(table_data, q)
+        return rows.ticket_rows(table_data)
 
     def get_table_kwargs(self):
-        return {'exclude': 'project'}
+        kwargs = {'exclude': 'project'}
+        if self.request.GET.get('q') and 'sort' not in self.request.GET:
+            kwargs['order_by'] = ()  # keep the search ranking until a column is sorted
+        return kwargs
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['ticket_counter'] = self.object.project_tickets.exclude(status='closed').count()
+        context['ticket_counter'] = self.object.open_ticket_count
         context['ticket_table_title'] = self.TICKET_TABLE_TITLE
         context['ticket_status_toggle_url'] = self.TICKET_STATUS_TOGGLE_URL
         context['ticket_status_toggle'] = self.TICKET_STATUS_TOGGLE
@@ -618,14 +661,14 @@ class ProjectDetailsClosedTickets(ProjectDetails):
     EMPTY_TICKET_MESSAGE = 'There are no closed tickets.'
 
     def get_table_data(self):
-        table_data = self.object.project_tickets.filter(status='closed').select_related('user').prefetch_related('developer')
+        table_data = self.object.project_tickets.filter(status='closed')
         if (q := self.request.GET.get('q')):
-            return table_data.filter(title__icontains=q)
-        return table_data
+            table_data = search.search_tickets(table_data, q)
+        return rows.ticket_rows(table_data)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['ticket_counter'] = self.object.project_tickets.filter(status='closed').count()
+        context['ticket_counter'] = self.object.closed_ticket_count
         return context
 
 
@@ -635,10 +678,11 @@ class ProjectSubscribeAllTicketsView(LoginRequiredMixin, ViewProjectMixin, Commo
 
     def get(self, request, *args, **kwargs):
         project = self.get_object()
-        project.subscribers.add(self.request.user)
-        tickets = project.project_tickets.filter(status='open')
-        for ticket in tickets:
-            ticket.subscribers.add(self.request.user)
+        with transaction.atomic():
+            project.subscribers.add(self.request.user)
+            tickets = project.project_tickets.filter(status='open')
+            for ticket in tickets:
+                ticket.subscribers.add(self.request.user)
         messages.success(request, 'Successfully subscribed to project.')
         return HttpResponseRedirect(reverse('tracker:project_details', kwargs={'team_slug': project.team.slug, 'project_pk': project.pk}))
 
@@ -649,16 +693,18 @@ class ProjectUnsubscribeAllTicketsView(LoginRequiredMixin, ViewProjectMixin, Com
 
     def get(self, request, *args, **kwargs):
         project = self.get_object()
-        project.subscribers.remove(self.request.user)
-        tickets = project.project_tickets.filter(status='open')
-        for ticket in tickets:
-            ticket.subscribers.remove(self.request.user)
+        with transaction.atomic():
+            project.subscribers.remove(self.request.user)
+            tickets = project.project_tickets.filter(status='open')
+            for ticket in tickets:
+                ticket.subscribers.remove(self.request.user)
         messages.success(request, 'Successfully unsubscribed from project.')
         return HttpResponseRedirect(reverse('tracker:project_details', kwargs={'team_slug': project.team.slug, 'project_pk': project.pk}))
 
 
 ############################################################################################# Ticket CRUD Views
-class UpdateTicket(LoginRequiredMixin, UpdateTicketMixin, SuccessMessageMixin, CommonTemplateContextMixin, generic.edit.UpdateView):
+class UpdateTicket(QueryBudgetMixin, LoginRequiredMixin, UpdateTicketMixin, SuccessMessageMixin, CommonTemplateContextMixin, RequestObjectMixin, generic.edit.UpdateView):
+    query_budget = 16
     model = models.Ticket
     # fields = ['title', 'description', 'developer', 'priority', 'resolution']
     template_name = 'tracker/ticket_update.html'
@@ -670,8 +716,15 @@ class UpdateTicket(LoginRequiredMixin, UpdateTicketMixin, SuccessMessageMixin, C
         kwargs['project_pk'] = self.get_object().project.pk
         return kwargs
 
+    def form_valid(self, form):
+        form.instance.render_markdown_fields()
+        with transaction.atomic():
+            counters.lock_counted_state(form.instance)
+            return super().form_valid(form)
 
-class CreateTicket(LoginRequiredMixin, SuccessMessageMixin, CommonTemplateContextMixin, generic.edit.CreateView):
+
+class CreateTicket(QueryBudgetMixin, LoginRequiredMixin, SuccessMessageMixin, CommonTemplateContextMixin, generic.edit.CreateView):
+    query_budget = 13
     model = models.Ticket
     template_name = 'tracker/create_ticket.html'
     success_url = 'tracker/'
@@ -685,8 +738,8 @@ class CreateTicket(LoginRequiredMixin, SuccessMessageMixin, CommonTemplateContex
 
     def get(self, request, *args, **kwargs):
         if (project_pk := self.request.GET.get('project')):
-            project = get_object_or_404(models.Project, pk=project_pk)
-            team = get_object_or_404(models.Team, slug=self.kwargs['team_slug'])
+            project = loaders.for_request(self.request).project(project_pk)
+            team = loaders.for_request(self.request).team(self.kwargs['team_slug'])
             user = self.request.user
             if not (user in team.get_owners() or user == project.manager or user in project.developers.all() or user.is_staff):
                 raise Http404
@@ -696,8 +749,8 @@ class CreateTicket(LoginRequiredMixin, SuccessMessageMixin, CommonTemplateContex
 
     def post(self, request, *args, **kwargs):
         if (project_pk := self.request.GET.get('project')):
-            project = get_object_or_404(models.Project, pk=project_pk)
-            team = get_object_or_404(models.Team, slug=self.kwargs['team_slug'])
+            project = loaders.for_request(self.request).project(project_pk)
+            team = loaders.for_request(self.request).team(self.kwargs['team_slug'])
             user = self.request.user
             if not (user in team.get_owners() or user == project.manager or user in project.developers.all() or user.is_staff):
                 raise Http404
@@ -709,12 +762,14 @@ class CreateTicket(LoginRequiredMixin, SuccessMessageMixin, CommonTemplateContex
         user = self.request.user
         form.instance.user = user
         if (project_pk := self.request.GET.get('project')):
-            project = get_object_or_404(models.Project, pk=project_pk)
+            project = loaders.for_request(self.request).project(project_pk)
             form.instance.project = project
             form.instance.team = project.team
         else:
             raise Http404
-        return super(CreateTicket, self).form_valid(form)
+        form.instance.render_markdown_fields()
+        with transaction.atomic():
+            return super(CreateTicket, self).form_valid(form)
 
     def get_success_url(self):
         return reverse_lazy('tracker:project_details', kwargs={
@@ -731,7 +786,7 @@ class TicketFileUploadView(LoginRequiredMixin, UpdateTicketMixin, SuccessMessage
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         ticket_pk = self.kwargs.get('pk')
-        project = get_object_or_404(models.Ticket, pk=ticket_pk).project
+        project = loaders.for_request(self.request).ticket(ticket_pk).project
         context['project_pk'] = project.pk
         return context
 
@@ -743,10 +798,18 @@ class TicketFileUploadView(LoginRequiredMixin, UpdateTicketMixin, SuccessMessage
         try:
             user = self.request.user
             ticket_pk = self.kwargs.get('pk')
-            ticket = get_object_or_404(models.Ticket, pk=ticket_pk)
+            ticket = loaders.for_request(self.request).ticket(ticket_pk)
             form.instance.uploaded_by = user
             form.instance.ticket = ticket
-            return super().form_valid(form)
+            # stored before the transaction rather than by the model's save inside it
+            upload = form.instance.file
+            upload.save(upload.name, upload.file, save=False)
+            try:
+                with transaction.atomic():
+                    return super().form_valid(form)
+            except IntegrityError:
+                upload.delete(save=False)
+                raise
         except IntegrityError:
             messages.warning(self.request, 'A file upload with that title already exists for this ticket. Please choose a different title.')
             return HttpResponseRedirect(reverse('tracker:ticket_details', kwargs={'team_slug': self.kwargs['team_slug'], 'pk': self.kwargs['pk']}))
@@ -757,7 +820,8 @@ class TicketFileUploadView(LoginRequiredMixin, UpdateTicketMixin, SuccessMessage
 
 
 ############################################################################################## Project CRUD Views
-class CreateProject(LoginRequiredMixin, TeamOwnerMixin, SuccessMessageMixin, CommonTemplateContextMixin, generic.edit.CreateView):
+class CreateProject(QueryBudgetMixin, LoginRequiredMixin, TeamOwnerMixin, SuccessMessageMixin, CommonTemplateContextMixin, generic.edit.CreateView):
+    query_budget = 11
     model = models.Project
     template_name = 'tracker/create_or_update_project.html'
     success_message = '%(title)s created.'
@@ -775,24 +839,27 @@ class CreateProject(LoginRequiredMixin, TeamOwnerMixin, SuccessMessageMixin, Com
 
     def form_valid(self, form):
         team_slug = self.kwargs.get('team_slug')
-        team = get_object_or_404(models.Team, slug=team_slug)
+        team = loaders.for_request(self.request).team(team_slug)
         form.instance.team = team
-        if (manager:=form.instance.manager):
-            notification_setting = manager.notification_settings.get(
-                'project_role_assignment', NOTIFICATION_SETTING_DEFAULTS.get('project_role_assignment', True)
-            )
-            if manager.email and notification_setting:
-                body = render_to_string('emails/added_as_project_manager.txt', {'project_title': form.instance.title})
-                mail.send_mail(
-                    subject=f'Assigned as manager of {form.instance.title}',
-                    message=body,
-                    from_email='noreply@monksbugtracker.com',
-                    recipient_list=[manager.email]
+        form.instance.render_markdown_fields()
+        with transaction.atomic():
+            if (manager:=form.instance.manager):
+                notification_setting = manager.notification_settings.get(
+                    'project_role_assignment', NOTIFICATION_SETTING_DEFAULTS.get('project_role_assignment', True)
                 )
-        return super(CreateProject, self).form_valid(form)
+                if manager.email and notification_setting:
+                    body = render_to_string('emails/added_as_project_manager.txt', {'project_title': form.instance.title})
+                    outbox.send_mail(
+                        subject=f'Assigned as manager of {form.instance.title}',
+                        message=body,
+                        from_email='noreply@monksbugtracker.com',
+                        recipient_list=[manager.email]
+                    )
+            return super(CreateProject, self).form_valid(form)
 
 
-class UpdateProject(LoginRequiredMixin, TeamOwnerMixin, ViewProjectMixin, SuccessMessageMixin, CommonTemplateContextMixin, generic.edit.UpdateView):
+class UpdateProject(QueryBudgetMixin, LoginRequiredMixin, TeamOwnerMixin, ViewProjectMixin, SuccessMessageMixin, CommonTemplateContextMixin, generic.edit.UpdateView):
+    query_budget = 13
     model = models.Project
     template_name = 'tracker/create_or_update_project.html'
     success_message = '%(title)s project updated.'
@@ -809,6 +876,11 @@ class UpdateProject(LoginRequiredMixin, TeamOwnerMixin, ViewProjectMixin, Succes
         context['create_or_update'] = 'Update'
         return context
 
+    def form_valid(self, form):
+        form.instance.render_markdown_fields()
+        with transaction.atomic():
+            return super().form_valid(form)
+
     def post(self, request, *args, **kwargs):
         project = self.get_object()
         if (manager_id_from_form := request.POST.get('manager')):
@@ -819,7 +891,7 @@ class UpdateProject(LoginRequiredMixin, TeamOwnerMixin, ViewProjectMixin, Succes
                 )
                 if new_manager.email and notification_setting:
                     body = render_to_string('emails/added_as_project_manager.txt', {'project_title': project.title})
-                    mail.send_mail(
+                    outbox.send_mail(
                         subject=f'Assigned as manager of {project.title}',
                         message=body,
                         from_email='noreply@monksbugtracker.com',
@@ -837,11 +909,13 @@ class ToggleArchiveProject(LoginRequiredMixin, TeamOwnerMixin, ViewProjectMixin,
         self.object.is_archived = not self.object.is_archived
         success_message = 'archived.' if self.object.is_archived else 'reopened.'
         messages.info(request, f'{self.object.title} project {success_message}')
-        self.object.save()
+        with transaction.atomic():
+            self.object.save()
         return HttpResponseRedirect(reverse('tracker:project_details', kwargs={'project_pk': self.object.pk, 'team_slug': self.object.team.slug}))
 
 
-class ProjectManageDevelopers(LoginRequiredMixin, TeamMemberMixin, ViewProjectMixin, CommonTemplateContextMixin, generic.DetailView):
+class ProjectManageDevelopers(QueryBudgetMixin, LoginRequiredMixin, TeamMemberMixin, ViewProjectMixin, CommonTemplateContextMixin, generic.DetailView):
+    query_budget = 17
     model = models.Project
     context_object_name = 'project'
     template_name = 'tracker/project_manage_developers.html'
@@ -855,33 +929,34 @@ class ProjectManageDevelopers(LoginRequiredMixin, TeamMemberMixin, ViewProjectMi
         context = super().get_context_data(**kwargs)
         project_developers = self.get_object().developers.all()
         context['project_developers'] = project_developers
-        team = get_object_or_404(models.Team, slug=self.kwargs['team_slug'])
+        team = loaders.for_request(self.request).team(self.kwargs['team_slug'])
         team_members = team.members.all()
         team_members = [member for member in team_members if member not in project_developers]
         context['team_members'] = team_members
         return context
 
     def get(self, request, *args, **kwargs):
-        team = get_object_or_404(models.Team, slug=self.kwargs['team_slug'])
+        team = loaders.for_request(self.request).team(self.kwargs['team_slug'])
         project = self.get_object()
         if request.user in team.get_owners() or request.user == project.manager:
             try:
                 if (member_username := request.GET.get('add')):
                     member = User.objects.get(username=member_username)
                     if member in team.members.all():
-                        project.developers.add(member)
-                        notification_setting = member.notification_settings.get(
-                            'project_role_assignment',
-                            NOTIFICATION_SETTING_DEFAULTS.get('project_role_assignment', True)
-                        )
-                        if member.email and notification_setting:
-                            body = render_to_string('emails/added_as_project_developer.txt', {'project_title': project.title})
-                            mail.send_mail(
-                                subject=f'Added as developer to project {project.title}',
-                                message=body,
-                                from_email='noreply@monksbugtracker.com',
-                                recipient_list=[member.email]
+                        with transaction.atomic():
+                            project.developers.add(member)
+                            notification_setting = member.notification_settings.get(
+                                'project_role_assignment',
+                                NOTIFICATION_SETTING_DEFAULTS.get('project_role_assignment', True)
                             )
+                            if member.email and notification_setting:
+                                body = render_to_string('emails/added_as_project_developer.txt', {'project_title': project.title})
+                                outbox.send_mail(
+                                    subject=f'Added as developer to project {project.title}',
+                                    message=body,
+                                    from_email='noreply@monksbugtracker.com',
+                                    recipient_list=[member.email]
+                                )
                     else:
                         messages.warning(request, 'User does not exist or is not a member of this team.')
                 elif (member_username := request.GET.get('remove')):
@@ -935,8 +1010,9 @@ Simply displays the comments associated with the current ticket and creates a fo
 '''
 
 #paginating
-class TicketDetails(LoginRequiredMixin, ViewTicketMixin, CommonTemplateContextMixin, generic.DetailView):
+class TicketDetails(QueryBudgetMixin, LoginRequiredMixin, ViewTicketMixin, CommonTemplateContextMixin, generic.DetailView):
     '''Displays the ticket details. Also provides additional context linked to the CommentForm so that a comment creation form can be rendered on the same template.'''
+    query_budget = 16
     model = models.Ticket
     template_name = 'tracker/ticket_details.html'
     context_object_name = 'ticket'
@@ -953,6 +1029,8 @@ class TicketDetails(LoginRequiredMixin, ViewTicketMixin, CommonTemplateContextMi
         context['page_obj'] = page_obj
         subscribed = self.request.user in self.get_object().subscribers.all()
         context['subscribed'] = subscribed
+        # checked once per comment by the template
+        context['is_owner'] = roles.is_team_owner(self.object.team, self.request.user)
         return context
 
     def get_queryset(self):
@@ -980,8 +1058,10 @@ class TicketDetailsCommentPost(LoginRequiredMixin, ViewTicketMixin, SuccessMessa
         user = self.request.user
         ticket = self.ticket
         new_comment = models.Comment(text=text, user=user, ticket=ticket)
-        new_comment.save()
-        return super().form_valid(form)
+        new_comment.render_markdown_fields()
+        with transaction.atomic():
+            new_comment.save()
+            return super().form_valid(form)
 
 
 class TicketDetailsResolution(LoginRequiredMixin, ViewTicketMixin, SuccessMessageMixin, CommonTemplateContextMixin, generic.detail.SingleObjectMixin, generic.FormView):
@@ -994,9 +1074,11 @@ class TicketDetailsResolution(LoginRequiredMixin, ViewTicketMixin, SuccessMessag
     def post(self, request, *args, **kwargs):
         user = self.request.user
         self.ticket = self.get_object()
-        project = get_object_or_404(models.Project, pk=self.ticket.project.pk)
-        team = get_object_or_404(models.Team, slug=self.kwargs['team_slug'])
-        if user in self.ticket.developer.all() or user == project.manager or user in team.get_owners():
+        project = self.ticket.project
+        team = loaders.for_request(self.request).team(self.kwargs['team_slug'])
+        with tracing.span('permission', **{'code.function': 'TicketDetailsResolution.post'}):
+            allowed = user in self.ticket.developer.all() or user == project.manager or user in team.get_owners()
+        if allowed:
             return super().post(request, *args, **kwargs)
         raise Http404
 
@@ -1012,25 +1094,20 @@ class TicketDetailsResolution(LoginRequiredMixin, ViewTicketMixin, SuccessMessag
         else:
             self.ticket.resolution = 'Unspecified.'
         self.ticket.status = 'closed'
-        new_comment = models.Comment.objects.create(text='Closed.', user=self.request.user, ticket=self.ticket)
-        new_comment.save()
-        self.ticket.save()
-        if not self.ticket.project.is_archived:
-            email_tuples = []
-            team = self.ticket.team
-            project = self.ticket.project
-            for subscriber in self.ticket.subscribers.all():
-                if subscriber in team.members.all() and (
-                    subscriber in project.developers.all() or subscriber == project.manager):
-                    email_tuples.append((
-                        f'Ticket closed: {self.ticket.title}',
-                        f'Closed by {self.request.user}. Resolution: {self.ticket.resolution}',
-                        'noreply@monksbugtracker.com',
-                        [subscriber.email]
-                    ))
-            email_tuples = tuple(email_tuples)
-            mail.send_mass_mail(email_tuples)
-        return super().form_valid(form)
+        self.ticket.render_markdown_fields()
+        new_comment = models.Comment(text='Closed.', user=self.request.user, ticket=self.ticket)
+        new_comment.render_markdown_fields()
+        with transaction.atomic():
+            counters.lock_counted_state(self.ticket)
+            new_comment.save()
+            self.ticket.save()
+            if not self.ticket.project.is_archived:
+                outbox.send_mass_mail(notifications.ticket_event_emails(
+                    notifications.ticket_event_recipients(self.ticket),
+                    f'Ticket closed: {self.ticket.title}',
+                    f'Closed by {self.request.user}. Resolution: {self.ticket.resolution}',
+                ))
+            return super().form_valid(form)
 
 
 class TicketReopen(LoginRequiredMixin, ViewTicketMixin, SuccessMessageMixin, CommonTemplateContextMixin, generic.detail.SingleObjectMixin, View):
@@ -1039,13 +1116,16 @@ class TicketReopen(LoginRequiredMixin, ViewTicketMixin, SuccessMessageMixin, Com
     def post(self, request, *args, **kwargs):
         user = self.request.user
         self.ticket = self.get_object()
-        project = get_object_or_404(models.Project, pk=self.ticket.project.pk)
-        team = get_object_or_404(models.Team, slug=self.kwargs['team_slug'])
+        project = self.ticket.project
+        team = loaders.for_request(self.request).team(self.kwargs['team_slug'])
         if user in self.ticket.developer.all() or user == project.manager or user in team.get_owners():
             self.ticket.status = 'open'
-            new_comment = models.Comment.objects.create(text='Reopened.', user=self.request.user, ticket=self.ticket)
-            # new_comment.save()
-            self.ticket.save()
+            new_comment = models.Comment(text='Reopened.', user=self.request.user, ticket=self.ticket)
+            new_comment.render_markdown_fields()
+            with transaction.atomic():
+                counters.lock_counted_state(self.ticket)
+                new_comment.save()
+                self.ticket.save()
             messages.info(request, 'Ticket reopened.')
             return HttpResponseRedirect(reverse('tracker:ticket_details', kwargs={'pk': self.ticket.pk, 'team_slug': self.kwargs['team_slug']}))
         raise Http404
@@ -1076,11 +1156,12 @@ class CommentDelete(LoginRequiredMixin, CommonTemplateContextMixin, TeamMemberMi
     model = models.Comment
 
     def post(self, request, *args, **kwargs):
-        team = get_object_or_404(models.Team, slug=self.kwargs['team_slug'])
+        team = loaders.for_request(self.request).team(self.kwargs['team_slug'])
         comment = get_object_or_404(models.Comment, pk=self.kwargs['pk'])
         comment_submitter = comment.user
         if request.user in team.get_owners() or request.user == comment_submitter:
-            return super().post(request, *args, **kwargs)
+            with transaction.atomic():
+                return super().post(request, *args, **kwargs)
         messages.warning(request, "You do not have permission to delete that comment.")
         return HttpResponseRedirect(reverse_lazy('tracker:ticket_details', kwargs={'team_slug': team.slug, 'pk': comment.ticket.pk}))
 
@@ -1096,8 +1177,9 @@ class SubscribeTicketView(LoginRequiredMixin, CommonTemplateContextMixin, ViewTi
 
     def get(self, request, *args, **kwargs):
         ticket = self.get_object()
-        ticket.subscribers.add(request.user)
-        ticket.save()
+        with transaction.atomic():
+            ticket.subscribers.add(request.user)
+            ticket.save()
         messages.success(request, 'You will now receive emails when comments are posted to this ticket or when it is closed.')
         return HttpResponseRedirect(reverse('tracker:ticket_details', kwargs={'team_slug': ticket.team.slug, 'pk': ticket.pk}))
 
@@ -1107,8 +1189,9 @@ class UnsubscribeTicketView(LoginRequiredMixin, CommonTemplateContextMixin, View
 
     def get(self, request, *args, **kwargs):
         ticket = self.get_object()
-        ticket.subscribers.remove(request.user)
-        ticket.save()
+        with transaction.atomic():
+            ticket.subscribers.remove(request.user)
+            ticket.save()
         messages.success(request, 'You will no longer receive emails when comments are posted to this ticket or when it is closed.')
         return HttpResponseRedirect(reverse('tracker:ticket_details', kwargs={'team_slug': ticket.team.slug, 'pk': ticket.pk}))
 
@@ -1116,14 +1199,101 @@ class UnsubscribeTicketView(LoginRequiredMixin, CommonTemplateContextMixin, View
 class MultipleUnsubscribeView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         if (pks:=request.POST.getlist('check')):
-            for pk in pks:
-                ticket = get_object_or_404(models.Ticket, pk=pk)
-                ticket.subscribers.remove(request.user)
+            with transaction.atomic():
+                for pk in pks:
+                    ticket = get_object_or_404(models.Ticket, pk=pk)
+                    ticket.subscribers.remove(request.user)
             messages.success(request, f'Successfully unsubscribed from {len(pks)} tickets.')
         else:
             messages.warning(request, 'No tickets selected.')
         return HttpResponseRedirect(reverse('manage_subscriptions'))
 
 
+class MetricsView(View):
+    """The request metrics of every worker, for Prometheus. Readable by staff or with settings.METRICS_TOKEN."""
+
+    def get(self, request, *args, **kwargs):
+        token = settings.METRICS_TOKEN
+        # compared as bytes: compare_digest refuses str with non-ASCII characters, which any client can send
+        authorization = request.META.get('HTTP_AUTHORIZATION', '').encode()
+        if not (request.user.is_staff or (token and hmac.compare_digest(authorization, f'Bearer {token}'.encode()))):
+            raise PermissionDenied
+        metrics.flush()
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class SqlStatsView(StaffOnlyMixin, View):
+    """The SQL statements that cost the most, as JSON: per view, or summed over the views with ?by=statement. ?order
+    is one of sqlstats.ORDERS, ?limit caps the statements listed and ?view selects one view."""
+    max_limit = 500
+
+    def get(self, request, *args, **kwargs):
+        order = request.GET.get('order', 'total')
+        if order not in sqlstats.ORDERS:
+            return HttpResponseBadRequest(f'order must be one of {", ".join(sqlstats.ORDERS)}.')
+        try:
+            limit = min(int(request.GET.get('limit', 20)), self.max_limit)
+        except ValueError:
+            return HttpResponseBadRequest('limit must be a number.')
+        sqlstats.flush()
+        statements = sqlstats.top(
+            order, limit, view=request.GET.get('view'), by_view=request.GET.get('by', 'view') == 'view'
+        )
+        return JsonResponse({'order': order, 'dropped_calls': sqlstats.dropped, 'statements': statements})
+
+
+class ProfileListView(StaffOnlyMixin, generic.ListView):
+    """The newest request profiles, optionally of one view, with how their samples split between the ORM, markdown,
+    tables and templates, and a token for profiling requests on demand."""
+    template_name = 'tracker/profile_list.html'
+    context_object_name = 'profiles'
+    paginate_by = 25
+
+    def get_queryset(self):
+        profiles = models.RequestProfile.objects.order_by('-created_on', '-pk')
+        if (view:=self.request.GET.get('view')):
+            profiles = profiles.filter(view=view)
+        return profiles
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        for profile in context['profiles']:
+            # in the order of context['categories']
+            profile.shares = list(profiling.breakdown(profile.stacks).values())
+        context['categories'] = [category for category, _fragments in profiling.CATEGORIES] + [profiling.OTHER]
+        context['token'] = profiling.make_token(self.request.user.username)
+        context['token_minutes'] = settings.PROFILING_TOKEN_MAX_AGE // 60
+        context['view'] = self.request.GET.get('view', '')
+        return context
+
+
+class ProfileStacksView(StaffOnlyMixin, View):
+    """Downloads a request profile as collapsed stacks, for flamegraph.pl or speedscope."""
+
+    def get(self, request, *args, **kwargs):
+        profile = get_object_or_404(models.RequestProfile, pk=kwargs['profile_pk'])
+        response = HttpResponse(profile.stacks + '\n', content_type='text/plain; charset=utf-8')
+        filename = f"{profile.view.replace(':', '-')}-{profile.created_on:%Y%m%dT%H%M%S}.txt"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class MemoryView(StaffOnlyMixin, View):
+    """This worker's memory as JSON: its RSS, RSS growth per view and the requests sampled for growing it. ?snapshot
+    also takes a tracemalloc snapshot, starting tracing, and lists the ?limit allocation sites that grew most since the
+    previous one; ?stop stops tracing."""
+    max_limit = 200
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.GET.get('limit', memory.TOP_SITES)), self.max_limit)
+        except ValueError:
+            return HttpResponseBadRequest('limit must be a number.')
+        if 'stop' in request.GET:
+            memory.stop()
+        report = memory.snapshot(limit) if 'snapshot' in request.GET else None
+        return JsonResponse({**memory.status(), 'snapshot': report})
+
+
 
 # request.POST.getlist('check')
@@ -0,0 +1,113 @@
+"""Maintenance of the ProjectVisibility table.
+
+Project and ticket lists used to be scoped with `Q(manager=user) | Q(developers=user)`, which joins the developers
+table, multiplies rows and forces a `.distinct()` on every ticket table. ProjectVisibility stores the answer instead:
+one (user, project, team, access_level) row for every team owner, project manager and project developer. The rows are
+rebuilt for the affected projects or team members by the receivers in receivers.py whenever one of those inputs
+changes, and `manage.py rebuild_project_visibility` rebuilds the whole table.
+
+A refresh deletes rows and inserts them again, and the table is unique on (user, project), so two refreshes of the same
+rows running at once would both insert and one would fail with an IntegrityError. Every refresh therefore starts by
+locking the rows it is derived from, in pk order: the Team rows for both kinds, then the Project rows for a project
+refresh. Teams come first because the deferred foreign key checks of the inserted rows take a share lock on their
+projects at commit, so a refresh must not hold a project lock while it waits for a team. The second refresh waits for
+the first to commit and then rebuilds from what it committed.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from . import models
+
+BULK_CREATE_BATCH_SIZE = 1000
+
+
+def _build_rows(projects, user_ids=None):
+    """Returns unsaved ProjectVisibility rows for a Project queryset, optionally limited to a set of user pks.
+
+    Every source is read with a flat values_list query, so the cost is three queries however many rows are built.
+    """
+    levels = {}
+
+    def grant(user_id, project_id, team_id, access_level):
+        if user_ids is not None and user_id not in user_ids:
+            return
+        current = levels.get((user_id, project_id))
+        if current is None or current[1] < access_level:
+            levels[(user_id, project_id)] = (team_id, access_level)
+
+    project_teams = {}
+    for project_id, team_id, manager_id in projects.values_list('pk', 'team_id', 'manager_id'):
+        project_teams[project_id] = team_id
+        if manager_id is not None:
+            grant(manager_id, project_id, team_id, models.ProjectVisibility.MANAGER)
+    if not project_teams:
+        return []
+
+    developers = models.Project.developers.through.objects.filter(project_id__in=list(project_teams))
+    team_projects = defaultdict(list)
+    for project_id, team_id in project_teams.items():
+        if team_id is not None:
+            team_projects[team_id].append(project_id)
+    owners = models.TeamMembership.objects.filter(team_id__in=list(team_projects), role=models.TeamMembership.OWNER)
+    if user_ids is not None:
+        developers = developers.filter(user_id__in=list(user_ids))
+        owners = owners.filter(user_id__in=list(user_ids))
+
+    for project_id, user_id in developers.values_list('project_id', 'user_id'):
+        grant(user_id, project_id, project_teams[project_id], models.ProjectVisibility.DEVELOPER)
+    for team_id, user_id in owners.values_list('team_id', 'user_id'):
+        for project_id in team_projects[team_id]:
+            grant(user_id, project_id, team_id, models.ProjectVisibility.OWNER)
+
+    return [
+        models.ProjectVisibility(user_id=user_id, project_id=project_id, team_id=team_id, access_level=access_level)
+        for (user_id, project_id), (team_id, access_level) in levels.items()
+    ]
+
+
+def _lock(queryset):
+    """Locks the rows of a queryset in pk order and returns their pks."""
+    return list(queryset.select_for_update().order_by('pk').values_list('pk', flat=True))
+
+
+@transaction.atomic
+def refresh_projects(project_ids):
+    """Rebuilds every visibility row of the given projects."""
+    project_ids = list(project_ids)
+    if not project_ids:
+        return 0
+    _lock(models.Team.objects.filter(pk__in=models.Project.objects.filter(pk__in=project_ids).values('team_id')))
+    _lock(models.Project.objects.filter(pk__in=project_ids))
+    models.ProjectVisibility.objects.filter(project_id__in=project_ids).delete()
+    rows = _build_rows(models.Project.objects.filter(pk__in=project_ids))
+    models.ProjectVisibility.objects.bulk_create(rows, batch_size=BULK_CREATE_BATCH_SIZE)
+    return len(rows)
+
+
+@transaction.atomic
+def refresh_team_members(team_id, user_ids):
+    """Rebuilds the given users' visibility rows for the projects of one team, e.g. after a role change."""
+    user_ids = set(user_ids)
+    if team_id is None or not user_ids:
+        return 0
+    _lock(models.Team.objects.filter(pk=team_id))
+    models.ProjectVisibility.objects.filter(team_id=team_id, user_id__in=list(user_ids)).delete()
+    rows = _build_rows(models.Project.objects.filter(team_id=team_id), user_ids)
+    models.ProjectVisibility.objects.bulk_create(rows, batch_size=BULK_CREATE_BATCH_SIZE)
+    return len(rows)
+
+
+def rebuild(projects=None, chunk_size=500):
+    """Rebuilds the visibility rows of a Project queryset (every project by default), chunk_size projects at a time.
+
+    Each chunk is refreshed in its own transaction, so a rebuild of a large table never holds locks on all of it.
+    Returns the number of rows written.
+    """
+    if projects is None:
+        projects = models.Project.objects.all()
+    project_ids = list(projects.order_by('pk').values_list('pk', flat=True))
+    written = 0
+    for start in range(0, len(project_ids), chunk_size):
+        written += refresh_projects(project_ids[start:start + chunk_size])
+    return written
@@ -1,4 +1,6 @@
 import logging
+import random
+import threading
 import time
 
 # Django
@@ -8,6 +10,7 @@ from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 
 # Local Apps
+from bug_tracker_v2.tracker import budgets, memory, metrics, profiling, sqlstats, tracing, traffic
 from .middleware_utils import colored, colored_resp_time, cprint
 
 logger = logging.getLogger(__name__)
@@ -104,14 +107,33 @@ class LocalizeTimezone(MiddlewareMixin):
 
 
 class TimeRequests(MiddlewareMixin):
+    """Prints the status and time of each request with DEBUG. With settings.TRACING_THRESHOLD set, it also traces
+    every request and writes the trace of any slower than the threshold to settings.TRACING_FILE; see
+    tracker/tracing.py. With settings.TRAFFIC_CAPTURE_RATE above 0, it appends that fraction of requests to
+    settings.TRAFFIC_CAPTURE_FILE, for `manage.py replay_traffic`; see tracker/traffic.py."""
 
     def process_request(self, request):
         request._start_time = time.time()  # pylint: disable=protected-access
+        if settings.TRACING_THRESHOLD is not None:
+            tracing.begin(request)
 
     def process_response(self, request, response):
+        trace = tracing.finish(request, response)
+        if trace is not None and trace.duration >= settings.TRACING_THRESHOLD:
+            try:
+                tracing.write(trace)
+            except OSError:
+                logger.exception('Could not write the trace of %s.', request.path)
+
         if hasattr(request, '_start_time'):
             resp_time_ms = (time.time() - request._start_time) * 1000  # pylint: disable=protected-access
 
+            if settings.TRAFFIC_CAPTURE_RATE and random.random() < settings.TRAFFIC_CAPTURE_RATE:
+                try:
+                    traffic.capture(request, response, resp_time_ms)
+                except OSError:
+                    logger.exception('Could not capture %s.', request.path)
+
             if settings.DEBUG:
                 querystring = ''
                 if request.META['QUERY_STRING']:
@@ -133,3 +155,103 @@ class TimeRequests(MiddlewareMixin):
         elif code in [301, 302]:
             return colored(code, color='blue')
         return colored(code, color='red')
+
+
+class FlushMetricsMiddleware:
+    """Adds this worker's request metrics and SQL statistics to the database every METRICS_FLUSH_INTERVAL seconds.
+
+    It goes before ViewMetricsMiddleware, QueryBudgetMiddleware and SqlStatsMiddleware, so the flushes run once their
+    execute wrappers are gone and aren't counted as queries of the request, or logged as going over its query budget.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        metrics.maybe_flush()
+        sqlstats.maybe_flush()
+        return response
+
+
+class ViewMetricsMiddleware:
+    """Records the latency, queries and response size of every request for the metrics endpoint.
+
+    It goes before QueryBudgetMiddleware and SqlStatsMiddleware, so the latency covers them and the rest of the
+    middleware too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = metrics.QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        metrics.record(
+            metrics.view_name(request), request.method, response.status_code, duration, queries.count,
+            queries.seconds, 0 if response.streaming else len(response.content),
+        )
+        return response
+
+
+class QueryBudgetMiddleware:
+    """Logs the requests that run more queries than their view's query budget, with the statements they repeated."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = budgets.QueryLog()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        budgets.check(request, queries.statements)
+        return response
+
+
+class SqlStatsMiddleware:
+    """Adds up the SQL statements of every request by view and fingerprint, for the SQL statistics."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        statements = sqlstats.StatementLog()
+        with connection.execute_wrapper(statements):
+            response = self.get_response(request)
+        sqlstats.record(metrics.view_name(request), statements.statements)
+        return response
+
+
+class MemoryMiddleware:
+    """Adds the growth of the worker's RSS during every request to its view's memory totals; see tracker/memory.py."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        before = memory.rss()
+        response = self.get_response(request)
+        memory.record(metrics.view_name(request), before, memory.rss())
+        return response
+
+
+class ProfilingMiddleware:
+    """Samples the call stacks of a fraction of requests, and of requests with a profiling token, and stores them.
+
+    It goes before ViewMetricsMiddleware, so storing a profile isn't counted in the request's metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling.should_profile(request):
+            return self.get_response(request)
+        started = time.perf_counter()
+        with profiling.StackSampler(threading.get_ident(), settings.PROFILING_INTERVAL) as sampler:
+            response = self.get_response(request)
+        profiling.store(request, response, sampler, time.perf_counter() - started)
+        return response
@@ -50,7 +50,9 @@ LOCALE_PATHS = [str(ROOT_DIR / "locale")]
 # https://docs.djangoproject.com/en/dev/ref/settings/#databases
 
 DATABASES = {'default': env.db()}
-DATABASES["default"]["ATOMIC_REQUESTS"] = True
+# reads run in autocommit; views open short transaction.atomic() blocks around their writes and defer emails and
+# cache invalidation to transaction.on_commit()
+DATABASES["default"]["ATOMIC_REQUESTS"] = False
 
 # URLS
 # ------------------------------------------------------------------------------
@@ -89,7 +91,7 @@ THIRD_PARTY_APPS = [
 LOCAL_APPS = [
     "bug_tracker_v2.users.apps.UsersConfig",
     # Your stuff: custom apps go here
-    'bug_tracker_v2.tracker'
+    'bug_tracker_v2.tracker.apps.TrackerConfig',
 ]
 # https://docs.djangoproject.com/en/dev/ref/settings/#installed-apps
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
@@ -138,6 +140,13 @@ AUTH_PASSWORD_VALIDATORS = [
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
+    "config.middleware.ProfilingMiddleware",
+    "config.middleware.MemoryMiddleware",
+    "config.middleware.FlushMetricsMiddleware",
+    "config.middleware.ViewMetricsMiddleware",
+    "config.middleware.QueryBudgetMiddleware",
+    "config.middleware.SqlStatsMiddleware",
+    "config.middleware.TimeRequests",
     "django.middleware.security.SecurityMiddleware",
     #"whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -198,6 +207,7 @@ TEMPLATES = [
                 "django.template.context_processors.tz",
                 "django.contrib.messages.context_processors.messages",
                 "bug_tracker_v2.utils.context_processors.settings_context",
+                "bug_tracker_v2.tracker.context_processors.pending_invitations",
             ],
         },
     }
@@ -233,6 +243,56 @@ EMAIL_BACKEND = env(
 )
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-timeout
 EMAIL_TIMEOUT = 5
+# Notification emails are queued in tracker.OutboundEmail and sent by `manage.py send_queued_email`.
+# When eager, they are sent as soon as they are queued instead, and no worker is needed.
+EMAIL_OUTBOX_EAGER = env.bool("DJANGO_EMAIL_OUTBOX_EAGER", default=False)
+
+# METRICS
+# ------------------------------------------------------------------------------
+# Each worker adds its request metrics to the tracker.ViewMetric table, and its SQL statistics to tracker.SqlStatement,
+# at most this often, in seconds. None only writes them when the metrics or SQL statistics endpoint is read.
+METRICS_FLUSH_INTERVAL = env.int("DJANGO_METRICS_FLUSH_INTERVAL", default=15)
+# Lets a scraper read the metrics endpoint with an "Authorization: Bearer <token>" header; staff can always read it.
+METRICS_TOKEN = env("DJANGO_METRICS_TOKEN", default="")
+# How many (view, SQL statement) pairs a worker adds up before writing them to tracker.SqlStatement early.
+SQL_STATS_MAX_ENTRIES = env.int("DJANGO_SQL_STATS_MAX_ENTRIES", default=2000)
+
+# PROFILING
+# ------------------------------------------------------------------------------
+# The fraction of requests whose call stacks are sampled and stored in tracker.RequestProfile; see tracker/profiling.py.
+PROFILING_SAMPLE_RATE = env.float("DJANGO_PROFILING_SAMPLE_RATE", default=0.0)
+# Seconds between two samples of a profiled request's stack.
+PROFILING_INTERVAL = env.float("DJANGO_PROFILING_INTERVAL", default=0.005)
+# How many profiles are kept; older ones are deleted as new ones are stored.
+PROFILING_KEEP = env.int("DJANGO_PROFILING_KEEP", default=500)
+# Seconds for which a profiling token from the profiles page or `manage.py profiles --token` is accepted.
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+
+# TRACING
+# ------------------------------------------------------------------------------
+# Requests taking at least this many seconds have their span trace appended to TRACING_FILE as OTLP/JSON; see
+# tracker/tracing.py. None doesn't trace at all.
+TRACING_THRESHOLD = env.float("DJANGO_TRACING_THRESHOLD", default=None)
+TRACING_FILE = env("DJANGO_TRACING_FILE", default=str(ROOT_DIR / "traces.jsonl"))
+# Spans beyond this many are counted but not kept.
+TRACING_MAX_SPANS = 2000
+
+# TRAFFIC CAPTURE
+# ------------------------------------------------------------------------------
+# The fraction of requests appended, anonymized, to TRAFFIC_CAPTURE_FILE for `manage.py replay_traffic`; see
+# tracker/traffic.py. 0 captures nothing.
+TRAFFIC_CAPTURE_RATE = env.float("DJANGO_TRAFFIC_CAPTURE_RATE", default=0.0)
+TRAFFIC_CAPTURE_FILE = env("DJANGO_TRAFFIC_CAPTURE_FILE", default=str(ROOT_DIR / "traffic.jsonl"))
+
+# MEMORY
+# ------------------------------------------------------------------------------
+# A request growing the worker's RSS by this many bytes or more is logged and kept as a sample, with a tracemalloc
+# snapshot while allocations are traced; see tracker/memory.py. None doesn't sample.
+MEMORY_RSS_THRESHOLD = env.int("DJANGO_MEMORY_RSS_THRESHOLD", default=32 * 1024 * 1024)
+# How many samples each worker keeps for the memory endpoint.
+MEMORY_KEEP_SAMPLES = 20
+# The signal on which a worker logs a tracemalloc snapshot report; empty to not install a handler.
+MEMORY_SIGNAL = env("DJANGO_MEMORY_SIGNAL", default="SIGUSR2")
 
 # ADMIN
 # ------------------------------------------------------------------------------
@@ -25,6 +25,10 @@ ALLOWED_HOSTS = ["localhost", "0.0.0.0", "127.0.0.1"]
 EMAIL_BACKEND = env(
     "DJANGO_EMAIL_BACKEND", default="django.core.mail.backends.console.EmailBackend"
 )
+# for the SMTP backend, e.g. the sink of `manage.py load_test --smtp-port 1025`
+EMAIL_HOST = env("DJANGO_EMAIL_HOST", default="localhost")
+EMAIL_PORT = env.int("DJANGO_EMAIL_PORT", default=1025)
+EMAIL_OUTBOX_EAGER = env.bool("DJANGO_EMAIL_OUTBOX_EAGER", default=True)
 
 # WhiteNoise
 # ------------------------------------------------------------------------------
@@ -53,19 +53,28 @@ ALLOWED_HOSTS = ["*"]
 
 # CACHES
 # ------------------------------------------------------------------------------
-# CACHES = {
-#     "default": {
-#         "BACKEND": "django_redis.cache.RedisCache",
-#         # "LOCATION": env("REDIS_URL"),
-#         "LOCATION": 'redis://127.0.0.1:6379/1',
-#         "OPTIONS": {
-#             "CLIENT_CLASS": "django_redis.client.DefaultClient",
-#             # Mimicing memcache behavior.
-#             # http://jazzband.github.io/django-redis/latest/#_memcached_exceptions_behavior
-#             "IGNORE_EXCEPTIONS": True,
-#         },
-#     }
-# }
+# Shared by every instance, so that the role and invitation caches dropped by one are dropped for all. Redis when
+# REDIS_URL is set, the database otherwise (the cache table is created by the deploy's createcachetable step).
+if env("REDIS_URL", default=None):
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": env("REDIS_URL"),
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                # Mimicing memcache behavior.
+                # http://jazzband.github.io/django-redis/latest/#_memcached_exceptions_behavior
+                "IGNORE_EXCEPTIONS": True,
+            },
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "django_cache",
+        }
+    }
 
 # SECURITY
 # ------------------------------------------------------------------------------
@@ -127,6 +136,8 @@ SERVER_EMAIL = env("DJANGO_SERVER_EMAIL", default=DEFAULT_FROM_EMAIL)
 EMAIL_SUBJECT_PREFIX = env(
     "DJANGO_EMAIL_SUBJECT_PREFIX", default="[Bug Tracker v2]"
 )
+# Requests only queue emails; the send-queued-email Cloud Run job that bin/deploy schedules every minute sends them.
+EMAIL_OUTBOX_EAGER = False
 
 # ADMIN
 # ------------------------------------------------------------------------------
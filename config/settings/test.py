@@ -41,6 +41,17 @@ TEMPLATES[-1]["OPTIONS"]["debug"] = True
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-backend
 EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+EMAIL_OUTBOX_EAGER = True
+
+# METRICS
+# ------------------------------------------------------------------------------
+# a flush in the middle of a test would show up in its query counts
+METRICS_FLUSH_INTERVAL = None
+SQL_STATS_MAX_ENTRIES = None
+
+# MEMORY
+# ------------------------------------------------------------------------------
+MEMORY_SIGNAL = ""
 
 # Your stuff...
 # ------------------------------------------------------------------------------
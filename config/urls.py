@@ -9,7 +9,8 @@ from bug_tracker_v2.tracker.views import (
     TeamDetails, TeamListView, TeamCreateView, TeamAddManager, AcceptTeamInvitation, SendTeamInvitation,
     ManageSubscriptions, MultipleUnsubscribeView, InvitationsListView, DeclineTeamInvitation, ManageNotificationSettings,
     EnableNotificationSetting, DisableNotificationSetting, TeamRemoveManager, TeamAddOwner, ManageTeamOwnership,
-    ManageTeamOwnershipWarning, TeamRemoveOwner, TeamRemoveMember, LeaveTeam,
+    ManageTeamOwnershipWarning, TeamRemoveOwner, TeamRemoveMember, LeaveTeam, MetricsView,
+    ProfileListView, ProfileStacksView, SqlStatsView, MemoryView,
 )
 
 from django.urls import reverse
@@ -47,6 +48,11 @@ urlpatterns = [
     path('disable-notifications/', DisableNotificationSetting.as_view(), name='disable_notification'),
     path('enable-notifications/', EnableNotificationSetting.as_view(), name='enable_notification'),
     path('multiple-unsubscribe/', MultipleUnsubscribeView.as_view(), name='multiple_unsubscribe'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('sql-stats/', SqlStatsView.as_view(), name='sql_stats'),
+    path('profiles/', ProfileListView.as_view(), name='profiles'),
+    path('profiles/<int:profile_pk>/stacks.txt', ProfileStacksView.as_view(), name='profile_stacks'),
+    path('memory/', MemoryView.as_view(), name='memory'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 